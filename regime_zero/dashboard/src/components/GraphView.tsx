@@ -32,11 +32,28 @@ export default function GraphView({ onNodeHover }: { onNodeHover?: (node: any) =
         // Fetch Data
         Promise.all([
             fetch('/viz_data.json').then(res => res.json()),
-            fetch('/twin_data.json').then(res => res.json()).catch(() => null)
-        ]).then(([graphData, twinData]) => {
+            fetch('/twin_data.json').then(res => res.json()).catch(() => null),
+            fetch('/twin_graph.json').then(res => res.json()).catch(() => null)
+        ]).then(([graphData, twinData, twinGraph]) => {
+            const nodeIds = new Set(graphData.nodes.map((n: any) => n.id))
+
+            // Precomputed past-only twins for every date (twin_graph.py --export)
+            if (twinGraph) {
+                twinGraph.links.forEach((link: any) => {
+                    if (nodeIds.has(link.source) && nodeIds.has(link.target)) {
+                        graphData.links.push({
+                            source: link.source,
+                            target: link.target,
+                            value: link.score,
+                            rank: link.rank,
+                            type: 'twin_graph'
+                        })
+                    }
+                })
+            }
+
             // Process Twin Data if exists
             if (twinData) {
-                const nodeIds = new Set(graphData.nodes.map((n: any) => n.id))
                 if (nodeIds.has(twinData.source) && nodeIds.has(twinData.target)) {
                     graphData.links.push({
                         source: twinData.source,
@@ -83,8 +100,17 @@ export default function GraphView({ onNodeHover }: { onNodeHover?: (node: any) =
                 nodeLabel="name"
                 nodeAutoColorBy="group"
                 nodeVal={(node: any) => (node.val || 1) * 1.5}
-                linkWidth={(link: any) => link.type === 'twin' ? 0 : (link.value || 1) * 0.5}
-                linkColor={(link: any) => link.type === 'twin' ? 'transparent' : 'rgba(100, 255, 218, 0.15)'}
+                linkWidth={(link: any) => {
+                    if (link.type === 'twin') return 0
+                    if (link.type === 'twin_graph') return 0.3 + link.value
+                    return (link.value || 1) * 0.5
+                }}
+                linkColor={(link: any) => {
+                    if (link.type === 'twin') return 'transparent'
+                    // Calibrated score (0-1) drives opacity so only strong twins stand out
+                    if (link.type === 'twin_graph') return `rgba(255, 0, 85, ${0.05 + 0.5 * link.value})`
+                    return 'rgba(100, 255, 218, 0.15)'
+                }}
                 linkDirectionalParticles={0}
                 linkDirectionalParticleSpeed={(link: any) => link.type === 'twin' ? 0.01 : 0}
                 linkDirectionalParticleWidth={4}
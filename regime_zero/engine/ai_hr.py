@@ -12,6 +12,9 @@ load_dotenv()
 
 ROSTER_FILE = "regime_zero/config/model_roster.json"
 OPENROUTER_MODELS_URL = "https://openrouter.ai/api/v1/models"
+LATENCY_FILE = "regime_zero/config/model_latency.json"
+LATENCY_WINDOW = 50 # Most recent successful call latencies kept per model
+MIN_LATENCY_SAMPLES = 5 # Below this, a model has no observed quantile yet
 
 # Fallback Roster if API fails
 DEFAULT_ROSTER = {
@@ -25,6 +28,7 @@ DEFAULT_ROSTER = {
 class AI_HR:
     def __init__(self):
         self.roster = self.load_roster()
+        self.latencies = self.load_latencies()
         
     def load_roster(self):
         if os.path.exists(ROSTER_FILE):
@@ -83,22 +87,52 @@ class AI_HR:
 
     def get_substitute(self, role, failed_model=None):
         """
-        Returns a substitute model for the given role, excluding the failed one.
+        Returns a substitute model for the given role, excluding the failed one
+        (failed_model may also be a list of every model already tried).
         """
         candidates = self.roster.get(role, [])
         
-        # Filter out failed model
-        if failed_model:
-            candidates = [c for c in candidates if c != failed_model]
+        # Filter out failed models
+        failed = {failed_model} if isinstance(failed_model, str) else set(failed_model or ())
+        candidates = [c for c in candidates if c not in failed]
             
         if not candidates:
             # Fallback to a generic reliable list
-            candidates = ["openai/gpt-4o-mini", "meta-llama/llama-3-8b-instruct:free"]
+            generic = ["openai/gpt-4o-mini", "meta-llama/llama-3-8b-instruct:free"]
+            candidates = [c for c in generic if c not in failed] or generic
             
         sub = random.choice(candidates)
         print(f"👔 HR: Assigning Substitute for {role}: {sub}")
         return sub
 
+    # --- Latency Book (used to decide when to hedge a slow model) ---
+
+    def load_latencies(self):
+        try:
+            with open(LATENCY_FILE, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def record_latency(self, model, seconds):
+        history = self.latencies.setdefault(model, [])
+        history.append(round(seconds, 2))
+        del history[:-LATENCY_WINDOW]
+
+    def latency_quantile(self, model, q=0.9):
+        """Observed q-quantile of the model's call latency (seconds; hedged calls count with their time so far), or None without enough samples."""
+        history = sorted(self.latencies.get(model, []))
+        if len(history) < MIN_LATENCY_SAMPLES:
+            return None
+        return history[min(len(history) - 1, int(q * len(history)))]
+
+    def save_latencies(self):
+        os.makedirs(os.path.dirname(LATENCY_FILE), exist_ok=True)
+        tmp_path = LATENCY_FILE + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.latencies, f, indent=2)
+        os.replace(tmp_path, LATENCY_FILE)
+
 if __name__ == "__main__":
     hr = AI_HR()
     hr.update_roster_from_openrouter()
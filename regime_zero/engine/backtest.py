@@ -0,0 +1,223 @@
+import sys
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from regime_zero.engine.twin_graph import _top_k_block, _init_worker, BLOCK_SIZE, PARALLEL_MIN_ROWS
+from regime_zero.engine.forward_returns import ForwardReturnTable, exit_indices
+
+REPORT_FILE = "regime_zero/data/backtest/twin_backtest.json"
+
+DEFAULT_ASSETS = ("SPY", "GC=F", "BTC")
+DEFAULT_HORIZONS = (7, 30)
+DEFAULT_KS = (1, 3, 5, 10)
+AGGREGATORS = ("mean", "weighted")
+CALIBRATION_BINS = 5
+
+# --- Twin sources: each returns (sorted dates, row-aligned L2-normalized CSR matrix) ---
+
+def load_twin_index():
+    """regime_objects.jsonl text index (what find_twin and the twin graph use)."""
+    from regime_zero.engine.twin_index import get_twin_index
+    index = get_twin_index()
+    order = sorted(range(len(index.dates)), key=lambda i: index.dates[i])
+    return [index.dates[i] for i in order], index.matrix[order].tocsr()
+
+def load_vector_index():
+    """Master regime history TF-IDF index (what RegimeMatcher uses). Rows are already date-sorted."""
+    from regime_zero.engine.vector_indexer import VectorIndexer
+    indexer = VectorIndexer()
+    indexer.load_index()
+    if indexer.vectors is None:
+        return [], None
+    return [str(d) for d in indexer.dates], indexer.vectors
+
+METHODS = {"twin_index": load_twin_index, "vector_index": load_vector_index}
+
+# --- Walk-forward neighbours ---
+
+def embargoed_limits(dates, horizon, trading_days):
+    """
+    Per query date, the number of candidate rows whose outcome is known by that date: a twin's forward
+    return exits on the first trading day on or after twin_date + horizon (as in forward_returns), and
+    that exit must fall on or before the query date. Twins without an exit yet are never candidates.
+    """
+    days = np.asarray(dates, dtype='datetime64[D]')
+    trading_days = np.asarray(trading_days, dtype='datetime64[D]')
+    exit_idx = exit_indices(trading_days, days, horizon)
+    exits = np.full(len(days), np.datetime64('9999-12-31'), dtype='datetime64[D]')
+    valid = exit_idx < len(trading_days)
+    exits[valid] = trading_days[exit_idx[valid]]
+    # Exits are non-decreasing in the (sorted) twin dates, so the eligible rows form a prefix
+    return np.searchsorted(exits, days, side='right')
+
+def walk_forward_neighbors(matrix, limits, k, workers=None):
+    """Top-k rows under each row's limit: blocked sparse products, fanned out across processes."""
+    n = matrix.shape[0]
+    blocks = [(s, min(s + BLOCK_SIZE, n)) for s in range(0, n, BLOCK_SIZE)]
+    neighbors = np.full((n, k), -1, dtype=np.int32)
+    scores = np.full((n, k), np.nan, dtype=np.float32)
+
+    if workers == 1 or n < PARALLEL_MIN_ROWS:
+        for s, e in blocks:
+            _, neighbors[s:e], scores[s:e] = _top_k_block(s, e, k, matrix, limits[s:e])
+        return neighbors, scores
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(matrix,)) as pool:
+        futures = [pool.submit(_top_k_block, s, e, k, None, limits[s:e]) for s, e in blocks]
+        for future in futures:
+            s, block_neighbors, block_scores = future.result()
+            neighbors[s:s + len(block_neighbors)] = block_neighbors
+            scores[s:s + len(block_scores)] = block_scores
+    return neighbors, scores
+
+# --- Forecasts and scoring ---
+
+def twin_forecast(neighbors, scores, outcomes, k, aggregator):
+    """
+    Forecast per date from the forward returns of its top-k twins (NaN when no twin has an outcome).
+    'mean' is equal-weighted; 'weighted' weights each twin by its similarity.
+    """
+    nb = neighbors[:, :k]
+    valid = nb >= 0
+    twin_returns = np.where(valid, outcomes[np.where(valid, nb, 0)], np.nan)
+    weights = np.ones_like(twin_returns) if aggregator == "mean" else np.nan_to_num(scores[:, :k]).astype(float)
+    weights = np.where(np.isnan(twin_returns), 0.0, weights)
+    total = weights.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        forecast = (np.nan_to_num(twin_returns) * weights).sum(axis=1) / total
+    forecast[total == 0] = np.nan
+    return forecast
+
+def _spearman(a, b):
+    if len(a) < 3:
+        return None
+    ra = pd.Series(a).rank().to_numpy()
+    rb = pd.Series(b).rank().to_numpy()
+    if ra.std() == 0 or rb.std() == 0:
+        return None
+    return float(np.corrcoef(ra, rb)[0, 1])
+
+def score_forecast(dates, forecast, realized, top_score):
+    """Hit-rate, rank-IC (overall and per year) and calibration tables for one forecast series."""
+    mask = ~np.isnan(forecast) & ~np.isnan(realized)
+    if mask.sum() == 0:
+        return {"n": 0}
+    f, r, s = forecast[mask], realized[mask], top_score[mask]
+    years = np.asarray([d[:4] for d in np.asarray(dates)[mask]])
+    hits = np.sign(f) == np.sign(r)
+
+    yearly_ic = {}
+    for year in np.unique(years):
+        ic = _spearman(f[years == year], r[years == year])
+        if ic is not None:
+            yearly_ic[str(year)] = round(ic, 4)
+    ic_values = np.array(list(yearly_ic.values()))
+
+    report = {
+        "n": int(mask.sum()),
+        "hit_rate": round(float(hits.mean()), 4),
+        "base_rate_up": round(float((r > 0).mean()), 4),
+        "rank_ic": _spearman(f, r),
+        "yearly_ic": yearly_ic,
+        "ic_mean": round(float(ic_values.mean()), 4) if len(ic_values) else None,
+        "ic_t": round(float(ic_values.mean() / (ic_values.std(ddof=1) / np.sqrt(len(ic_values)))), 3) if len(ic_values) > 2 and ic_values.std(ddof=1) > 0 else None,
+    }
+
+    # Calibration: does a bigger forecast mean a bigger realized move, and do closer twins hit more often?
+    def binned(key_values):
+        edges = np.quantile(key_values, np.linspace(0, 1, CALIBRATION_BINS + 1))
+        bins = np.clip(np.searchsorted(edges, key_values, side='right') - 1, 0, CALIBRATION_BINS - 1)
+        rows = []
+        for b in range(CALIBRATION_BINS):
+            sel = bins == b
+            if sel.any():
+                rows.append({"lo": round(float(edges[b]), 4), "hi": round(float(edges[b + 1]), 4), "n": int(sel.sum()),
+                             "mean_forecast": round(float(f[sel].mean()), 4), "mean_realized": round(float(r[sel].mean()), 4),
+                             "hit_rate": round(float(hits[sel].mean()), 4)})
+        return rows
+
+    report["calibration_by_forecast"] = binned(f)
+    report["calibration_by_similarity"] = binned(s)
+    return report
+
+def trading_days(table, asset):
+    """Sorted trading days of `asset` (the calendar its forward returns exit on)."""
+    return np.array(sorted(table.returns_for(asset)), dtype='datetime64[D]')
+
+def outcome_matrix(table, asset, dates, horizon):
+    """Forward returns of `asset` aligned to `dates` (NaN where the asset did not trade)."""
+    lookup = table.returns_for(asset)
+    values = [lookup.get(d, {}).get(horizon) for d in dates]
+    return np.array([np.nan if v is None else v for v in values], dtype=float)
+
+def run_backtest(methods=tuple(METHODS), assets=DEFAULT_ASSETS, horizons=DEFAULT_HORIZONS, ks=DEFAULT_KS, workers=None):
+    """Walk-forward evaluation for every method x asset x horizon x aggregator x k."""
+    table = ForwardReturnTable(horizons=horizons)
+    table.update()
+    available = set(table.table['asset'].astype(str).unique()) if not table.table.empty else set()
+    assets = [a for a in assets if a in available]
+    if not assets:
+        print("❌ No forward returns for the requested assets. Fetch price histories first.")
+        return []
+
+    results = []
+    for method in methods:
+        dates, matrix = METHODS[method]()
+        if matrix is None or not dates:
+            print(f"⚠️ {method}: no index data. Skipping.")
+            continue
+        print(f"🧪 {method}: {len(dates)} dates")
+        
+        for horizon in horizons:
+            # Neighbours depend on the embargo, i.e. on the horizon and the asset's trading calendar:
+            # assets sharing a calendar share them
+            by_limits = {}
+            for asset in assets:
+                limits = embargoed_limits(dates, horizon, trading_days(table, asset))
+                if limits.tobytes() not in by_limits:
+                    by_limits[limits.tobytes()] = walk_forward_neighbors(matrix, limits, max(ks), workers)
+                neighbors, scores = by_limits[limits.tobytes()]
+                outcomes = outcome_matrix(table, asset, dates, horizon)
+                for aggregator in AGGREGATORS:
+                    for k in ks:
+                        forecast = twin_forecast(neighbors, scores, outcomes, k, aggregator)
+                        report = score_forecast(dates, forecast, outcomes, scores[:, 0])
+                        report.update({"method": method, "asset": asset, "horizon": horizon, "aggregator": aggregator, "k": k})
+                        results.append(report)
+    return results
+
+def print_summary(results):
+    print(f"\n{'method':<13}{'asset':<7}{'h':>4}{'agg':>10}{'k':>4}{'n':>7}{'hit':>8}{'base':>8}{'rankIC':>9}{'IC t':>8}")
+    print("-" * 78)
+    for r in results:
+        if not r.get('n'):
+            continue
+        ic = f"{r['rank_ic']:.3f}" if r['rank_ic'] is not None else "-"
+        ic_t = f"{r['ic_t']:.2f}" if r['ic_t'] is not None else "-"
+        print(f"{r['method']:<13}{r['asset']:<7}{r['horizon']:>4}{r['aggregator']:>10}{r['k']:>4}{r['n']:>7}"
+              f"{r['hit_rate']:>8.1%}{r['base_rate_up']:>8.1%}{ic:>9}{ic_t:>8}")
+
+if __name__ == "__main__":
+    # Usage: python regime_zero/engine/backtest.py [--methods twin_index] [--assets SPY BTC] [--horizons 7 30] [--ks 1 5]
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of twin-based forecasts")
+    parser.add_argument("--methods", nargs="+", choices=sorted(METHODS), default=list(METHODS))
+    parser.add_argument("--assets", nargs="+", default=list(DEFAULT_ASSETS))
+    parser.add_argument("--horizons", type=int, nargs="+", default=list(DEFAULT_HORIZONS))
+    parser.add_argument("--ks", type=int, nargs="+", default=list(DEFAULT_KS))
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    results = run_backtest(args.methods, args.assets, args.horizons, args.ks, args.workers)
+    print_summary(results)
+
+    os.makedirs(os.path.dirname(REPORT_FILE), exist_ok=True)
+    with open(REPORT_FILE, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Report saved to {REPORT_FILE}")
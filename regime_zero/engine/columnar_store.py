@@ -0,0 +1,121 @@
+import sys
+import os
+import pandas as pd
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+try:
+    import pyarrow as pa
+except ImportError: # Optional: fall back to plain CSV parsing
+    pa = None
+
+# CSV stays the interchange format. The Arrow IPC file is a sidecar cache next to it
+# (e.g. unified_history.csv -> unified_history.arrow) and is rebuilt whenever the CSV is newer.
+ARROW_SUFFIX = ".arrow"
+CATEGORICAL_COLUMNS = ["asset_class", "asset", "ticker", "source", "country"]
+
+def arrow_path_for(csv_path):
+    return os.path.splitext(csv_path)[0] + ARROW_SUFFIX
+
+def _is_fresh(csv_path, arrow_path):
+    if not os.path.exists(arrow_path):
+        return False
+    if not os.path.exists(csv_path):
+        return True # Arrow file shipped without its CSV
+    return os.path.getmtime(arrow_path) >= os.path.getmtime(csv_path)
+
+def _read_csv(csv_path, date_columns):
+    df = pd.read_csv(csv_path)
+    for col in date_columns:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+def convert_csv(csv_path, date_columns=("date",), arrow_path=None):
+    """Converts a history CSV into a typed Arrow IPC file (dates as timestamps, dictionary-encoded categories)."""
+    if pa is None:
+        print("⚠️ pyarrow not installed. Skipping columnar conversion.")
+        return None
+
+    arrow_path = arrow_path or arrow_path_for(csv_path)
+    df = _read_csv(csv_path, date_columns)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    # Write to a temp file first so readers never see a half-written cache
+    tmp_path = arrow_path + ".tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=65536)
+    os.replace(tmp_path, arrow_path)
+
+    print(f"🗜️ Converted {csv_path} -> {arrow_path} ({table.num_rows} rows)")
+    return arrow_path
+
+def _open_arrow(arrow_path):
+    # Memory-mapped: only the columns actually touched get paged in
+    source = pa.memory_map(arrow_path, 'r')
+    return pa.ipc.open_file(source)
+
+def load_table(csv_path, date_columns=("date",), columns=None):
+    """
+    Loads a history dataset, preferring the memory-mapped Arrow sidecar.
+    Falls back to parsing the CSV (and refreshes the sidecar) when it is missing or stale.
+    Returns an empty DataFrame if neither file exists.
+    """
+    arrow_path = arrow_path_for(csv_path)
+
+    if pa is not None:
+        try:
+            if not _is_fresh(csv_path, arrow_path):
+                if not os.path.exists(csv_path):
+                    return pd.DataFrame()
+                convert_csv(csv_path, date_columns, arrow_path)
+
+            table = _open_arrow(arrow_path).read_all()
+            if columns:
+                table = table.select([c for c in columns if c in table.column_names])
+            return table.to_pandas(split_blocks=True, self_destruct=True)
+        except Exception as e:
+            print(f"⚠️ Columnar load failed for {csv_path} ({e}). Falling back to CSV.")
+
+    if not os.path.exists(csv_path):
+        return pd.DataFrame()
+    df = _read_csv(csv_path, date_columns)
+    if columns:
+        df = df[[c for c in columns if c in df.columns]]
+    return df
+
+def iter_batches(csv_path, date_columns=("date",), batch_size=65536):
+    """Yields the dataset as DataFrame chunks without materializing the whole table."""
+    arrow_path = arrow_path_for(csv_path)
+
+    if pa is not None:
+        if not _is_fresh(csv_path, arrow_path) and os.path.exists(csv_path):
+            convert_csv(csv_path, date_columns, arrow_path)
+        if _is_fresh(csv_path, arrow_path):
+            reader = _open_arrow(arrow_path)
+            for i in range(reader.num_record_batches):
+                yield reader.get_batch(i).to_pandas()
+            return
+
+    if not os.path.exists(csv_path):
+        return
+    for chunk in pd.read_csv(csv_path, chunksize=batch_size):
+        for col in date_columns:
+            if col in chunk.columns:
+                chunk[col] = pd.to_datetime(chunk[col], errors='coerce')
+        yield chunk
+
+if __name__ == "__main__":
+    # Usage: python regime_zero/engine/columnar_store.py <csv> [<csv> ...]
+    # Price histories use 'Date', news histories use 'date'.
+    targets = sys.argv[1:] or ["regime_zero/data/multi_asset_history/unified_history.csv"]
+    for path in targets:
+        if os.path.exists(path):
+            convert_csv(path, date_columns=("date", "Date"))
+        else:
+            print(f"❌ Not found: {path}")
@@ -1,14 +1,20 @@
 import json
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any
 from regime_zero.embedding.vectorizer import create_market_prompt
 from regime_zero.engine.rag_retriever import retrieve_relevant_context
-from utils.openrouter_client import ask_llm
+from regime_zero.engine.headline_clusters import compress_headlines, COUNCIL_HEADLINE_TOKENS
+from regime_zero.engine.llm_gateway import ask_llm, ask_llm_async
 
 from regime_zero.engine.new_era import fetch_new_era_context
 
 from regime_zero.engine.new_era import fetch_new_era_context
 
+COUNCIL_QUORUM = 3 # Analyst reports needed before the Meta Reviewer may start (stragglers are cancelled)
+COUNCIL_DEADLINE = 120.0 # Seconds from the start of the meeting; synthesis then starts with whatever has arrived
+_COUNCIL_IO = ThreadPoolExecutor(max_workers=2, thread_name_prefix="council-io") # Blocking loaders (macro CSV, RAG)
+
 # --- RZ-3DIO Personas ---
 PERSONAS = {
     # PID (Past)
@@ -31,8 +37,7 @@ class AnalystBase:
         self.persona_prompt = persona_prompt
         self.division = division
 
-    def analyze(self, date: str, market_input: str) -> Dict[str, Any]:
-        print(f"👤 [{self.division}] {self.name} Analyzing...")
+    def _prompts(self, date: str, market_input: str):
         system_prompt = f"{self.persona_prompt}\nYour goal is to provide a sharp analysis for the {self.division} division."
         user_prompt = f"""
 Analyze this market snapshot for {date}:
@@ -46,8 +51,10 @@ Provide your analysis in JSON format:
     "risk_focus": "What you are most worried about"
 }}
 """
+        return system_prompt, user_prompt
+
+    def _parse(self, response):
         try:
-            response = ask_llm(user_prompt, system_prompt=system_prompt)
             if not response: return None
             clean_resp = response.replace("```json", "").replace("```", "").strip()
             return json.loads(clean_resp)
@@ -55,6 +62,17 @@ Provide your analysis in JSON format:
             print(f"❌ [{self.name}] Error: {e}")
             return None
 
+    def analyze(self, date: str, market_input: str) -> Dict[str, Any]:
+        print(f"👤 [{self.division}] {self.name} Analyzing...")
+        system_prompt, user_prompt = self._prompts(date, market_input)
+        return self._parse(ask_llm(user_prompt, system_prompt=system_prompt))
+
+    async def aanalyze(self, date: str, market_input: str) -> Dict[str, Any]:
+        """Same as analyze, awaiting the shared LLM gateway instead of blocking (cancellable)."""
+        print(f"👤 [{self.division}] {self.name} Analyzing...")
+        system_prompt, user_prompt = self._prompts(date, market_input)
+        return self._parse(await ask_llm_async(user_prompt, system_prompt=system_prompt))
+
 class PID_Analyst(AnalystBase):
     pass
 
@@ -85,6 +103,9 @@ class FID_Analyst(AnalystBase):
             "risk_focus": "Potential for unprecedented shifts."
         }
 
+    async def aanalyze(self, date: str, market_input: str) -> Dict[str, Any]:
+        return self.analyze(date, market_input)
+
 class MetaReviewer:
     """
     The Synthesizer (The Frame Maker).
@@ -261,16 +282,33 @@ class AntiGravity:
         print(f"✅ Audit Passed. Retail: {audit_result['retail_score']}, Inst: {audit_result['institutional_score']}")
         return audit_result
 
-def run_council_meeting(date, market_data, headlines, similarity_score=0.0):
-    print(f"\n🔔 RZ-3DIO COUNCIL MEETING CALLED FOR {date}")
-    
-    # 0. Prepare Data
-    market_prompt = create_market_prompt(date, market_data, headlines)
-    
+def _load_macro_context(date):
     # [NEW] Macro Context (FED, OIL, GOLD)
     from regime_zero.engine.macro_context import MacroContextLoader
     macro_loader = MacroContextLoader()
-    macro_context = macro_loader.get_macro_context(date)
+    return macro_loader.get_macro_context(date)
+
+async def _await_until(future, end, default, label):
+    loop = asyncio.get_running_loop()
+    try:
+        return await asyncio.wait_for(future, timeout=max(0.0, end - loop.time()))
+    except asyncio.TimeoutError:
+        print(f"⏱️ [Council] {label} missed the deadline, proceeding without it.")
+        return default
+
+async def convene_council(date, market_prompt, quorum=COUNCIL_QUORUM, deadline=COUNCIL_DEADLINE):
+    """
+    Gathers everything the Meta Reviewer needs, concurrently: RAG retrieval runs alongside the macro
+    context and the analysts (who need the macro context in their prompt). Returns once `quorum`
+    analysts have reported (or all have finished, or the deadline hits); the rest are cancelled.
+    Returns (reports in analyst order, rag_context, macro_context).
+    """
+    loop = asyncio.get_running_loop()
+    end = loop.time() + deadline
+    rag_future = loop.run_in_executor(_COUNCIL_IO, retrieve_relevant_context, market_prompt)
+    macro_future = loop.run_in_executor(_COUNCIL_IO, _load_macro_context, date)
+
+    macro_context = await _await_until(macro_future, end, "No Macro Context available.", "Macro context")
     
     # REMOVED: New Era Context (User Request: "Return to Regime Base")
     # new_era_context = fetch_new_era_context() 
@@ -296,27 +334,74 @@ def run_council_meeting(date, market_data, headlines, similarity_score=0.0):
         PSD_Analyst("The Macro-Bear", PERSONAS["The Macro-Bear"], "PSD")
     ]
     
-    reports = []
-    print("👥 [Council] The 5 Junior Analysts are deliberating...")
-    for analyst in analysts:
-        report = analyst.analyze(date, full_analyst_prompt)
-        if report:
-            # Self-Censorship / Sanity Check
-            # "Self-censored and passed to MetaReviewer"
-            if report.get('regime_view'):
-                report['analyst'] = analyst.name
-                report['division'] = analyst.division
-                reports.append(report)
-            else:
-                print(f"⚠️ [{analyst.name}] Output censored due to low quality.")
-            
+    print(f"👥 [Council] The 5 Junior Analysts are deliberating (quorum {quorum}, deadline {deadline:.0f}s)...")
+    tasks = {asyncio.ensure_future(analyst.aanalyze(date, full_analyst_prompt)): i for i, analyst in enumerate(analysts)}
+    reports = {}
+    pending = set(tasks)
+    while pending and len(reports) < quorum:
+        done, pending = await asyncio.wait(pending, timeout=max(0.0, end - loop.time()), return_when=asyncio.FIRST_COMPLETED)
+        if not done:
+            break # Deadline
+        for task in done:
+            analyst = analysts[tasks[task]]
+            if task.exception():
+                print(f"❌ [{analyst.name}] Error: {task.exception()}")
+                continue
+            report = task.result()
+            if report:
+                # Self-Censorship / Sanity Check
+                # "Self-censored and passed to MetaReviewer"
+                if report.get('regime_view'):
+                    report['analyst'] = analyst.name
+                    report['division'] = analyst.division
+                    reports[tasks[task]] = report
+                else:
+                    print(f"⚠️ [{analyst.name}] Output censored due to low quality.")
+
+    if pending:
+        for task in pending:
+            task.cancel()
+        print(f"⏱️ [Council] Proceeding with {len(reports)}/{len(analysts)} reports; cancelled: {', '.join(analysts[tasks[t]].name for t in pending)}")
+
+    # 2. RAG Retrieval (started with the meeting)
+    rag_context = await _await_until(rag_future, end, "", "RAG retrieval")
+    return [reports[i] for i in sorted(reports)], rag_context, macro_context
+
+def _open_meeting(date, market_data, headlines):
+    print(f"\n🔔 RZ-3DIO COUNCIL MEETING CALLED FOR {date}")
+
+    # 0. Prepare Data
+    # One line per story (with its source count) under a token budget: every analyst and the Meta Reviewer read this
+    headlines = compress_headlines(headlines, max_tokens=COUNCIL_HEADLINE_TOKENS)
+    return create_market_prompt(date, market_data, headlines)
+
+def run_council_meeting(date, market_data, headlines, similarity_score=0.0):
+    """Sync entry point. Inside a running event loop, await arun_council_meeting() instead."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        raise RuntimeError("run_council_meeting() can't block a running event loop; use await arun_council_meeting()")
+    market_prompt = _open_meeting(date, market_data, headlines)
+
+    # 1-2. Analysts, macro context and RAG, concurrently under a quorum + deadline
+    reports, rag_context, macro_context = asyncio.run(convene_council(date, market_prompt))
+    return _close_meeting(date, market_data, reports, rag_context, macro_context, similarity_score)
+
+async def arun_council_meeting(date, market_data, headlines, similarity_score=0.0):
+    """run_council_meeting() for async callers: convenes on the caller's loop."""
+    market_prompt = _open_meeting(date, market_data, headlines)
+    reports, rag_context, macro_context = await convene_council(date, market_prompt)
+    # Synthesis, reporting and audit are blocking LLM calls: keep them off the caller's loop
+    return await asyncio.get_running_loop().run_in_executor(
+        None, _close_meeting, date, market_data, reports, rag_context, macro_context, similarity_score)
+
+def _close_meeting(date, market_data, reports, rag_context, macro_context, similarity_score):
     if not reports:
         print("❌ Council failed: No reports.")
         return None
 
-    # 2. RAG Retrieval
-    rag_context = retrieve_relevant_context(market_prompt)
-
     # 3. Meta Reviewer Synthesis
     meta = MetaReviewer()
     # Pass macro_context as the "new_era_context" slot (repurposing it for Macro)
@@ -0,0 +1,364 @@
+import sys
+import os
+import json
+import time
+import hashlib
+import argparse
+import numpy as np
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from regime_zero.engine.generations import current, new_generation, publish
+
+MASTER_FILE = "regime_zero/data/regimes/master_regime_history.jsonl"
+INDEX_DIR = "regime_zero/data/regimes/dense_index"
+
+INDEX_VERSION = 1
+EMBED_BATCH_SIZE = 64
+STUB_DIM = 256 # Dimension of the offline hashing embedder
+KMEANS_ITERATIONS = 15
+MIN_SCORE = 0.1
+
+# --- Embedding backends ---
+# An embed_fn takes a list of texts and returns a (len(texts), dim) float array.
+
+def remote_embed(texts):
+    """Embeds through utils.embedding (same model as the RAG tables), via the persistent embedding cache."""
+    from regime_zero.engine.embedding_cache import get_embeddings
+    vectors = get_embeddings(texts)
+    if any(v is None for v in vectors):
+        raise RuntimeError("Embedding backend returned no vector")
+    return np.asarray(vectors, dtype=np.float32)
+
+def hashing_embed(texts, dim=STUB_DIM):
+    """
+    Offline stand-in: hashed bag of words projected to `dim` dimensions with a fixed random matrix.
+    Deterministic, so an index built with it can be rebuilt and benchmarked without network access.
+    """
+    from sklearn.feature_extraction.text import HashingVectorizer
+    from sklearn.random_projection import SparseRandomProjection
+    hasher = HashingVectorizer(n_features=2 ** 16, stop_words='english', alternate_sign=False)
+    projection = SparseRandomProjection(n_components=dim, random_state=42)
+    counts = hasher.transform(texts)
+    projection.fit(counts[:1])
+    return np.asarray(projection.transform(counts).todense(), dtype=np.float32)
+
+EMBEDDERS = {"remote": remote_embed, "hashing": hashing_embed}
+EMBEDDER_DIMS = {"hashing": STUB_DIM} # Known up front; other embedders are checked against the first query
+
+def embedder_model(embedder):
+    """Model behind a named embedder, stored in meta.json so switching models invalidates the index."""
+    if embedder == "remote":
+        from regime_zero.engine.embedding_cache import remote_model
+        return remote_model()
+    return None
+
+def _normalize(x):
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return x / norms
+
+def _text_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+# --- Quantization ---
+
+def quantize(vectors, quant):
+    """Returns (codes, scales). int8 uses a symmetric per-row scale; float16 needs none."""
+    if quant == "float16":
+        return vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.round(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def dequantize(codes, scales):
+    return codes.astype(np.float32) * scales[:, None]
+
+# --- IVF ---
+
+def train_ivf(vectors, n_lists, iterations=KMEANS_ITERATIONS, seed=42):
+    """Spherical k-means. Returns (centroids, list_order, list_bounds) with rows grouped by list."""
+    rng = np.random.default_rng(seed)
+    n_lists = max(1, min(n_lists, len(vectors)))
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(n_lists):
+            members = vectors[assign == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+            else:
+                centroids[c] = vectors[rng.integers(len(vectors))] # Re-seed empty lists
+        centroids = _normalize(centroids)
+    assign = np.argmax(vectors @ centroids.T, axis=1)
+    list_order = np.argsort(assign, kind='stable').astype(np.int64)
+    list_bounds = np.searchsorted(assign[list_order], np.arange(n_lists + 1)).astype(np.int64)
+    return centroids.astype(np.float32), list_order, list_bounds
+
+class DenseIndex:
+    """
+    Embedding index over summary_text of the master regime history.
+      embeddings.npy                 - unit-norm float32 vectors (memory-mapped; only re-rank candidates are read)
+      codes.npy / scales.npy         - int8 (per-row scale) or float16 copy used for the approximate scan
+      centroids.npy / ivf_order.npy / ivf_bounds.npy - IVF lists (rows grouped by nearest centroid)
+      dates.json / offsets.npy / hashes.json         - rows sorted by date, byte offsets into the master file
+      meta.json                      - version, embedder (+ model), quantization, dim (written last)
+    An index built by a different embedder, model or dimension is treated as missing and rebuilt.
+    Saved as immutable generations (see generations.py): a rebuild never touches files a reader has mapped.
+    """
+    def __init__(self, master_file=MASTER_FILE, index_dir=INDEX_DIR, embed_fn=None, embedder="remote"):
+        self.master_file = master_file
+        self.index_dir = index_dir
+        self.embedder = embedder
+        self.model = embedder_model(embedder)
+        self.embed_fn = embed_fn or EMBEDDERS[embedder]
+        self.meta = {}
+        self.embeddings = None
+
+    def _path(self, name, root=None):
+        return os.path.join(root or self.index_dir, name)
+
+    def _read_master(self):
+        rows = []
+        with open(self.master_file, 'rb') as f:
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+                try:
+                    record = json.loads(line)
+                    rows.append((record.get('date', ''), offset, record.get('summary_text', '')))
+                except json.JSONDecodeError:
+                    continue
+        rows.sort(key=lambda r: r[0])
+        return rows
+
+    def _previous_embeddings(self):
+        """Text hash -> stored vector from the last build with the same embedder, so unchanged days are not re-embedded."""
+        if not self.load():
+            return {}
+        return {h: self.embeddings[i] for i, h in enumerate(self.hashes)}
+
+    def build(self, quant="int8", n_lists=None, reuse=True):
+        """Embeds (only new or changed days, in batches; every day without reuse), quantizes and trains the IVF lists."""
+        if not os.path.exists(self.master_file):
+            print("❌ Master file not found.")
+            return False
+        
+        print(f"🏗️ Building dense index ({self.embedder}, {quant})...")
+        rows = self._read_master()
+        if not rows:
+            print("⚠️ No data to index.")
+            return False
+        
+        hashes = [_text_hash(text) for _, _, text in rows]
+        previous = self._previous_embeddings() if reuse else {}
+        missing = [i for i, h in enumerate(hashes) if h not in previous]
+        
+        vectors = [None] * len(rows)
+        for i, h in enumerate(hashes):
+            if h in previous:
+                vectors[i] = np.array(previous[h], dtype=np.float32)
+        
+        for start in range(0, len(missing), EMBED_BATCH_SIZE):
+            batch = missing[start:start + EMBED_BATCH_SIZE]
+            embedded = _normalize(self.embed_fn([rows[i][2] for i in batch]))
+            for i, vec in zip(batch, embedded):
+                vectors[i] = vec
+            done = min(start + EMBED_BATCH_SIZE, len(missing))
+            if done == len(missing) or (start // EMBED_BATCH_SIZE) % 10 == 9:
+                print(f"   🧠 Embedded {done}/{len(missing)}")
+        
+        embeddings = np.vstack(vectors).astype(np.float32)
+        codes, scales = quantize(embeddings, quant)
+        n_lists = n_lists or max(1, int(np.sqrt(len(rows))))
+        centroids, list_order, list_bounds = train_ivf(embeddings, n_lists)
+        
+        # A new generation: the previous one (and this object's memory map of it) stays intact until published over
+        root = new_generation(self.index_dir)
+        np.save(self._path("embeddings.npy", root), embeddings)
+        np.save(self._path("codes.npy", root), codes)
+        np.save(self._path("scales.npy", root), scales)
+        np.save(self._path("centroids.npy", root), centroids)
+        np.save(self._path("ivf_order.npy", root), list_order)
+        np.save(self._path("ivf_bounds.npy", root), list_bounds)
+        np.save(self._path("offsets.npy", root), np.asarray([r[1] for r in rows], dtype=np.int64))
+        with open(self._path("dates.json", root), 'w') as f:
+            json.dump([r[0] for r in rows], f)
+        with open(self._path("hashes.json", root), 'w') as f:
+            json.dump(hashes, f)
+        with open(self._path("meta.json", root), 'w') as f:
+            json.dump({
+                "version": INDEX_VERSION,
+                "embedder": self.embedder,
+                "model": self.model,
+                "quant": quant,
+                "dim": int(embeddings.shape[1]),
+                "n_rows": len(rows),
+                "n_lists": int(len(centroids))
+            }, f, indent=2)
+        publish(self.index_dir, root)
+        
+        print(f"✅ Dense index built: {len(rows)} rows ({len(missing)} newly embedded), {len(centroids)} IVF lists.")
+        return self.load()
+
+    def load(self):
+        """Loads the stored index. Returns False if it is missing, from another version or from another embedder."""
+        root = current(self.index_dir) # Every file from the same build
+        try:
+            with open(self._path("meta.json", root), 'r') as f:
+                meta = json.load(f)
+            if meta.get('version') != INDEX_VERSION:
+                return False
+            expected_dim = EMBEDDER_DIMS.get(self.embedder)
+            if (meta.get('embedder') != self.embedder or meta.get('model') != self.model
+                    or (expected_dim is not None and meta.get('dim') != expected_dim)):
+                print(f"⚠️ Dense index was built with {meta.get('embedder')}/{meta.get('model')} (dim {meta.get('dim')}), "
+                      f"not {self.embedder}/{self.model}. Ignoring it.")
+                return False
+            self.embeddings = np.load(self._path("embeddings.npy", root), mmap_mode='r')
+            self.codes = np.load(self._path("codes.npy", root))
+            self.scales = np.load(self._path("scales.npy", root))
+            self.centroids = np.load(self._path("centroids.npy", root))
+            self.list_order = np.load(self._path("ivf_order.npy", root))
+            self.list_bounds = np.load(self._path("ivf_bounds.npy", root))
+            self.offsets = np.load(self._path("offsets.npy", root))
+            with open(self._path("dates.json", root), 'r') as f:
+                self.dates = np.asarray(json.load(f), dtype=str)
+            with open(self._path("hashes.json", root), 'r') as f:
+                self.hashes = json.load(f)
+        except (OSError, ValueError, KeyError):
+            return False
+        self.meta = meta
+        return True
+
+    def _ensure_loaded(self):
+        if self.embeddings is None and not self.load():
+            self.build()
+        return self.embeddings is not None
+
+    def get_records(self, idxs):
+        """Reads records from the master file by byte offset. Returns {idx: record}."""
+        records = {}
+        with open(self.master_file, 'rb') as f:
+            for idx in sorted(set(idxs), key=lambda i: self.offsets[i]):
+                f.seek(int(self.offsets[idx]))
+                records[idx] = json.loads(f.readline())
+        return records
+
+    # --- Search ---
+
+    def exact_search_vector(self, query_vec, top_k=10, filter_date=None):
+        """Brute force over the full-precision vectors. Returns [(score, row)]."""
+        limit = self._limit(filter_date)
+        if limit == 0:
+            return []
+        scores = np.asarray(self.embeddings[:limit] @ query_vec)
+        return self._top(scores, np.arange(limit), top_k)
+
+    def search_vector(self, query_vec, top_k=10, filter_date=None, nprobe=8, rerank=4):
+        """
+        IVF search: probe the nprobe closest lists, score their rows on the quantized codes,
+        then re-rank the best top_k * rerank candidates exactly. Returns [(score, row)].
+        """
+        limit = self._limit(filter_date)
+        if limit == 0:
+            return []
+        
+        lists = np.argsort(-(self.centroids @ query_vec))[:nprobe]
+        candidates = np.concatenate([self.list_order[self.list_bounds[c]:self.list_bounds[c + 1]] for c in lists])
+        candidates = candidates[candidates < limit]
+        if len(candidates) == 0:
+            return []
+        
+        approx = (self.codes[candidates].astype(np.float32) @ query_vec) * self.scales[candidates]
+        keep = min(len(candidates), top_k * rerank)
+        shortlist = np.sort(candidates[np.argpartition(-approx, keep - 1)[:keep]])
+        
+        # Exact re-rank: only the shortlisted rows are paged in from embeddings.npy
+        exact = np.asarray(self.embeddings[shortlist] @ query_vec)
+        return self._top(exact, shortlist, top_k)
+
+    def _limit(self, filter_date):
+        if not filter_date:
+            return len(self.dates)
+        return int(np.searchsorted(self.dates, filter_date, side='left'))
+
+    @staticmethod
+    def _top(scores, rows, top_k):
+        k = min(top_k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [(float(scores[i]), int(rows[i])) for i in best if scores[i] >= MIN_SCORE]
+
+    def embed_query(self, query_text):
+        return _normalize(self.embed_fn([query_text]))[0].astype(np.float32)
+
+    def search(self, query_text, top_k=10, filter_date=None, nprobe=8):
+        """Same contract as VectorIndexer.search: [(score, record)] for records strictly before filter_date."""
+        if not self._ensure_loaded():
+            return []
+        query_vec = self.embed_query(query_text)
+        if len(query_vec) != self.meta['dim']:
+            # Same embedder name, different output (e.g. the backend model changed): the stored vectors are unusable
+            print(f"⚠️ Query embedding has dim {len(query_vec)}, dense index has {self.meta['dim']}. Rebuilding...")
+            if not self.build(quant=self.meta.get('quant', "int8"), reuse=False):
+                return []
+        hits = self.search_vector(query_vec, top_k=top_k, filter_date=filter_date, nprobe=nprobe)
+        records = self.get_records([row for _, row in hits])
+        return [(score, records[row]) for score, row in hits]
+
+    # --- Benchmark ---
+
+    def benchmark(self, n_queries=100, top_k=10, nprobes=(1, 2, 4, 8, 16), seed=0):
+        """
+        Recall@k and latency of the IVF search against brute force.
+        Queries are stored rows (as a backfill would issue them), each restricted to its own past.
+        """
+        if not self._ensure_loaded():
+            return []
+        rng = np.random.default_rng(seed)
+        rows = rng.choice(len(self.dates), min(n_queries, len(self.dates)), replace=False)
+        queries = [(np.asarray(self.embeddings[r], dtype=np.float32), self.dates[r]) for r in rows]
+        
+        t0 = time.perf_counter()
+        truth = [{row for _, row in self.exact_search_vector(q, top_k, d)} for q, d in queries]
+        exact_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+        print(f"📏 Brute force: {exact_ms:.3f} ms/query ({len(self.dates)} rows, dim {self.meta['dim']}, {self.meta['quant']})")
+        
+        report = []
+        for nprobe in nprobes:
+            t0 = time.perf_counter()
+            found = [{row for _, row in self.search_vector(q, top_k, d, nprobe=nprobe)} for q, d in queries]
+            ivf_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+            scored = [(len(f & t), len(t)) for f, t in zip(found, truth) if t]
+            recall = sum(a for a, _ in scored) / max(1, sum(b for _, b in scored))
+            report.append({"nprobe": nprobe, "recall": recall, "ms_per_query": ivf_ms, "exact_ms_per_query": exact_ms})
+            print(f"   nprobe={nprobe:<3} recall@{top_k}={recall:.3f}  {ivf_ms:.3f} ms/query")
+        return report
+
+if __name__ == "__main__":
+    # Usage:
+    #   python regime_zero/engine/dense_index.py build [--embedder hashing] [--quant float16]
+    #   python regime_zero/engine/dense_index.py bench [--embedder hashing]
+    #   python regime_zero/engine/dense_index.py search "query text" [--before YYYY-MM-DD]
+    parser = argparse.ArgumentParser(description="Dense embedding index over regime history")
+    parser.add_argument("command", choices=["build", "bench", "search"])
+    parser.add_argument("query", nargs="?", default="")
+    parser.add_argument("--embedder", choices=sorted(EMBEDDERS), default="remote", help="'hashing' builds fully offline")
+    parser.add_argument("--quant", choices=["int8", "float16"], default="int8")
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    parser.add_argument("--before", default=None)
+    args = parser.parse_args()
+
+    index = DenseIndex(index_dir=args.index_dir, embedder=args.embedder)
+    if args.command == "build":
+        index.build(quant=args.quant)
+    elif args.command == "bench":
+        index.benchmark()
+    else:
+        for score, record in index.search(args.query, filter_date=args.before):
+            print(f"{score:.3f}  {record['date']}")
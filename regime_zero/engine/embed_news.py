@@ -0,0 +1,227 @@
+import sys
+import os
+import json
+import time
+import argparse
+import numpy as np
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from regime_zero.engine.embedding_cache import remote_embed_batch
+
+STORE_DIR = "regime_zero/data/news_embeddings"
+STORE_VERSION = 1
+PAGE_SIZE = 1000 # Articles fetched (and checkpointed) per step
+EMBED_BATCH = 100 # Texts per embedding request
+WORKERS = 4
+MAX_TEXT_CHARS = 2000
+MAX_PENDING = 5000 # Ids passed unrefined or whose embedding failed, re-checked on later passes (newest kept)
+POLL_SECONDS = 300
+
+def article_text(article):
+    text = (article.get('title') or "").strip()
+    summary = (article.get('summary') or "").strip()
+    if summary:
+        text += ". " + summary
+    return text[:MAX_TEXT_CHARS]
+
+class NewsEmbeddingStore:
+    """
+    Local store of ingest_news embeddings, appended one part per checkpoint:
+      part_<n>.npy / ids_<n>.npy - float16 (rows, dim) vectors and their article ids
+      state.json                 - id cursor, part count, pending ids, totals (written last)
+    A crash between writing a part and the state leaves a part that the resumed run overwrites.
+    """
+    def __init__(self, store_dir=STORE_DIR):
+        self.store_dir = store_dir
+        self.state = {"version": STORE_VERSION, "cursor": 0, "parts": 0, "rows": 0, "pending": [], "dim": None}
+        self.load_state()
+
+    def _path(self, name):
+        return os.path.join(self.store_dir, name)
+
+    def load_state(self):
+        try:
+            with open(self._path("state.json"), 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if state.get('version') == STORE_VERSION:
+            self.state = state
+
+    def append(self, ids, vectors, cursor, pending):
+        """Writes one part and advances the checkpoint."""
+        os.makedirs(self.store_dir, exist_ok=True)
+        if len(ids):
+            part = self.state['parts']
+            np.save(self._path(f"ids_{part}.npy"), np.asarray(ids, dtype=np.int64))
+            np.save(self._path(f"part_{part}.npy"), np.asarray(vectors, dtype=np.float16))
+            self.state['parts'] = part + 1
+            self.state['rows'] += len(ids)
+            self.state['dim'] = int(np.asarray(vectors).shape[1])
+        self.state['cursor'] = cursor
+        self.state['pending'] = sorted(pending)[-MAX_PENDING:]
+        tmp_path = self._path("state.json.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self._path("state.json"))
+
+    def load(self):
+        """(ids, float32 matrix) of everything embedded so far. A re-embedded id keeps its latest vector."""
+        ids, parts = [], []
+        for part in range(self.state['parts']):
+            ids.append(np.load(self._path(f"ids_{part}.npy")))
+            parts.append(np.load(self._path(f"part_{part}.npy"), mmap_mode='r'))
+        if not ids:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, self.state['dim'] or 0), dtype=np.float32)
+        ids = np.concatenate(ids)
+        matrix = np.concatenate(parts).astype(np.float32)
+        _, last = np.unique(ids[::-1], return_index=True)
+        keep = np.sort(len(ids) - 1 - last)
+        return ids[keep], matrix[keep]
+
+class NewsEmbedder:
+    """
+    Resumable backfill + follow job for refined ingest_news articles.
+    Pages through ingest_news by id (cursor checkpointed after every page), embeds refined rows in
+    parallel batches and stores them locally and/or in ingest_news.embedding. Rows not refined yet
+    when the cursor passes them, or whose embedding failed, are kept as pending and retried later;
+    an id leaves pending only once a vector has been stored for it.
+    """
+    def __init__(self, store=None, client=None, embed_fn=None, workers=WORKERS, to_db=False, local=True):
+        self.store = store or NewsEmbeddingStore()
+        self._client = client
+        self.embed_fn = embed_fn or remote_embed_batch
+        self.workers = workers
+        self.to_db = to_db
+        self.local = local
+        self.embedded = 0
+        self.seconds = 0.0
+
+    @property
+    def client(self):
+        if self._client is None:
+            from regime_zero.engine.rag_retriever import supabase
+            self._client = supabase
+        return self._client
+
+    def _embed(self, texts):
+        batches = [texts[i:i + EMBED_BATCH] for i in range(0, len(texts), EMBED_BATCH)]
+        if self.workers <= 1 or len(batches) == 1:
+            results = [self.embed_fn(batch) for batch in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                results = list(pool.map(self.embed_fn, batches))
+        return [vector for batch in results for vector in batch]
+
+    def _write_db(self, ids, vectors):
+        for i in range(0, len(ids), EMBED_BATCH):
+            self.client.rpc("set_news_embeddings", {
+                "ids": [int(x) for x in ids[i:i + EMBED_BATCH]],
+                "embeddings": [json.dumps([round(float(v), 6) for v in vec]) for vec in vectors[i:i + EMBED_BATCH]]
+            }).execute()
+
+    def _process(self, articles):
+        """Embeds refined articles; returns (ids, vectors) of the ones that got a vector."""
+        if not articles:
+            return [], []
+        started = time.time()
+        vectors = self._embed([article_text(a) for a in articles])
+        done = [(a['id'], v) for a, v in zip(articles, vectors) if v is not None and len(v)]
+        ids = [i for i, _ in done]
+        vectors = np.asarray([v for _, v in done], dtype=np.float32)
+        if self.to_db and ids:
+            self._write_db(ids, vectors)
+        self.embedded += len(ids)
+        self.seconds += time.time() - started
+        return ids, vectors
+
+    def _recheck_pending(self, pending):
+        """Pending ids that have been refined since: embedded now, dropped from pending once they got a vector."""
+        if not pending:
+            return [], [], pending
+        refined = []
+        for i in range(0, len(pending), PAGE_SIZE):
+            res = self.client.table("ingest_news").select("id, title, summary") \
+                .in_("id", pending[i:i + PAGE_SIZE]).eq("is_refined", True).execute()
+            refined.extend(res.data or [])
+        ids, vectors = self._process(refined)
+        done = set(ids)
+        return ids, vectors, [p for p in pending if p not in done]
+
+    def step(self):
+        """One page: returns the number of rows fetched (0 = caught up)."""
+        cursor = self.store.state['cursor']
+        res = self.client.table("ingest_news").select("id, title, summary, is_refined") \
+            .gt("id", cursor).order("id").limit(PAGE_SIZE).execute()
+        rows = res.data or []
+        pending = list(self.store.state['pending'])
+        if not rows:
+            return 0
+        
+        refined = [r for r in rows if r.get('is_refined')]
+        pending.extend(r['id'] for r in rows if not r.get('is_refined'))
+        ids, vectors = self._process(refined)
+        done = set(ids)
+        pending.extend(r['id'] for r in refined if r['id'] not in done) # Embedding failed: retry from pending
+        self._checkpoint(ids, vectors, rows[-1]['id'], pending)
+        return len(rows)
+
+    def _checkpoint(self, ids, vectors, cursor, pending):
+        if self.local:
+            self.store.append(ids, vectors, cursor, pending)
+        else:
+            self.store.append([], [], cursor, pending)
+
+    def lag(self):
+        """(refined rows past the cursor, age in hours of the oldest of them: how far behind the stream is)."""
+        cursor = self.store.state['cursor']
+        res = self.client.table("ingest_news").select("id, published_at", count="exact") \
+            .gt("id", cursor).eq("is_refined", True).order("id").limit(1).execute()
+        behind = res.count or 0
+        if not res.data or not res.data[0].get('published_at'):
+            return behind, 0.0
+        oldest = datetime.fromisoformat(str(res.data[0]['published_at']).replace("Z", "+00:00"))
+        if oldest.tzinfo is None:
+            oldest = oldest.replace(tzinfo=timezone.utc) # timestamp without time zone columns are stored as UTC
+        return behind, (datetime.now(timezone.utc) - oldest).total_seconds() / 3600
+
+    def report(self, label):
+        rate = self.embedded / self.seconds if self.seconds else 0.0
+        behind, hours = self.lag()
+        print(f"📊 [{label}] {self.embedded} embedded, {rate:.1f} articles/s | cursor {self.store.state['cursor']}, "
+              f"{behind} refined behind ({hours:.1f}h), {len(self.store.state['pending'])} pending")
+
+    def run(self, follow=False, max_pages=None):
+        """Backfills until caught up; with follow, keeps polling for new inserts."""
+        pages = 0
+        while True:
+            ids, vectors, pending = self._recheck_pending(self.store.state['pending'])
+            if ids or pending != self.store.state['pending']:
+                self._checkpoint(ids, vectors, self.store.state['cursor'], pending)
+            
+            while max_pages is None or pages < max_pages:
+                if self.step() == 0:
+                    break
+                pages += 1
+                self.report("backfill")
+            if not follow or (max_pages is not None and pages >= max_pages):
+                return
+            self.report("follow")
+            time.sleep(POLL_SECONDS)
+
+if __name__ == "__main__":
+    # Usage: python regime_zero/engine/embed_news.py [--follow] [--to-db] [--no-local] [--workers 4] [--max-pages N]
+    parser = argparse.ArgumentParser(description="Resumable embedding backfill for refined ingest_news")
+    parser.add_argument("--follow", action="store_true", help="Keep polling for new articles after catching up")
+    parser.add_argument("--to-db", action="store_true", help="Also write ingest_news.embedding (see infra/add_news_embeddings.sql)")
+    parser.add_argument("--no-local", action="store_true", help="Don't keep the local float16 store")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--max-pages", type=int, default=None)
+    args = parser.parse_args()
+
+    embedder = NewsEmbedder(workers=args.workers, to_db=args.to_db, local=not args.no_local)
+    embedder.run(follow=args.follow, max_pages=args.max_pages)
@@ -0,0 +1,231 @@
+import sys
+import os
+import json
+import hashlib
+import uuid
+import fcntl
+import glob
+import threading
+import numpy as np
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+CACHE_DIR = "regime_zero/data/embedding_cache"
+CACHE_VERSION = 2 # v2: uuid shard names, model id in keys
+MAX_BYTES = 256 * 1024 * 1024 # Least recently used vectors are evicted past this
+COMPACT_BELOW = 0.5 # Shards with less than this share of live rows are rewritten on eviction
+FLUSH_USES = 1000 # Cache hits whose LRU stamps may stay unsaved (index.json is rewritten with the next miss anyway)
+REMOTE_MODEL_ATTRS = ("EMBEDDING_MODEL", "MODEL", "MODEL_NAME") # Where utils.embedding may name its model
+DEFAULT_REMOTE_MODEL = "text-embedding-3-small" # 1536-d, like the RAG tables; override with $EMBEDDING_MODEL
+
+def remote_model():
+    """Model id behind remote_embed_batch: the backend's own constant if it has one, else $EMBEDDING_MODEL."""
+    try:
+        import utils.embedding as backend
+    except ImportError:
+        backend = None
+    for attr in REMOTE_MODEL_ATTRS:
+        value = getattr(backend, attr, None)
+        if isinstance(value, str) and value:
+            return value
+    return os.getenv("EMBEDDING_MODEL", DEFAULT_REMOTE_MODEL)
+
+def remote_embed_batch(texts):
+    """
+    Embeds through utils.embedding in one request when it exposes a batch helper, else one call
+    per text. Returns a list aligned with `texts` (None where embedding failed).
+    """
+    import utils.embedding as backend
+    batch_fn = getattr(backend, "get_embeddings_sync", None)
+    if batch_fn is not None:
+        return list(batch_fn(texts))
+    return [backend.get_embedding_sync(text) for text in texts]
+
+def _key(model, text):
+    return model + ":" + hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache keyed by (model id, sha1 of the text).
+      shard_<uuid>.npy - float32 (rows, dim) vectors, one shard per batch of misses (memory-mapped on read)
+      index.json       - key -> shard/row/last use, per-shard row counts (written last, atomically)
+    Only misses go to the embedder, all in one batch. Past max_bytes the least recently used
+    vectors are dropped; shards left mostly empty are compacted.
+    Several processes can share a cache: shard names never collide, and saving merges this process's
+    entries into the on-disk index under an exclusive lock (index.lock). Within a process, threads
+    share an instance through self._lock; embedding calls run outside it.
+    """
+    def __init__(self, cache_dir=CACHE_DIR, model=None, embed_fn=None, max_bytes=MAX_BYTES):
+        if model is None and embed_fn is not None:
+            raise ValueError("EmbeddingCache needs the model id of a custom embed_fn")
+        self.cache_dir = cache_dir
+        self.model = model or remote_model()
+        self.embed_fn = embed_fn or remote_embed_batch
+        self.max_bytes = max_bytes
+        self.entries = {} # key -> {"shard", "row", "used"}
+        self.shards = {} # shard name -> {"rows", "dim"}
+        self.clock = 0
+        self._arrays = {}
+        self._unsaved_uses = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def _read_index(self):
+        try:
+            with open(self._path("index.json"), 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return index if index.get('version') == CACHE_VERSION else None
+
+    def _load(self):
+        index = self._read_index()
+        if index is None:
+            return
+        self.entries = index['entries']
+        self.shards = index['shards']
+        self.clock = index['clock']
+
+    def _merge(self, index):
+        """Adopts entries other processes saved meanwhile; drops ours whose shard another process deleted."""
+        if index is not None:
+            self.clock = max(self.clock, index['clock'])
+            for key, entry in index['entries'].items():
+                ours = self.entries.get(key)
+                if ours is None:
+                    self.entries[key] = entry
+                    self.shards.setdefault(entry['shard'], index['shards'][entry['shard']])
+                else:
+                    ours['used'] = max(ours['used'], entry['used'])
+        for shard in [s for s in self.shards if not os.path.exists(self._path(s))]:
+            del self.shards[shard]
+            self._arrays.pop(shard, None)
+        self.entries = {k: e for k, e in self.entries.items() if e['shard'] in self.shards}
+
+    def _save(self):
+        """Merge with the on-disk index, evict, publish: all under the lock, so concurrent writers can't lose entries."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self._path("index.lock"), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            index = self._read_index()
+            if index is None:
+                # Missing or older format: shards of a previous layout are unreachable
+                for legacy in glob.glob(self._path("shard_[0-9]*.npy")):
+                    if os.path.basename(legacy)[len("shard_"):-len(".npy")].isdigit():
+                        os.remove(legacy)
+            self._merge(index)
+            self._evict()
+            tmp_path = self._path(f"index.json.{os.getpid()}.tmp")
+            with open(tmp_path, 'w') as f:
+                json.dump({"version": CACHE_VERSION, "clock": self.clock, "shards": self.shards, "entries": self.entries}, f)
+            os.replace(tmp_path, self._path("index.json"))
+        self._unsaved_uses = 0
+
+    def _array(self, shard):
+        if shard not in self._arrays:
+            self._arrays[shard] = np.load(self._path(shard), mmap_mode='r')
+        return self._arrays[shard]
+
+    def _write_shard(self, vectors):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        name = f"shard_{uuid.uuid4().hex}.npy" # Unique across processes: no allocation race
+        tmp_path = self._path(name + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.asarray(vectors, dtype=np.float32))
+        os.replace(tmp_path, self._path(name))
+        self.shards[name] = {"rows": len(vectors), "dim": int(vectors.shape[1])}
+        return name
+
+    def _total_bytes(self):
+        return sum(self.shards[e['shard']]['dim'] * 4 for e in self.entries.values())
+
+    def _evict(self):
+        """Drops least recently used entries past max_bytes, then deletes or compacts emptied shards."""
+        total = self._total_bytes()
+        if total <= self.max_bytes:
+            return
+        for key in sorted(self.entries, key=lambda k: self.entries[k]['used']):
+            if total <= self.max_bytes:
+                break
+            total -= self.shards[self.entries[key]['shard']]['dim'] * 4
+            del self.entries[key]
+        
+        live = {}
+        for key, entry in self.entries.items():
+            live.setdefault(entry['shard'], []).append(key)
+        for shard in list(self.shards):
+            keys = live.get(shard, [])
+            if len(keys) >= COMPACT_BELOW * self.shards[shard]['rows']:
+                continue
+            if keys:
+                rows = np.asarray(self._array(shard)[[self.entries[k]['row'] for k in keys]])
+                new_shard = self._write_shard(rows)
+                for row, key in enumerate(keys):
+                    self.entries[key].update({"shard": new_shard, "row": row})
+            self._arrays.pop(shard, None)
+            del self.shards[shard]
+            if os.path.exists(self._path(shard)):
+                os.remove(self._path(shard))
+
+    def get_many(self, texts):
+        """Embeddings for `texts` (float32 arrays, None where the embedder failed). Misses are embedded in one batch."""
+        keys = [_key(self.model, t) for t in texts]
+        results = [None] * len(texts)
+        
+        misses = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self.entries.get(key)
+                if entry is None:
+                    misses.setdefault(key, []).append(i)
+                    continue
+                try:
+                    vector = np.array(self._array(entry['shard'])[entry['row']])
+                except OSError:
+                    # Shard compacted away by another process since we loaded the index
+                    del self.entries[key]
+                    misses.setdefault(key, []).append(i)
+                    continue
+                self.clock += 1
+                entry['used'] = self.clock
+                self._unsaved_uses += 1
+                results[i] = vector
+        
+        fresh = []
+        if misses:
+            # Outside the lock: other threads keep being served from the cache while this batch is embedded
+            miss_keys = list(misses)
+            embedded = self.embed_fn([texts[misses[k][0]] for k in miss_keys])
+            fresh = [(k, np.asarray(v, dtype=np.float32)) for k, v in zip(miss_keys, embedded) if v is not None and len(v)]
+        
+        with self._lock:
+            if fresh:
+                shard = self._write_shard(np.stack([v for _, v in fresh]))
+                for row, (key, vector) in enumerate(fresh):
+                    self.clock += 1
+                    self.entries[key] = {"shard": shard, "row": row, "used": self.clock}
+                    for i in misses[key]:
+                        results[i] = vector
+            # All hits: only LRU stamps changed, so the index is rewritten once per FLUSH_USES of them
+            if fresh or self._unsaved_uses >= FLUSH_USES:
+                self._save()
+        return results
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+def get_embeddings(texts):
+    """Cached drop-in for batches: list of embeddings as float lists (None where embedding failed)."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = EmbeddingCache()
+    return [None if v is None else v.tolist() for v in _CACHE.get_many(list(texts))]
+
+def get_embedding(text):
+    """Cached drop-in for utils.embedding.get_embedding_sync."""
+    return get_embeddings([text])[0]
@@ -5,7 +5,8 @@ import json
 # Add project root to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from utils.openrouter_client import ask_llm
+from regime_zero.engine.llm_gateway import ask_llm
+from regime_zero.engine.matcher import medoid_date
 
 HISTORY_FILE = "regime_zero/data/history_vectors.jsonl"
 
@@ -27,9 +28,8 @@ def explain_regime_match(today_date, today_prompt, matched_regime, similarity_sc
     """
     print(f"🧠 [Regime Zero] Explaining Match: {today_date} vs {matched_regime['name']}...")
     
-    # Get a representative date from the regime
-    # Ideally the one closest to centroid, but first one is fine for now
-    ref_date = matched_regime['dates'][0]
+    # Get a representative date from the regime (member closest to the centroid)
+    ref_date = medoid_date(matched_regime)
     history_prompts = load_history_prompts()
     ref_prompt = history_prompts.get(ref_date, "No data available.")
     
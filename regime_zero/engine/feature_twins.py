@@ -0,0 +1,362 @@
+import sys
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from datetime import date as _date
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from regime_zero.engine.columnar_store import load_table
+from regime_zero.engine.forward_returns import PRICE_DIR, PRICE_SUFFIX
+
+FEATURE_DIR = "regime_zero/data/feature_twins"
+MASTER_FILE = "regime_zero/data/regimes/master_regime_history.jsonl"
+
+FEATURE_VERSION = 1
+
+# Short name -> ingest_prices ticker (same universe as run_daily_ingest.ASSETS)
+FEATURE_ASSETS = {
+    "DXY": "DX-Y.NYB",
+    "GOLD": "GC=F",
+    "CRUDE": "CL=F",
+    "US10Y": "^TNX",
+    "VIX": "^VIX",
+    "SPY": "SPY",
+    "BTC": "BTC-USD"
+}
+# Assets whose level carries meaning on its own (a 30 VIX is a 30 VIX in any decade).
+# Their "returns" are level changes instead of log returns.
+LEVEL_ASSETS = ("US10Y", "VIX")
+
+RETURN_WINDOWS = (1, 5, 20)
+VOL_WINDOW = 20
+ZSCORE_WINDOW = 252
+STANDARDIZE_MIN_PERIODS = 252 # Expanding (past-only) standardization needs this much history first
+CLIP = 5.0
+MAX_STALE_DAYS = 4 # Forward-fill across weekends/holidays, but not across data gaps
+MIN_OVERLAP = 0.5 # Share of the query's feature weight both days must have for a distance to count
+
+EXCLUDE_DAYS = 30 # Rolling features make last week look like a twin of this week
+SEPARATION_DAYS = 10 # Returned twins are at least this far apart (one per episode)
+
+# --- Price panel ---
+
+def _local_price_file(price_dir, name, ticker):
+    for stem in (name, ticker):
+        path = os.path.join(price_dir, f"{stem}{PRICE_SUFFIX}")
+        if os.path.exists(path):
+            return path
+    return None
+
+def load_local_prices(price_dir=PRICE_DIR, assets=FEATURE_ASSETS):
+    """{name: close Series indexed by date} from the market_data price histories (by short name or ticker)."""
+    closes = {}
+    for name, ticker in assets.items():
+        path = _local_price_file(price_dir, name, ticker)
+        if path is None:
+            continue
+        df = load_table(path, date_columns=("Date",), columns=["Date", "Close"]).dropna(subset=["Date", "Close"])
+        if df.empty:
+            continue
+        series = pd.Series(pd.to_numeric(df['Close'], errors='coerce').to_numpy(), index=df['Date'].dt.normalize())
+        closes[name] = series[~series.index.duplicated(keep='last')].sort_index().dropna()
+    return closes
+
+def load_supabase_prices(assets=FEATURE_ASSETS, page_size=1000):
+    """Same as load_local_prices, read from the ingest_prices table instead."""
+    from dotenv import load_dotenv
+    from supabase import create_client
+    load_dotenv()
+    supabase = create_client(os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_KEY"))
+
+    closes = {}
+    for name, ticker in assets.items():
+        rows = []
+        start = 0
+        while True:
+            res = supabase.table("ingest_prices").select("date, close").eq("ticker", ticker).order("date").range(start, start + page_size - 1).execute()
+            rows.extend(res.data or [])
+            if not res.data or len(res.data) < page_size:
+                break
+            start += page_size
+        if rows:
+            series = pd.Series([float(r['close']) for r in rows], index=pd.to_datetime([r['date'] for r in rows]))
+            closes[name] = series[~series.index.duplicated(keep='last')].sort_index().dropna()
+    return closes
+
+# --- Features ---
+
+def asset_features(name, close):
+    """Raw daily features of one asset on its own trading days."""
+    level_asset = name in LEVEL_ASSETS
+    change = close.diff() if level_asset else np.log(close).diff()
+    features = {}
+    for window in RETURN_WINDOWS:
+        features[f"{name}_ret_{window}d"] = change.rolling(window).sum()
+    features[f"{name}_vol_{VOL_WINDOW}d"] = change.rolling(VOL_WINDOW).std() * np.sqrt(252)
+    rolling = close.rolling(ZSCORE_WINDOW, min_periods=ZSCORE_WINDOW // 2)
+    features[f"{name}_z_{ZSCORE_WINDOW}d"] = (close - rolling.mean()) / rolling.std()
+    if level_asset:
+        features[f"{name}_level"] = close
+    return pd.DataFrame(features)
+
+def build_feature_matrix(closes):
+    """
+    (dates, feature names, float32 matrix) on the union of all trading days.
+    Each column is standardized with its expanding mean/std, so a row only uses information
+    available on that date. Missing values stay NaN and are skipped by the distance.
+    """
+    frames = [asset_features(name, close) for name, close in closes.items() if len(close)]
+    if not frames:
+        return [], [], np.zeros((0, 0), dtype=np.float32)
+    raw = pd.concat(frames, axis=1).sort_index()
+    raw = raw.ffill(limit=MAX_STALE_DAYS)
+
+    # Past-only standardization (shifted: today's value doesn't move today's mean)
+    expanding = raw.expanding(min_periods=STANDARDIZE_MIN_PERIODS)
+    mean, std = expanding.mean().shift(1), expanding.std().shift(1)
+    standardized = ((raw - mean) / std.replace(0, np.nan)).clip(-CLIP, CLIP)
+    standardized = standardized[standardized.notna().any(axis=1)]
+
+    dates = [d.strftime("%Y-%m-%d") for d in standardized.index]
+    return dates, list(standardized.columns), standardized.to_numpy(dtype=np.float32)
+
+def _fingerprint(price_dir, assets):
+    fp = {}
+    for name, ticker in assets.items():
+        path = _local_price_file(price_dir, name, ticker)
+        if path:
+            stat = os.stat(path)
+            fp[name] = {"file": os.path.basename(path), "size": stat.st_size, "mtime": stat.st_mtime_ns}
+    return fp
+
+# --- Search ---
+
+class FeatureTwins:
+    """
+    Nearest past days by standardized market features (returns, realized vol, levels, z-scores)
+    across FEATURE_ASSETS. No LLM or text involved.
+      features.npy - (n_dates, n_features) float32, NaN where an asset had no data yet
+      dates.json / columns.json / meta.json (written last, with the price file fingerprint)
+    Distances are the weighted RMS difference over the features both days have, computed for
+    all candidates at once as three matrix products.
+    """
+    def __init__(self, price_dir=PRICE_DIR, feature_dir=FEATURE_DIR, assets=FEATURE_ASSETS, source="local"):
+        self.price_dir = price_dir
+        self.feature_dir = feature_dir
+        self.assets = assets
+        self.source = source
+        self.dates = np.asarray([], dtype=str)
+        self._days = np.zeros(0, dtype=np.int64) # Dates as day numbers
+        self.columns = []
+        self.features = np.zeros((0, 0), dtype=np.float32)
+        self.meta = {}
+        self._terms = None
+        self._weights_key = None
+
+    def _path(self, name):
+        return os.path.join(self.feature_dir, name)
+
+    def build(self):
+        closes = load_supabase_prices(self.assets) if self.source == "supabase" else load_local_prices(self.price_dir, self.assets)
+        if not closes:
+            print("⚠️ No price histories found for the feature assets.")
+            return
+        dates, columns, features = build_feature_matrix(closes)
+        
+        os.makedirs(self.feature_dir, exist_ok=True)
+        np.save(self._path("features.npy"), features)
+        with open(self._path("dates.json"), 'w') as f:
+            json.dump(dates, f)
+        with open(self._path("columns.json"), 'w') as f:
+            json.dump(columns, f)
+        self.meta = {"version": FEATURE_VERSION, "source": self.source, "assets": sorted(closes),
+                     "shape": list(features.shape), "prices": _fingerprint(self.price_dir, self.assets),
+                     "built": _date.today().isoformat()}
+        with open(self._path("meta.json"), 'w') as f:
+            json.dump(self.meta, f, indent=2)
+        
+        self.dates, self.columns, self.features = np.asarray(dates), columns, features
+        self._days = self.dates.astype('datetime64[D]').astype(np.int64)
+        self._terms = None
+        print(f"📐 Feature twins: {len(dates)} dates x {len(columns)} features ({', '.join(sorted(closes))})")
+
+    def load(self):
+        """Loads the cached feature matrix, rebuilding it when missing or when a price file changed."""
+        try:
+            with open(self._path("meta.json"), 'r') as f:
+                meta = json.load(f)
+            # Local files are compared by fingerprint; ingest_prices has none, so it is re-read once a day
+            if self.source == "supabase":
+                current = meta.get('built') == _date.today().isoformat()
+            else:
+                current = meta.get('prices') == _fingerprint(self.price_dir, self.assets)
+            fresh = meta.get('version') == FEATURE_VERSION and meta.get('source') == self.source and current
+            if fresh:
+                self.features = np.load(self._path("features.npy"))
+                with open(self._path("dates.json"), 'r') as f:
+                    self.dates = np.asarray(json.load(f))
+                self._days = self.dates.astype('datetime64[D]').astype(np.int64)
+                with open(self._path("columns.json"), 'r') as f:
+                    self.columns = json.load(f)
+                self.meta = meta
+                self._terms = None
+                return
+        except (OSError, ValueError):
+            pass
+        self.build()
+
+    def _weight_vector(self, weights):
+        """Per-feature weights from {asset or feature name: weight} (default 1)."""
+        weights = weights or {}
+        return np.array([weights.get(c, weights.get(c.split("_")[0], 1.0)) for c in self.columns], dtype=np.float32)
+
+    def _precompute(self, weights):
+        # sum_j w m (x - q)^2 = (w m x^2) . mq - 2 (w m x) . (q mq) + (w m) . (q^2 mq)
+        key = json.dumps(weights or {}, sort_keys=True)
+        if self._terms is None or self._weights_key != key:
+            w = self._weight_vector(weights)
+            valid = ~np.isnan(self.features)
+            x = np.where(valid, self.features, 0.0)
+            wm = valid * w
+            self._terms = (wm * x * x, wm * x, wm, w)
+            self._weights_key = key
+        return self._terms
+
+    def distances(self, queries, weights=None):
+        """(n_dates, n_queries) weighted RMS distances; inf where the overlap is below MIN_OVERLAP."""
+        sq_term, lin_term, count_term, w = self._precompute(weights)
+        queries = np.atleast_2d(queries)
+        q_valid = ~np.isnan(queries)
+        q = np.where(q_valid, queries, 0.0).T
+        mq = q_valid.T.astype(np.float32)
+        
+        total = count_term @ mq
+        sq = sq_term @ mq - 2 * (lin_term @ q) + count_term @ (q * q)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            dist = np.sqrt(np.maximum(sq, 0) / total)
+        dist[total < MIN_OVERLAP * (w @ mq)[None, :]] = np.inf
+        return dist
+
+    def vector(self, date):
+        row = int(np.searchsorted(self.dates, date, side='left'))
+        if row >= len(self.dates) or self.dates[row] != date:
+            return None
+        return self.features[row]
+
+    def _pick(self, dist, limit, top_k, separation_days):
+        """Best rows below `limit`, at most one per `separation_days` window, best first."""
+        order = np.argsort(dist[:limit], kind='stable')
+        picked = []
+        for row in order:
+            if not np.isfinite(dist[row]) or len(picked) >= top_k:
+                break
+            if not picked or np.abs(self._days[picked] - self._days[row]).min() >= separation_days:
+                picked.append(row)
+        return picked
+
+    def search_many(self, dates, top_k=10, weights=None, exclude_days=EXCLUDE_DAYS, separation_days=SEPARATION_DAYS):
+        """
+        Past-only twins for several dates in one pass: candidates are at least `exclude_days`
+        before the query date. Returns [(similarity, date, distance), ...] per query, where
+        similarity = exp(-distance) is in (0, 1].
+        """
+        if len(self.dates) == 0:
+            self.load()
+        rows = [int(np.searchsorted(self.dates, d, side='left')) for d in dates]
+        found = [r < len(self.dates) and self.dates[r] == d for r, d in zip(rows, dates)]
+        if not any(found):
+            return [[] for _ in dates]
+        
+        queries = self.features[[r if ok else 0 for r, ok in zip(rows, found)]]
+        dist = self.distances(queries, weights)
+        cutoffs = np.asarray(dates, dtype='datetime64[D]') - np.timedelta64(exclude_days, 'D')
+        limits = np.searchsorted(self._days, cutoffs.astype(np.int64), side='left')
+        
+        results = []
+        for col, ok in enumerate(found):
+            if not ok:
+                results.append([])
+                continue
+            picked = self._pick(dist[:, col], int(limits[col]), top_k, separation_days)
+            results.append([(float(np.exp(-dist[r, col])), str(self.dates[r]), float(dist[r, col])) for r in picked])
+        return results
+
+    def search(self, date, top_k=10, weights=None, exclude_days=EXCLUDE_DAYS, separation_days=SEPARATION_DAYS):
+        """Past-only feature twins of one date."""
+        return self.search_many([date], top_k, weights, exclude_days, separation_days)[0]
+
+    def blended_search(self, date, query_text, indexer, alpha=0.5, top_k=10, pool=100, weights=None):
+        """
+        Combines feature similarity with text similarity from a VectorIndexer-like index:
+        score = alpha * text + (1 - alpha) * features, over the union of both candidate pools.
+        Days the text search didn't return count as text score 0.
+        Returns [(score, date, {"text": ..., "features": ...}), ...].
+        """
+        if len(self.dates) == 0:
+            self.load()
+        feature_hits = self.search(date, top_k=pool, weights=weights, separation_days=0)
+        text_hits = indexer.search(query_text, top_k=pool, filter_date=date, expand=True) if query_text else []
+        text_scores = {r['date']: float(s) for s, r in text_hits}
+        
+        candidates = {d for _, d, _ in feature_hits} | set(text_scores)
+        cutoff = np.datetime64(date, 'D') - np.timedelta64(EXCLUDE_DAYS, 'D')
+        candidates = [d for d in candidates if np.datetime64(d, 'D') < cutoff]
+        
+        # Feature similarity for every candidate, including text-only ones
+        feature_scores = {}
+        query = self.vector(date)
+        if query is not None:
+            dist = self.distances(query, weights)[:, 0]
+            for d in candidates:
+                row = int(np.searchsorted(self.dates, d, side='left'))
+                if row < len(self.dates) and self.dates[row] == d and np.isfinite(dist[row]):
+                    feature_scores[d] = float(np.exp(-dist[row]))
+        
+        blended = []
+        for d in candidates:
+            text, features = text_scores.get(d, 0.0), feature_scores.get(d, 0.0)
+            blended.append((alpha * text + (1 - alpha) * features, d, {"text": text, "features": features}))
+        blended.sort(key=lambda item: -item[0])
+        return blended[:top_k]
+
+def _summary_text(master_file, date):
+    with open(master_file, 'r') as f:
+        for line in f:
+            if f'"{date}"' not in line:
+                continue
+            record = json.loads(line)
+            if record.get('date') == date:
+                return record.get('summary_text', '')
+    return None
+
+if __name__ == "__main__":
+    # Usage: python regime_zero/engine/feature_twins.py YYYY-MM-DD [--top-k 10] [--blend 0.5] [--source supabase] [--weight VIX=2 ...]
+    parser = argparse.ArgumentParser(description="Market-feature twin search (no LLM)")
+    parser.add_argument("date")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--blend", type=float, default=None, help="Weight of the text index in a blended score (0-1)")
+    parser.add_argument("--source", choices=["local", "supabase"], default="local")
+    parser.add_argument("--weight", action="append", default=[], help="asset_or_feature=weight")
+    parser.add_argument("--rebuild", action="store_true")
+    args = parser.parse_args()
+
+    weights = {k: float(v) for k, v in (w.split("=", 1) for w in args.weight)}
+    twins = FeatureTwins(source=args.source)
+    twins.build() if args.rebuild else twins.load()
+
+    if args.blend is None:
+        for similarity, date, distance in twins.search(args.date, top_k=args.top_k, weights=weights):
+            print(f"{date}  similarity={similarity:.3f}  distance={distance:.3f}")
+    else:
+        from regime_zero.engine.vector_indexer import VectorIndexer
+        text = _summary_text(MASTER_FILE, args.date) if os.path.exists(MASTER_FILE) else None
+        if text is None:
+            print(f"⚠️ No regime text for {args.date}; the blend uses features only.")
+        results = twins.blended_search(args.date, text, VectorIndexer(collapse_duplicates=True),
+                                       alpha=args.blend, top_k=args.top_k, weights=weights)
+        for score, date, parts in results:
+            print(f"{date}  score={score:.3f}  text={parts['text']:.3f}  features={parts['features']:.3f}")
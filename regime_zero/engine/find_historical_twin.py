@@ -2,72 +2,44 @@ import sys
 import os
 import json
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 
 # Add project root to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
+from regime_zero.engine.twin_index import get_twin_index
+
 OBJECTS_FILE = "regime_zero/data/regime_objects.jsonl"
 FAMILIES_FILE = "regime_zero/data/regime_families.json"
 
 def find_twin(target_date):
     print(f"🔍 Searching for Historical Twin of {target_date} (Vector Mode)...")
     
-    # 1. Load Data
-    regimes = {}
-    if os.path.exists(OBJECTS_FILE):
-        with open(OBJECTS_FILE, "r") as f:
-            for line in f:
-                try:
-                    r = json.loads(line)
-                    regimes[r['date']] = r
-                except:
-                    pass
+    # 1. Load Index
+    # Persistent TF-IDF index over the whole universe. New dates are appended, never refit.
+    index = get_twin_index()
     
-    if target_date not in regimes:
+    if target_date not in index:
         print(f"❌ Target date {target_date} not found in database.")
         return
 
-    target_regime = regimes[target_date]
+    target_regime = index.get_record(target_date)
     print(f"🎯 Target Regime: {target_regime['regime_name']}")
     
-    # 2. Prepare Corpus
-    # We will search the ENTIRE universe for the best match, not just the family.
-    # But we can prioritize family members if needed. For now, global search is more impressive.
-    
-    dates = list(regimes.keys())
-    corpus = []
-    
-    for d in dates:
-        r = regimes[d]
-        # Combine fields for rich semantic matching
-        text = f"{r['regime_name']} {r['historical_vibe']} {' '.join(r['signature'])} {r.get('structural_reasoning', '')}"
-        corpus.append(text)
-        
-    # 3. Vectorization (TF-IDF)
-    # This creates a vector space based on the vocabulary of our market history
-    vectorizer = TfidfVectorizer(stop_words='english')
-    tfidf_matrix = vectorizer.fit_transform(corpus)
-    
-    # Find index of target
-    try:
-        target_idx = dates.index(target_date)
-    except ValueError:
-        print("❌ Target date index error.")
-        return
-        
-    # 4. Calculate Cosine Similarity
-    # Compute similarity of target against ALL documents
-    cosine_sim = cosine_similarity(tfidf_matrix[target_idx:target_idx+1], tfidf_matrix).flatten()
+    # 2. Calculate Cosine Similarity
+    # We search the ENTIRE universe for the best match, not just the family.
+    # Compute similarity of target against ALL documents (one sparse matrix-vector product)
+    dates = index.dates
+    cosine_sim = index.scores(target_date)
     
-    # 5. Rank Candidates & Apply Perceptual Scaling
+    # 3. Rank Candidates & Apply Perceptual Scaling
     # Raw cosine similarity for short text is often low (0.2-0.4).
     # We map the distribution to a "Relevance Score" (0-100%) for UI intuition.
     # Logic: The top 1% of matches in the universe are "99% Relevant".
     
-    # Sort by score descending
-    related_docs_indices = cosine_sim.argsort()[::-1]
+    # Sort by score descending (only the head is needed: self + top 10)
+    head = min(11, len(cosine_sim))
+    related_docs_indices = np.argpartition(-cosine_sim, head - 1)[:head]
+    related_docs_indices = related_docs_indices[np.argsort(-cosine_sim[related_docs_indices])]
     
     # Get top score and 99th percentile score to calibrate
     top_raw_score = cosine_sim[related_docs_indices[1]] # Skip self
@@ -87,12 +59,12 @@ def find_twin(target_date):
         raw_score = cosine_sim[idx]
         final_score = scale_score(raw_score, top_raw_score)
         
-        scored_candidates.append((final_score, regimes[dates[idx]]))
+        scored_candidates.append((final_score, index.get_record(dates[idx])))
         
         if len(scored_candidates) >= 10: # Keep top 10
             break
     
-    # 6. Report Top 3
+    # 4. Report Top 3
     print("\n🏆 TOP 3 HISTORICAL TWINS (Vector Similarity + Perceptual Scaling)")
     print("="*40)
     
@@ -108,7 +80,7 @@ def find_twin(target_date):
         twin_words = set(twin['regime_name'].lower().split())
         print(f"🔑 Key Overlap: {target_words & twin_words}")
 
-    # 7. Save for Visualization
+    # 5. Save for Visualization
     twin_data = {
         "source": target_date,
         "target": top_twin['date'],
@@ -122,7 +94,7 @@ def find_twin(target_date):
         json.dump(twin_data, f, indent=2)
     print(f"\n✨ Visualization data saved to {viz_path}")
 
-    # 8. Save Candidates for Consensus Strategy
+    # 6. Save Candidates for Consensus Strategy
     candidates_data = []
     for score, twin in scored_candidates:
         candidates_data.append({
@@ -0,0 +1,211 @@
+import sys
+import os
+import json
+import glob
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from regime_zero.engine.columnar_store import load_table, convert_csv
+
+PRICE_DIR = "regime_zero/data/market_data"
+PRICE_SUFFIX = "_price_history.csv"
+TABLE_NAME = "forward_returns.csv"
+STATE_NAME = "forward_returns_state.json"
+
+DEFAULT_HORIZONS = (7, 30)
+
+def horizon_column(days):
+    return f"fwd_{days}d"
+
+def exit_indices(trading_days, dates, days):
+    """
+    Index into sorted `trading_days` of each date's exit: the first trading day on or after
+    date + `days` calendar days (len(trading_days) if there is none yet).
+    """
+    return np.searchsorted(trading_days, dates + np.timedelta64(days, 'D'), side='left')
+
+def compute_forward_returns(dates, closes, horizons):
+    """
+    Forward % return for every trading day and horizon, matching the old per-call logic:
+    the exit is the first trading day on or after date + N calendar days (NaN if past the end).
+    `dates` must be sorted datetime64[D]; returns {horizon: float array}.
+    """
+    out = {}
+    for days in horizons:
+        exit_idx = exit_indices(dates, dates, days)
+        valid = exit_idx < len(dates)
+        ret = np.full(len(dates), np.nan)
+        ret[valid] = (closes[exit_idx[valid]] - closes[valid]) / closes[valid] * 100
+        out[days] = ret
+    return out
+
+def history_hash(dates, closes, n):
+    """sha1 of the first n (date, close) pairs: detects restated or split-adjusted history."""
+    sha = hashlib.sha1()
+    sha.update(np.ascontiguousarray(dates[:n]).view(np.int64).tobytes())
+    sha.update(np.ascontiguousarray(closes[:n], dtype=np.float64).tobytes())
+    return sha.hexdigest()
+
+class ForwardReturnTable:
+    """
+    Precomputed forward returns per (asset, date, horizon) for every asset with a price file.
+    Persisted as a CSV (with the usual Arrow sidecar); only assets whose price file changed are
+    refreshed, and for appended prices only the tail whose exits could have moved is recomputed.
+    update() refreshes (and writes) the table; load() only reads what is stored.
+    """
+    def __init__(self, horizons=DEFAULT_HORIZONS, price_dir=PRICE_DIR):
+        self.horizons = sorted(set(int(h) for h in horizons))
+        self.price_dir = price_dir
+        self.table_file = os.path.join(price_dir, TABLE_NAME)
+        self.state_file = os.path.join(price_dir, STATE_NAME)
+        self.table = pd.DataFrame()
+        self.stale = [] # Assets whose price file changed since the loaded table was computed
+        self._lookup = {}
+
+    def _price_files(self):
+        files = glob.glob(os.path.join(self.price_dir, f"*{PRICE_SUFFIX}"))
+        return {os.path.basename(p)[:-len(PRICE_SUFFIX)]: p for p in sorted(files)}
+
+    def _load_state(self):
+        if not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not os.path.exists(self.table_file):
+            return {}
+        # A stored table with a superset of the requested horizons is reused as is. Otherwise the
+        # table is recomputed for the union, so callers asking for different horizons don't evict each other
+        stored = state.get('horizons', [])
+        requested = set(self.horizons)
+        self.horizons = sorted(requested | set(stored))
+        return state if requested <= set(stored) else {}
+
+    def load(self):
+        """Reads the stored table without refreshing it. Returns False if there is none for these horizons (see also .stale)."""
+        state = self._load_state()
+        self._lookup = {}
+        self.stale = []
+        if not state:
+            self.table = pd.DataFrame()
+            return False
+        self.table = load_table(self.table_file, date_columns=())
+        self.stale = [a for a, path in self._price_files().items()
+                      if state.get('assets', {}).get(a, {}).get('mtime') != os.stat(path).st_mtime_ns]
+        if self.stale:
+            print(f"⚠️ Forward returns are older than the price files of: {', '.join(self.stale)} (run update())")
+        return True
+
+    def _load_prices(self, path):
+        df = load_table(path, date_columns=("Date",), columns=["Date", "Close"])
+        if df.empty:
+            return np.array([], dtype='datetime64[D]'), np.array([])
+        df = df.dropna(subset=["Date", "Close"])
+        dates = df['Date'].dt.strftime('%Y-%m-%d').to_numpy(dtype='datetime64[D]')
+        closes = pd.to_numeric(df['Close'], errors='coerce').to_numpy(dtype=float)
+        order = np.argsort(dates, kind='stable')
+        dates, closes = dates[order], closes[order]
+        # One close per trading day (last one wins)
+        keep = np.append(dates[1:] != dates[:-1], True)
+        return dates[keep], closes[keep]
+
+    def _asset_frame(self, asset, dates, closes, start=0):
+        """Rows [start:] of an asset's table."""
+        returns = compute_forward_returns(dates, closes, self.horizons)
+        frame = pd.DataFrame({"asset": asset, "date": np.datetime_as_string(dates[start:], unit='D')})
+        for days in self.horizons:
+            frame[horizon_column(days)] = returns[days][start:]
+        return frame
+
+    def update(self):
+        """Brings the table in line with the price files. Returns the list of refreshed assets."""
+        state = self._load_state()
+        existing = load_table(self.table_file, date_columns=()) if state else pd.DataFrame()
+        files = self._price_files()
+        
+        frames = []
+        refreshed = []
+        assets_state = {}
+        for asset, path in files.items():
+            stat = os.stat(path)
+            prev = state.get('assets', {}).get(asset)
+            old_rows = existing[existing['asset'] == asset] if not existing.empty else existing
+            if prev and prev['size'] == stat.st_size and prev['mtime'] == stat.st_mtime_ns:
+                frames.append(old_rows)
+                assets_state[asset] = prev
+                continue
+            
+            dates, closes = self._load_prices(path)
+            if len(dates) == 0:
+                continue
+            
+            # Appended prices: if history up to the previous last date is unchanged (same rows and
+            # closes, by hash), only rows whose exit window reaches past it need recomputing.
+            # Anything else (restatements, split adjustments, deletions) is a full recompute.
+            start = 0
+            if prev and len(old_rows):
+                prev_last = np.datetime64(prev['last_date'], 'D')
+                n_prev = int(np.searchsorted(dates, prev_last, side='right'))
+                if n_prev == prev['rows'] and n_prev == len(old_rows) and history_hash(dates, closes, n_prev) == prev.get('sha1'):
+                    start = int(np.searchsorted(dates, prev_last - np.timedelta64(max(self.horizons), 'D'), side='left'))
+            if start:
+                frames.append(old_rows.iloc[:start])
+            frames.append(self._asset_frame(asset, dates, closes, start))
+            
+            refreshed.append(asset)
+            assets_state[asset] = {"size": stat.st_size, "mtime": stat.st_mtime_ns,
+                                   "rows": int(len(dates)), "last_date": str(dates[-1]),
+                                   "sha1": history_hash(dates, closes, len(dates))}
+        
+        if refreshed or set(assets_state) != set(state.get('assets', {})):
+            frames = [f for f in frames if len(f)]
+            self.table = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+            os.makedirs(self.price_dir, exist_ok=True)
+            # Table, then state, each via a temp file: readers never see a partial file, and a crash in
+            # between leaves state older than the table (its assets are just recomputed next time)
+            tmp_path = self.table_file + ".tmp"
+            self.table.to_csv(tmp_path, index=False)
+            os.replace(tmp_path, self.table_file)
+            convert_csv(self.table_file, date_columns=())
+            tmp_path = self.state_file + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({"horizons": self.horizons, "assets": assets_state}, f, indent=2)
+            os.replace(tmp_path, self.state_file)
+            print(f"📈 Forward returns refreshed for {len(refreshed)} asset(s): {', '.join(refreshed) or '-'}")
+        else:
+            self.table = existing
+        
+        self._lookup = {}
+        return refreshed
+
+    def returns_for(self, asset):
+        """{date: {horizon: return or None}} for one asset (built once, then O(1) per lookup)."""
+        if asset not in self._lookup:
+            rows = self.table[self.table['asset'] == asset] if not self.table.empty else self.table
+            lookup = {}
+            for record in rows.to_dict('records'):
+                lookup[record['date']] = {days: (None if pd.isna(record[horizon_column(days)]) else float(record[horizon_column(days)]))
+                                          for days in self.horizons}
+            self._lookup[asset] = lookup
+        return self._lookup[asset]
+
+    def get(self, asset, date, days):
+        """Forward return in % from `date` over `days` calendar days, or None."""
+        return self.returns_for(asset).get(date, {}).get(days)
+
+if __name__ == "__main__":
+    # Usage: python regime_zero/engine/forward_returns.py [--horizons 7 30 90]
+    parser = argparse.ArgumentParser(description="Precompute forward returns for all price histories")
+    parser.add_argument("--horizons", type=int, nargs="+", default=list(DEFAULT_HORIZONS))
+    args = parser.parse_args()
+
+    table = ForwardReturnTable(horizons=args.horizons)
+    table.update()
+    print(f"✅ {len(table.table)} rows, horizons {table.horizons} -> {table.table_file}")
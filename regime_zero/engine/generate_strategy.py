@@ -8,7 +8,7 @@ from supabase import create_client
 # Add project root to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from utils.openrouter_client import ask_llm
+from regime_zero.engine.llm_gateway import ask_llm
 
 load_dotenv()
 supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
@@ -0,0 +1,41 @@
+import os
+import time
+import shutil
+
+# Immutable on-disk generations for multi-file stores (indexes, mirrors).
+# The store path is a symlink to <store_dir>.gen-<ns>. A save fills a fresh generation directory and
+# publishes it with one os.replace of the link, so a crash mid-save leaves the previous generation in
+# place. Readers resolve the link once (current()) and read every file from that directory, so they
+# never mix files from two saves, and their memory maps stay valid while newer generations appear.
+
+KEEP_GENERATIONS = 2 # Current + previous (for readers still mapping it)
+
+def current(store_dir):
+    """Directory of the published generation (a legacy plain directory resolves to itself)."""
+    return os.path.realpath(store_dir)
+
+def generations(store_dir):
+    parent, base = os.path.split(os.path.abspath(store_dir))
+    if not os.path.isdir(parent):
+        return []
+    return sorted(os.path.join(parent, n) for n in os.listdir(parent) if n.startswith(base + ".gen-"))
+
+def new_generation(store_dir):
+    """Creates an empty generation directory to write a complete store into."""
+    os.makedirs(os.path.dirname(os.path.abspath(store_dir)), exist_ok=True)
+    build_dir = f"{os.path.abspath(store_dir)}.gen-{time.time_ns()}"
+    os.makedirs(build_dir)
+    return build_dir
+
+def publish(store_dir, build_dir, keep=KEEP_GENERATIONS):
+    """Atomically points store_dir at build_dir, then drops all but the newest `keep` generations."""
+    link = os.path.abspath(store_dir)
+    if os.path.isdir(link) and not os.path.islink(link):
+        # Pre-generation layout: move the plain directory aside once (it becomes the previous generation)
+        os.replace(link, f"{link}.gen-{time.time_ns() - 1}")
+    tmp_link = f"{link}.link-{os.getpid()}"
+    os.symlink(os.path.basename(build_dir), tmp_link)
+    os.replace(tmp_link, link)
+
+    for old in [g for g in generations(store_dir) if g != build_dir][:-(keep - 1) or None]:
+        shutil.rmtree(old, ignore_errors=True)
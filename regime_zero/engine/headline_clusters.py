@@ -0,0 +1,93 @@
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+# Groups a day's headlines into stories so each prompt carries one line per story, not one per source.
+# Character n-grams keep it language-agnostic for rewordings and transliterated names; pass an
+# embed_fn (e.g. embedding_cache.get_embeddings) to also merge translations of the same story.
+
+SIMILARITY_THRESHOLD = 0.5 # Cosine similarity with a cluster's representative needed to join it
+COUNCIL_HEADLINE_TOKENS = 600 # Budget for the headline block of the council market prompt
+NEWS_CONTEXT_TOKENS = 400 # Budget for RegimeGenerator news context
+
+def estimate_tokens(text):
+    """Rough token count without a tokenizer: ~4 characters per token for Latin text, ~1 per CJK character."""
+    non_ascii = sum(1 for c in text if ord(c) > 127)
+    return (len(text) - non_ascii) // 4 + non_ascii + 1
+
+def _text(value):
+    """str of a title field; "" for None / NaN (missing cells in DataFrame-sourced records)."""
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    return str(value)
+
+def headline_title(item):
+    if isinstance(item, dict):
+        return _text(item.get('clean_title')) or _text(item.get('title'))
+    return _text(item)
+
+def _vectors(titles, embed_fn=None):
+    if embed_fn is not None:
+        return normalize(np.asarray(embed_fn(titles), dtype=np.float32))
+    vectorizer = TfidfVectorizer(analyzer='char_wb', ngram_range=(3, 5), sublinear_tf=True)
+    return vectorizer.fit_transform([t.lower() for t in titles])
+
+def cluster_headlines(headlines, threshold=SIMILARITY_THRESHOLD, embed_fn=None):
+    """
+    Leader clustering in input order (so pass headlines newest/most important first): each headline
+    joins the most similar existing cluster if it is close enough to that cluster's first headline,
+    else starts a new one. Returns clusters as lists of input indices, biggest first.
+    """
+    titles = [headline_title(h) for h in headlines]
+    keep = [i for i, t in enumerate(titles) if t.strip()]
+    if not keep:
+        return []
+    vectors = _vectors([titles[i] for i in keep], embed_fn)
+    similarity = vectors @ vectors.T
+    similarity = similarity.toarray() if hasattr(similarity, "toarray") else np.asarray(similarity)
+
+    leaders = [] # Row of each cluster's representative
+    members = []
+    for row in range(len(keep)):
+        if leaders:
+            scores = similarity[row, leaders]
+            best = int(np.argmax(scores))
+            if scores[best] >= threshold:
+                members[best].append(keep[row])
+                continue
+        leaders.append(row)
+        members.append([keep[row]])
+
+    # Biggest story first; ties keep input order
+    return sorted(members, key=lambda m: -len(m))
+
+def _sources(headlines, cluster):
+    sources = {h.get('source') for h in (headlines[i] for i in cluster) if isinstance(h, dict) and h.get('source')}
+    return len(sources) or len(cluster)
+
+def compress_headlines(headlines, max_tokens=COUNCIL_HEADLINE_TOKENS, threshold=SIMILARITY_THRESHOLD, embed_fn=None):
+    """
+    One representative per story, biggest stories first, until the token budget is spent.
+    Items keep their input shape: strings become "title (N sources)", dicts get 'source_count'
+    and the same annotation on their title.
+    """
+    if not headlines:
+        return headlines
+    compressed = []
+    used = 0
+    for cluster in cluster_headlines(headlines, threshold, embed_fn):
+        item = headlines[cluster[0]]
+        count = _sources(headlines, cluster)
+        title = headline_title(item) + (f" ({count} sources)" if count > 1 else "")
+        cost = estimate_tokens(title)
+        if compressed and used + cost > max_tokens:
+            break
+        used += cost
+        if isinstance(item, dict):
+            item = dict(item, title=title, source_count=count)
+            if 'clean_title' in item:
+                item['clean_title'] = title
+        else:
+            item = title
+        compressed.append(item)
+    return compressed
@@ -1,13 +1,15 @@
 import sys
 import os
 import json
-import concurrent.futures
+import time
+import asyncio
+from collections import namedtuple
 from dotenv import load_dotenv
 
 # Add project root to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from utils.openrouter_client import ask_llm
+from regime_zero.engine.llm_gateway import ask_llm_async
 
 load_dotenv()
 
@@ -77,61 +79,98 @@ from regime_zero.engine.ai_hr import AI_HR
 # Initialize HR
 HR = AI_HR()
 
-def call_persona(name, persona, user_prompt, retry_count=0):
-    print(f"🤖 {name} ({persona['role']}) is thinking... (Attempt {retry_count+1})")
+# Hedging: if the current model hasn't answered by its observed p90 latency, a substitute from the HR
+# roster races it; the first valid report wins and the rest are cancelled
+MAX_ATTEMPTS = 3 # Primary + up to 2 substitutes (hedges or replacements of failed calls)
+HEDGE_DEFAULT_DELAY = 30.0 # Seconds, until HR has enough latency samples for a model
+HEDGE_MIN_DELAY = 5.0
+HEDGE_MAX_DELAY = 90.0
     
-    current_model = persona['model']
+# One call's persona state. Immutable: substitutes are new Assignments, PERSONAS is never touched
+Assignment = namedtuple("Assignment", ["name", "role", "model", "api_type", "system_prompt"])
     
+def role_key(role):
+    key = "narrative" # Default
+    if "Quant" in role: key = "quant"
+    if "Risk" in role: key = "risk"
+    if "Structure" in role: key = "structure"
+    if "News" in role: key = "news"
+    return key
+
+def hedge_delay(model):
+    observed = HR.latency_quantile(model, 0.9)
+    if observed is None:
+        return HEDGE_DEFAULT_DELAY
+    return min(max(observed, HEDGE_MIN_DELAY), HEDGE_MAX_DELAY)
+
+async def ask_assignment(assignment, user_prompt):
+    """One attempt. Returns (report dict or None, parsed_ok)."""
+    started = time.monotonic()
+    
+    # API Routing
     try:
-        system_prompt = persona['system_prompt']
-        
-        # API Routing
-        if persona['api_type'] == "dashscope":
-            key = os.getenv("MAIN_LLM_KEY")
-            url = os.getenv("MAIN_LLM_URL")
-            if url: url = url.rstrip("/") + "/chat/completions"
-            response = ask_llm(user_prompt, system_prompt=system_prompt, model=current_model, api_key=key, base_url=url)
-            
-        elif persona['api_type'] == "google":
-            key = os.getenv("BACKUP_LLM_KEY")
-            url = os.getenv("BACKUP_LLM_URL")
-            response = ask_llm(user_prompt, system_prompt=system_prompt, model=current_model, api_key=key, base_url=url)
-            
+        if assignment.api_type == "dashscope":
+            response = await ask_llm_async(user_prompt, system_prompt=assignment.system_prompt, model=assignment.model,
+                                           api_key=os.getenv("MAIN_LLM_KEY"), base_url=os.getenv("MAIN_LLM_URL"))
+        elif assignment.api_type == "google":
+            response = await ask_llm_async(user_prompt, system_prompt=assignment.system_prompt, model=assignment.model,
+                                           api_key=os.getenv("BACKUP_LLM_KEY"), base_url=os.getenv("BACKUP_LLM_URL"))
         else: # OpenRouter
-            response = ask_llm(user_prompt, system_prompt=system_prompt, model=current_model)
-
-        # Parse JSON output
-        if response:
-            clean_resp = response.replace("```json", "").replace("```", "").strip()
-            try:
-                return {name: json.loads(clean_resp)}
-            except:
-                return {name: {"report": response, "self_audit": "Failed to parse JSON"}}
-        
-        # If response is None, raise exception to trigger HR
-        raise Exception("No response from LLM")
-        
-    except Exception as e:
-        print(f"❌ {name} Failed with {current_model}: {e}")
+            response = await ask_llm_async(user_prompt, system_prompt=assignment.system_prompt, model=assignment.model)
+    except asyncio.CancelledError:
+        # Hedged and lost: it took at least this long, so keep it as a (lower-bound) sample or the p90 drifts low.
+        # Calls cancelled before their own hedge delay (e.g. a substitute outrun by the primary) say nothing about it.
+        elapsed = time.monotonic() - started
+        if elapsed >= hedge_delay(assignment.model):
+            HR.record_latency(assignment.model, elapsed)
+        raise
+    
+    if not response:
+        print(f"❌ {assignment.name} Failed with {assignment.model}: No response from LLM")
+        return None, False
+    HR.record_latency(assignment.model, time.monotonic() - started)
+    
+    # Parse JSON output
+    clean_resp = response.replace("```json", "").replace("```", "").strip()
+    try:
+        return json.loads(clean_resp), True
+    except ValueError:
+        return {"report": response, "self_audit": "Failed to parse JSON"}, False
         
-        if retry_count < 2:
-            # HR INTERVENTION
-            role_key = "narrative" # Default
-            if "Quant" in persona['role']: role_key = "quant"
-            if "Risk" in persona['role']: role_key = "risk"
-            if "Structure" in persona['role']: role_key = "structure"
-            if "News" in persona['role']: role_key = "news"
-            
-            substitute_model = HR.get_substitute(role_key, failed_model=current_model)
-            print(f"🔄 HR Substitution: Replacing {current_model} with {substitute_model}")
+async def call_persona(name, persona, user_prompt):
+    primary = Assignment(name, persona['role'], persona['model'], persona['api_type'], persona['system_prompt'])
+    print(f"🤖 {name} ({primary.role}) is thinking...")
             
-            # Update persona for retry
-            persona['model'] = substitute_model
-            persona['api_type'] = "openrouter" # Substitutes default to OpenRouter
-            
-            return call_persona(name, persona, user_prompt, retry_count + 1)
+    tried = [primary.model]
+    tasks = {asyncio.ensure_future(ask_assignment(primary, user_prompt)): primary}
+    fallback = None # Unparseable text: used only if nothing better arrives
+    try:
+        while tasks:
+            latest = list(tasks.values())[-1]
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay(latest.model), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                tasks.pop(task)
+                if task.exception():
+                    print(f"❌ {name} Failed: {task.exception()}")
+                    continue
+                report, parsed = task.result()
+                if parsed:
+                    return {name: report}
+                fallback = fallback or report
             
-        return {name: None}
+            # Slow (nothing done by the p90) or failed: bring in a substitute, racing whatever is still running
+            if len(tried) < MAX_ATTEMPTS and (not done or not tasks):
+                substitute_model = HR.get_substitute(role_key(primary.role), failed_model=tried)
+                reason = "Hedging slow" if not done else "Replacing"
+                print(f"🔄 HR Substitution: {reason} {latest.model} with {substitute_model} (Attempt {len(tried) + 1})")
+                substitute = primary._replace(model=substitute_model, api_type="openrouter") # Substitutes default to OpenRouter
+                tried.append(substitute_model)
+                tasks[asyncio.ensure_future(ask_assignment(substitute, user_prompt))] = substitute
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    return {name: fallback}
 
 def run_junior_analysis(data_context):
     """
@@ -152,11 +191,14 @@ Provide your output in strict JSON format:
 }}
 """
 
+    # All personas at once on the shared LLM gateway (no worker threads)
+    async def run_all():
+        return await asyncio.gather(*(call_persona(name, p, user_prompt) for name, p in PERSONAS.items()))
+    
     results = {}
-    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-        futures = {executor.submit(call_persona, name, p, user_prompt): name for name, p in PERSONAS.items()}
-        for future in concurrent.futures.as_completed(futures):
-            results.update(future.result())
+    for result in asyncio.run(run_all()):
+        results.update(result)
+    HR.save_latencies()
             
     return results
 
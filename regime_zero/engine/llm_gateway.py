@@ -0,0 +1,305 @@
+import sys
+import os
+import asyncio
+import threading
+import random
+import json
+import inspect
+import httpx
+from dotenv import load_dotenv
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+load_dotenv()
+
+# One pooled async client per provider, shared by every agent stage.
+# All requests run on a single background event loop, so keep-alive connections are reused across
+# sync callers (ask_llm) and async callers (ask_llm_async / fan-out) alike.
+
+DEFAULT_TIMEOUT = 90.0 # Seconds per request (read timeout; long reports stream slowly)
+CONNECT_TIMEOUT = 10.0
+MAX_RETRIES = 2 # On 429 / 5xx / transport errors
+MAX_RETRY_WAIT = 20.0
+
+# name -> base URL (or env var holding it), key env var, default model env var, concurrency cap
+PROVIDERS = {
+    "openrouter": {"url": "https://openrouter.ai/api/v1", "key_env": "OPENROUTER_API_KEY", "model_env": "OPENROUTER_MODEL", "concurrency": 8},
+    "main": {"url_env": "MAIN_LLM_URL", "key_env": "MAIN_LLM_KEY", "model_env": "MAIN_LLM_MODEL", "concurrency": 4},
+    "backup": {"url_env": "BACKUP_LLM_URL", "key_env": "BACKUP_LLM_KEY", "model_env": "BACKUP_LLM_MODEL", "concurrency": 4},
+    "xai": {"url": "https://api.x.ai/v1", "key_env": "XAI_API_KEY", "concurrency": 4},
+    "openai": {"url": "https://api.openai.com/v1", "key_env": "OPENAI_API_KEY", "concurrency": 4},
+}
+
+# OpenRouter ids are "<vendor>/<model>"; bare ids whose vendor is unambiguous get their namespace
+OPENROUTER_NAMESPACES = (
+    (("gpt-", "chatgpt-", "o1", "o3", "o4"), "openai"),
+    (("claude-",), "anthropic"),
+    (("gemini-",), "google"),
+    (("grok-",), "x-ai"),
+    (("deepseek-",), "deepseek"),
+)
+
+def chat_endpoint(url):
+    """Accepts either an API root (".../v1") or the full chat completions URL."""
+    url = url.rstrip("/")
+    return url if url.endswith("/chat/completions") else url + "/chat/completions"
+
+OPENROUTER_ENDPOINT = chat_endpoint(PROVIDERS["openrouter"]["url"])
+
+def openrouter_model_id(model):
+    """Namespaced OpenRouter id for `model` ("gpt-4o" -> "openai/gpt-4o"). Raises ValueError for bare ids of unknown vendors."""
+    if "/" in model:
+        return model
+    for prefixes, vendor in OPENROUTER_NAMESPACES:
+        if model.startswith(prefixes):
+            return f"{vendor}/{model}"
+    raise ValueError(f"Model '{model}' has no provider namespace; OpenRouter needs '<vendor>/{model}' "
+                     f"(or pass the base_url/api_key of the provider that serves it)")
+
+def legacy_default_model():
+    """Default model of utils.openrouter_client (the client this gateway replaces), if it is installed."""
+    try:
+        from utils import openrouter_client as legacy
+    except ImportError:
+        return None
+    for attr in ("DEFAULT_MODEL", "MODEL", "MODEL_NAME"):
+        value = getattr(legacy, attr, None)
+        if isinstance(value, str) and value:
+            return value
+    try:
+        value = inspect.signature(legacy.ask_llm).parameters['model'].default
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+    return value if isinstance(value, str) and value else None
+
+class Provider:
+    def __init__(self, name, url, api_key, default_model=None, concurrency=4, timeout=DEFAULT_TIMEOUT):
+        self.name = name
+        self.endpoint = chat_endpoint(url)
+        self.api_key = api_key
+        self.default_model = default_model
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._client = None
+        self._semaphore = None
+
+    def client(self):
+        # Created lazily on the gateway loop (httpx async pools are bound to the loop that uses them)
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+                headers={"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            )
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+class LLMGateway:
+    """
+    Async LLM gateway: per-provider keep-alive pools, concurrency caps and timeouts.
+      await gateway.acomplete(prompt, ...)      - from any event loop
+      gateway.complete(prompt, ...)             - blocking, for existing sync code
+      gateway.complete_many([kwargs, ...])      - blocking fan-out, results in input order
+      await gateway.astream(prompt, on_delta)   - streamed; gives up if no token arrives in first_token_timeout
+    Failures return None (after retries), matching what callers of ask_llm already check for.
+    A model that can't be routed (none configured, or a bare id OpenRouter can't place) raises ValueError up front.
+    """
+    def __init__(self, providers=PROVIDERS, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self.providers = {}
+        for name, spec in providers.items():
+            url = spec.get("url") or os.getenv(spec.get("url_env", ""), "")
+            if url:
+                self.providers[name] = Provider(name, url, os.getenv(spec["key_env"]), os.getenv(spec.get("model_env", "")) or None,
+                                                spec.get("concurrency", 4), timeout)
+        if "openrouter" in self.providers and not self.providers["openrouter"].default_model:
+            # $OPENROUTER_MODEL overrides; else whatever ask_llm without a model meant before the gateway
+            self.providers["openrouter"].default_model = legacy_default_model()
+        self._adhoc = {}
+        self._loop = None
+        self._lock = threading.Lock()
+
+    # --- Event loop ---
+
+    @property
+    def loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="llm-gateway", daemon=True).start()
+        return self._loop
+
+    def _in_gateway_loop(self):
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def close(self):
+        if self._loop is None:
+            return
+        async def close_all():
+            for provider in list(self.providers.values()) + list(self._adhoc.values()):
+                await provider.close()
+        asyncio.run_coroutine_threadsafe(close_all(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop = None
+
+    # --- Routing ---
+
+    def provider(self, name=None, base_url=None, api_key=None):
+        """
+        By name; else by URL (known providers first, so legacy base_url callers share their pool); else OpenRouter.
+        An api_key without a base_url goes to OpenRouter with that key (a pool of its own unless it is the configured one).
+        """
+        if name:
+            return self.providers[name]
+        if api_key and not base_url:
+            base_url = PROVIDERS["openrouter"]["url"]
+        if base_url:
+            endpoint = chat_endpoint(base_url)
+            for provider in self.providers.values():
+                if provider.endpoint == endpoint and (api_key is None or api_key == provider.api_key):
+                    return provider
+            key = (endpoint, api_key)
+            if key not in self._adhoc:
+                self._adhoc[key] = Provider(f"adhoc:{endpoint}", endpoint, api_key, timeout=self.timeout)
+            return self._adhoc[key]
+        return self.providers["openrouter"]
+
+    # --- Requests ---
+
+    async def _request(self, provider, payload, timeout):
+        client = provider.client()
+        async with provider._semaphore:
+            for attempt in range(MAX_RETRIES + 1):
+                try:
+                    response = await client.post(provider.endpoint, json=payload, timeout=timeout or provider.timeout)
+                    if response.status_code == 429 or response.status_code >= 500:
+                        raise httpx.HTTPStatusError(f"HTTP {response.status_code}", request=response.request, response=response)
+                    response.raise_for_status()
+                    return response.json()["choices"][0]["message"]["content"]
+                except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                    status = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else None
+                    retryable = status is None or status == 429 or status >= 500
+                    if not retryable or attempt == MAX_RETRIES:
+                        print(f"❌ [LLM Gateway] {provider.name} / {payload.get('model')}: {e}")
+                        return None
+                    retry_after = e.response.headers.get("retry-after") if status else None
+                    wait = float(retry_after) if retry_after and retry_after.isdigit() else 2 ** attempt + random.random()
+                    await asyncio.sleep(min(wait, MAX_RETRY_WAIT))
+                except (KeyError, IndexError, ValueError) as e:
+                    print(f"❌ [LLM Gateway] {provider.name} / {payload.get('model')}: malformed response ({e})")
+                    return None
+
+    async def _stream(self, provider, payload, timeout, on_delta, first_token_timeout):
+        # No retries here: a stream that stalls or breaks is the caller's cue to fall back
+        client = provider.client()
+        parts = []
+        async with provider._semaphore:
+            try:
+                # One deadline from sending the request to the first content delta: waiting for headers,
+                # keep-alive comments and role-only deltas all count against it. Lifted once text arrives.
+                async with asyncio.timeout(first_token_timeout or None) as deadline:
+                    async with client.stream("POST", provider.endpoint, json=dict(payload, stream=True), timeout=timeout or provider.timeout) as response:
+                        if response.status_code != 200:
+                            await response.aread()
+                            print(f"❌ [LLM Gateway] {provider.name} / {payload.get('model')}: HTTP {response.status_code}")
+                            return None
+                        async for line in response.aiter_lines():
+                            # Server-sent events: "data: {chunk}" lines, ": keep-alive" comments, "data: [DONE]"
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[5:].strip()
+                            if data == "[DONE]":
+                                break
+                            choices = json.loads(data).get("choices") or [{}]
+                            delta = (choices[0].get("delta") or {}).get("content")
+                            if delta:
+                                if not parts:
+                                    deadline.reschedule(None)
+                                parts.append(delta)
+                                on_delta(delta)
+            except asyncio.TimeoutError:
+                print(f"⏱️ [LLM Gateway] {provider.name} / {payload.get('model')}: no first token within {first_token_timeout:g}s")
+                return None
+            except (httpx.TransportError, ValueError) as e:
+                print(f"❌ [LLM Gateway] {provider.name} / {payload.get('model')}: stream broke after {len(parts)} chunks ({e})")
+                return None
+        return "".join(parts) or None
+
+    def _payload(self, target, prompt, system_prompt, model, params):
+        messages = ([{"role": "system", "content": system_prompt}] if system_prompt else []) + [{"role": "user", "content": prompt}]
+        openrouter = target.endpoint == OPENROUTER_ENDPOINT
+        model = model or target.default_model or (self.providers["openrouter"].default_model if openrouter else None)
+        if not model:
+            env = PROVIDERS.get(target.name, PROVIDERS["openrouter"] if openrouter else {}).get("model_env")
+            raise ValueError(f"No model given and no default model configured for {target.name}" + (f" (set {env})" if env else ""))
+        return dict(params, model=openrouter_model_id(model) if openrouter else model, messages=messages)
+
+    async def _complete(self, prompt, system_prompt=None, model=None, provider=None, api_key=None, base_url=None, timeout=None, **params):
+        target = self.provider(provider, base_url, api_key)
+        return await self._request(target, self._payload(target, prompt, system_prompt, model, params), timeout)
+
+    async def _complete_stream(self, prompt, on_delta, first_token_timeout=None, system_prompt=None, model=None, provider=None,
+                               api_key=None, base_url=None, timeout=None, **params):
+        target = self.provider(provider, base_url, api_key)
+        return await self._stream(target, self._payload(target, prompt, system_prompt, model, params), timeout, on_delta, first_token_timeout)
+
+    async def acomplete(self, prompt, **kwargs):
+        """Awaitable from any event loop; the request itself runs on the gateway loop."""
+        if self._in_gateway_loop():
+            return await self._complete(prompt, **kwargs)
+        future = asyncio.run_coroutine_threadsafe(self._complete(prompt, **kwargs), self.loop)
+        return await asyncio.wrap_future(future)
+
+    async def astream(self, prompt, on_delta, first_token_timeout=None, **kwargs):
+        """
+        Streams the completion, calling on_delta(text) for each chunk (on the gateway thread, so keep it cheap).
+        Returns the full text, or None if it failed or no token arrived within first_token_timeout.
+        """
+        coroutine = self._complete_stream(prompt, on_delta, first_token_timeout, **kwargs)
+        if self._in_gateway_loop():
+            return await coroutine
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coroutine, self.loop))
+
+    def complete(self, prompt, **kwargs):
+        """Blocking call for sync code."""
+        if self._in_gateway_loop():
+            raise RuntimeError("complete() would block the gateway loop; use acomplete()")
+        return asyncio.run_coroutine_threadsafe(self._complete(prompt, **kwargs), self.loop).result()
+
+    def complete_many(self, calls):
+        """Runs several calls concurrently (each a kwargs dict with 'prompt'); results in input order."""
+        if self._in_gateway_loop():
+            raise RuntimeError("complete_many() would block the gateway loop; use acomplete() with asyncio.gather()")
+        async def fan_out():
+            return await asyncio.gather(*(self._complete(**call) for call in calls))
+        return asyncio.run_coroutine_threadsafe(fan_out(), self.loop).result()
+
+_GATEWAY = None
+_GATEWAY_LOCK = threading.Lock()
+
+def get_gateway():
+    global _GATEWAY
+    with _GATEWAY_LOCK:
+        if _GATEWAY is None:
+            _GATEWAY = LLMGateway()
+    return _GATEWAY
+
+def ask_llm(prompt, system_prompt=None, model=None, api_key=None, base_url=None, **params):
+    """Drop-in for utils.openrouter_client.ask_llm, served by the shared gateway."""
+    return get_gateway().complete(prompt, system_prompt=system_prompt, model=model, api_key=api_key, base_url=base_url, **params)
+
+async def ask_llm_async(prompt, system_prompt=None, model=None, api_key=None, base_url=None, **params):
+    return await get_gateway().acomplete(prompt, system_prompt=system_prompt, model=model, api_key=api_key, base_url=base_url, **params)
+
+async def ask_llm_stream(prompt, on_delta, system_prompt=None, model=None, api_key=None, base_url=None, first_token_timeout=None, **params):
+    return await get_gateway().astream(prompt, on_delta, first_token_timeout, system_prompt=system_prompt, model=model,
+                                       api_key=api_key, base_url=base_url, **params)
@@ -1,6 +1,7 @@
 import pandas as pd
 from datetime import datetime, timedelta
 import os
+from regime_zero.engine.columnar_store import load_table
 
 class MacroContextLoader:
     def __init__(self, data_dir="regime_zero/data/multi_asset_history"):
@@ -14,13 +15,12 @@ class MacroContextLoader:
         if os.path.exists(self.unified_file):
             try:
                 print(f"🔄 Loading Unified Macro History from {self.unified_file}...")
-                df = pd.read_csv(self.unified_file)
-                # Ensure date is datetime
-                df['date'] = pd.to_datetime(df['date'], errors='coerce')
+                # Date is already typed by the columnar loader; only the columns we use are read
+                df = load_table(self.unified_file, date_columns=("date",), columns=["date", "asset_class", "title"])
                 
                 # Split by Asset Class
                 for asset in ['FED', 'OIL', 'GOLD']:
-                    self.data[asset] = df[df['asset_class'] == asset].copy()
+                    self.data[asset] = df[df['asset_class'] == asset].reset_index(drop=True)
                     
                 print(f"✅ Loaded Macro Context: FED({len(self.data.get('FED', []))}), OIL({len(self.data.get('OIL', []))}), GOLD({len(self.data.get('GOLD', []))})")
             except Exception as e:
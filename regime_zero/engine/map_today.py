@@ -9,7 +9,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(
 from regime_zero.ingest.fetch_market_data import get_market_vector
 from regime_zero.ingest.fetch_headlines import get_daily_headlines
 from regime_zero.embedding.vectorizer import create_market_prompt
-from utils.openrouter_client import ask_llm
+from regime_zero.engine.llm_gateway import ask_llm
 
 FAMILIES_FILE = "regime_zero/data/regime_families.json"
 
@@ -2,44 +2,109 @@ import sys
 import os
 import json
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 
 # Add project root to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 CLUSTERS_FILE = "regime_zero/data/regime_clusters.json"
+HISTORY_FILE = "regime_zero/data/history_vectors.jsonl"
+MEDOIDS_FILE = "regime_zero/data/regime_medoids.json"
+
+# Clusters file parsed once per mtime: regimes plus a row-normalized (n_regimes, dim) centroid matrix
+_CACHE = {"mtime": None, "regimes": [], "centroids": None}
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def load_centroids():
+    """Returns (regimes, centroid matrix), re-reading the clusters file only when its mtime changes."""
+    if not os.path.exists(CLUSTERS_FILE):
+        return [], None
+
+    mtime = os.path.getmtime(CLUSTERS_FILE)
+    if _CACHE["mtime"] != mtime:
+        with open(CLUSTERS_FILE, "r") as f:
+            regimes = json.load(f)
+        centroids = np.array([r['centroid'] for r in regimes], dtype=np.float32)
+        _CACHE.update(mtime=mtime, regimes=regimes, centroids=_normalize_rows(centroids) if regimes else None)
+    return _CACHE["regimes"], _CACHE["centroids"]
+
+def match_regimes(vectors):
+    """
+    Batch version of match_regime: one (n, dim) x (dim, n_regimes) product for all vectors.
+    Returns a list of (regime, score) in input order.
+    """
+    regimes, centroids = load_centroids()
+    if centroids is None:
+        print(f"❌ No clusters found at {CLUSTERS_FILE}")
+        return [(None, 0.0) for _ in vectors]
+
+    scores = _normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)) @ centroids.T
+    best = scores.argmax(axis=1)
+    return [(regimes[j], float(scores[i, j])) for i, j in enumerate(best)]
 
 def match_regime(current_vector):
     """
     Finds the closest regime for the current vector.
     Returns the matched regime and similarity score.
     """
-    if not os.path.exists(CLUSTERS_FILE):
-        print(f"❌ No clusters file found at {CLUSTERS_FILE}")
-        return None, 0.0
-        
-    with open(CLUSTERS_FILE, "r") as f:
-        regimes = json.load(f)
-        
-    best_score = -1.0
-    best_regime = None
-    
-    # Calculate similarity with each centroid
-    # Vector is 1D list, reshape to 2D for sklearn
-    curr_vec = np.array(current_vector).reshape(1, -1)
-    
-    for regime in regimes:
-        centroid = np.array(regime['centroid']).reshape(1, -1)
-        score = cosine_similarity(curr_vec, centroid)[0][0]
-        
-        # Convert to percentage-like score (0-1)
-        # Cosine similarity is -1 to 1. We assume vectors are somewhat aligned so 0-1 is typical.
-        
-        if score > best_score:
-            best_score = score
-            best_regime = regime
-            
-    return best_regime, best_score
+    # Cosine similarity is -1 to 1. We assume vectors are somewhat aligned so 0-1 is typical.
+    return match_regimes([current_vector])[0]
+
+def _load_history_vectors():
+    vectors = {}
+    if os.path.exists(HISTORY_FILE):
+        with open(HISTORY_FILE, "r") as f:
+            for line in f:
+                try:
+                    data = json.loads(line)
+                    vec = data.get('vector') or data.get('embedding')
+                    if vec:
+                        vectors[data['date']] = vec
+                except:
+                    pass
+    return vectors
+
+def _compute_medoids(regimes, centroids):
+    """Per regime, the member date whose vector is closest to the (normalized) centroid."""
+    history = _load_history_vectors()
+    medoids = {}
+    for regime, centroid in zip(regimes, centroids):
+        dates = [d for d in regime.get('dates', []) if d in history]
+        if not dates:
+            continue
+        members = _normalize_rows(np.array([history[d] for d in dates], dtype=np.float32))
+        medoids[regime['name']] = dates[int(np.argmax(members @ centroid))]
+    return medoids
+
+def medoid_date(regime):
+    """
+    Most representative date of a regime. Computed once per clusters/history file version and
+    kept in MEDOIDS_FILE; falls back to the first member date when no vectors are available.
+    """
+    if regime.get('medoid_date'):
+        return regime['medoid_date']
+
+    regimes, centroids = load_centroids()
+    if centroids is not None:
+        stamp = [os.path.getmtime(CLUSTERS_FILE), os.path.getmtime(HISTORY_FILE) if os.path.exists(HISTORY_FILE) else None]
+        cached = None
+        if os.path.exists(MEDOIDS_FILE):
+            try:
+                with open(MEDOIDS_FILE, "r") as f:
+                    cached = json.load(f)
+            except (OSError, ValueError):
+                cached = None
+        if not cached or cached.get('stamp') != stamp:
+            cached = {"stamp": stamp, "medoids": _compute_medoids(regimes, centroids)}
+            with open(MEDOIDS_FILE, "w") as f:
+                json.dump(cached, f, indent=2)
+        if regime.get('name') in cached['medoids']:
+            return cached['medoids'][regime['name']]
+
+    return regime['dates'][0]
 
 if __name__ == "__main__":
     # Test with random vector
@@ -48,3 +113,4 @@ if __name__ == "__main__":
     if regime:
         print(f"✅ Matched Regime: {regime['name']} (Score: {score:.4f})")
         print(f"Regime Dates: {regime['dates']}")
+        print(f"Medoid Date: {medoid_date(regime)}")
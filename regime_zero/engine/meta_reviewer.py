@@ -6,7 +6,7 @@ from dotenv import load_dotenv
 # Add project root to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from utils.openrouter_client import ask_llm
+from regime_zero.engine.llm_gateway import ask_llm
 
 load_dotenv()
 
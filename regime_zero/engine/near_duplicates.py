@@ -0,0 +1,74 @@
+import re
+import zlib
+import numpy as np
+
+# MinHash / LSH grouping of near-identical regime days.
+# Most master history rows are templated price-only days ("[BTC] Consolidation (Price: 0.10%)"), so texts
+# are compared with the [DATE] line dropped and the numbers of those "(Price: ...)" templates masked.
+# Numbers anywhere else (news details like "CPI 3.2%") are kept: they tell real days apart.
+
+NUM_PERM = 64
+BANDS = 8 # 8 bands x 8 rows: pairs above ~0.77 Jaccard almost always share a bucket
+THRESHOLD = 0.9 # Estimated Jaccard with the class representative needed to join a class
+SHINGLE_SIZE = 3
+_MASK = (1 << 32) - 1
+
+_NUMBER = re.compile(r"[-+]?\d+(?:[.,]\d+)*%?")
+_PRICE_TEMPLATE = re.compile(r"\(Price: [^)]*\)")
+_TOKEN = re.compile(r"[a-z#\[\]]+|\d+(?:[.,]\d+)*%?") # Unmasked numbers are tokens too
+
+def normalize_text(text):
+    """Drops the [DATE] line and masks price-template numbers, so days differing only in dates/price moves look identical."""
+    lines = [l for l in text.splitlines() if not l.startswith("[DATE]")]
+    text = _PRICE_TEMPLATE.sub(lambda m: _NUMBER.sub("#", m.group(0)), "\n".join(lines))
+    return text.lower()
+
+def _shingles(text):
+    tokens = _TOKEN.findall(normalize_text(text))
+    if len(tokens) < SHINGLE_SIZE:
+        grams = [" ".join(tokens)]
+    else:
+        grams = [" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)]
+    return np.array(sorted({zlib.crc32(g.encode('utf-8')) & _MASK for g in grams}), dtype=np.uint64)
+
+def minhash_signatures(texts, num_perm=NUM_PERM, seed=1):
+    """(n_texts, num_perm) MinHash signatures with multiply-shift hashing: ((a*x + b) mod 2^64) >> 32, a odd."""
+    rng = np.random.default_rng(seed)
+    a = (rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1))[:, None]
+    b = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)[:, None]
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint64)
+    with np.errstate(over='ignore'): # Wrap-around is the mod 2^64
+        for i, text in enumerate(texts):
+            x = _shingles(text)[None, :]
+            signatures[i] = ((a * x + b) >> np.uint64(32)).min(axis=1)
+    return signatures
+
+def duplicate_classes(texts, threshold=THRESHOLD, bands=BANDS):
+    """
+    Groups near-identical texts. Returns a class id per text: the index of the class representative,
+    which is the first text of its class in input order (with date-sorted input, the earliest day).
+    Every member is verified against its representative, not just against some other member, so
+    classes cannot drift through chains of slightly different days.
+    """
+    n = len(texts)
+    classes = np.arange(n)
+    if n == 0:
+        return classes
+    signatures = minhash_signatures(texts)
+    rows = signatures.shape[1] // bands
+    bucket_keys = [list(map(bytes, signatures[:, band * rows:(band + 1) * rows])) for band in range(bands)]
+
+    buckets = [{} for _ in range(bands)] # band -> key -> representatives seen in that bucket
+    for i in range(n):
+        for band in range(bands):
+            for rep in buckets[band].get(bucket_keys[band][i], ()):
+                if (signatures[rep] == signatures[i]).mean() >= threshold:
+                    classes[i] = rep
+                    break
+            if classes[i] != i:
+                break
+        if classes[i] == i:
+            # New representative: register it in all of its buckets
+            for band in range(bands):
+                buckets[band].setdefault(bucket_keys[band][i], []).append(i)
+    return classes
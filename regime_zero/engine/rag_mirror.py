@@ -0,0 +1,239 @@
+import sys
+import os
+import json
+import time
+import argparse
+import numpy as np
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from regime_zero.engine.generations import current, new_generation, publish
+
+MIRROR_DIR = "regime_zero/data/rag_mirror"
+MIRROR_VERSION = 1
+SYNC_INTERVAL = 15 * 60 # Seconds between remote checks; in between, queries never leave the process
+PAGE_SIZE = 1000
+
+# kind -> (table, body column); kinds match the rows of the match_rag_context RPC
+TABLES = {
+    "pattern": ("rag_patterns", "description"),
+    "strategy": ("rag_strategies", "content")
+}
+
+def _parse_vector(value):
+    # pgvector columns come back from PostgREST as '[0.1,0.2,...]' strings
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=np.float32)
+
+def _is_missing_cursor(error):
+    """True if a fetch failed because the table has no updated_at column (PostgreSQL undefined_column)."""
+    if getattr(error, 'code', None) == "42703":
+        return True
+    message = str(getattr(error, 'message', None) or error)
+    return "updated_at" in message and "does not exist" in message
+
+def _normalize(x):
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return x / norms
+
+class RagMirror:
+    """
+    Local copy of rag_patterns / rag_strategies: L2-normalized embeddings as one matrix per table,
+    so thresholded top-k retrieval is a matrix-vector product in process.
+      <table>.npy / <table>.json - embeddings and row metadata (id, name, body, updated_at)
+      meta.json                  - per-table updated_at cursor and row count, last sync time
+    Syncing fetches only rows updated since the cursor; a changed row count (deletes) or a table
+    without updated_at triggers a full reload of that table. Rows without an embedding are skipped
+    (and logged) but tracked, so they don't look like deletes.
+    Saved as immutable generations (see generations.py): mirror_dir links to the last complete save.
+    """
+    def __init__(self, mirror_dir=MIRROR_DIR, client=None):
+        self.mirror_dir = mirror_dir
+        self._client = client
+        self.meta = {"version": MIRROR_VERSION, "tables": {}, "synced_at": 0}
+        self.rows = {kind: [] for kind in TABLES}
+        self.matrix = {kind: np.zeros((0, 0), dtype=np.float32) for kind in TABLES}
+        self.load()
+
+    @property
+    def client(self):
+        if self._client is None:
+            from regime_zero.engine.rag_retriever import supabase
+            self._client = supabase
+        return self._client
+
+    def _path(self, name, root=None):
+        return os.path.join(root or self.mirror_dir, name)
+
+    def load(self):
+        root = current(self.mirror_dir) # Every file from the same save
+        try:
+            with open(self._path("meta.json", root), 'r') as f:
+                meta = json.load(f)
+            if meta.get('version') != MIRROR_VERSION:
+                return False
+            for kind, (table, _) in TABLES.items():
+                if table not in meta['tables']:
+                    continue
+                with open(self._path(f"{table}.json", root), 'r') as f:
+                    self.rows[kind] = json.load(f)
+                self.matrix[kind] = np.load(self._path(f"{table}.npy", root))
+        except (OSError, ValueError, KeyError):
+            return False
+        self.meta = meta
+        return True
+
+    def _save(self):
+        root = new_generation(self.mirror_dir)
+        for kind, (table, _) in TABLES.items():
+            np.save(self._path(f"{table}.npy", root), self.matrix[kind])
+            with open(self._path(f"{table}.json", root), 'w') as f:
+                json.dump(self.rows[kind], f)
+        with open(self._path("meta.json", root), 'w') as f:
+            json.dump(self.meta, f, indent=2)
+        publish(self.mirror_dir, root)
+
+    # --- Sync ---
+
+    def _fetch(self, table, body_column, since=None, with_cursor=True):
+        columns = f"id, name, {body_column}, embedding" + (", updated_at" if with_cursor else "")
+        rows = []
+        start = 0
+        while True:
+            query = self.client.table(table).select(columns)
+            if since:
+                query = query.gt("updated_at", since)
+            res = query.order("updated_at" if with_cursor else "id").range(start, start + PAGE_SIZE - 1).execute()
+            rows.extend(res.data or [])
+            if not res.data or len(res.data) < PAGE_SIZE:
+                return rows
+            start += PAGE_SIZE
+
+    def _count(self, table):
+        res = self.client.table(table).select("id", count="exact").limit(1).execute()
+        return res.count
+
+    def _sync_table(self, kind):
+        table, body_column = TABLES[kind]
+        state = self.meta['tables'].get(table, {})
+        cursor = state.get('cursor') if state.get('has_cursor') else None
+        remote_count = self._count(table)
+        
+        has_cursor = True
+        try:
+            changed = self._fetch(table, body_column, since=cursor)
+        except Exception as e:
+            if not _is_missing_cursor(e):
+                raise # Transient (network, auth, ...): sync() keeps serving the local copy
+            # No updated_at column: every sync is a full reload
+            has_cursor, cursor = False, None
+            changed = self._fetch(table, body_column, with_cursor=False)
+        
+        # Without a cursor everything was fetched: replace instead of merging
+        full = cursor is None
+        by_id = {} if full else {r['id']: (r, v) for r, v in zip(self.rows[kind], self.matrix[kind])}
+        skipped = set() if full else set(state.get('skipped', []))
+        seen = [] if full else [cursor] # Skipped rows still advance the cursor, so they aren't refetched every sync
+        for row in changed:
+            if row.get('embedding') is None:
+                by_id.pop(row['id'], None)
+                skipped.add(row['id'])
+                seen.append(row.get('updated_at'))
+                continue
+            skipped.discard(row['id'])
+            meta = {"id": row['id'], "name": row['name'], "body": row.get(body_column) or "", "updated_at": row.get('updated_at')}
+            by_id[row['id']] = (meta, _normalize(_parse_vector(row['embedding'])))
+        
+        if not full and remote_count is not None and remote_count != len(by_id) + len(skipped):
+            # Rows were deleted remotely: rebuild this table from scratch
+            return self._sync_table_full(kind, has_cursor)
+        
+        self._store(kind, by_id, has_cursor, skipped, seen)
+        return len(changed)
+
+    def _sync_table_full(self, kind, has_cursor):
+        table, body_column = TABLES[kind]
+        by_id = {}
+        skipped = set()
+        seen = []
+        for row in self._fetch(table, body_column, with_cursor=has_cursor):
+            if row.get('embedding') is None:
+                skipped.add(row['id'])
+                seen.append(row.get('updated_at'))
+                continue
+            meta = {"id": row['id'], "name": row['name'], "body": row.get(body_column) or "", "updated_at": row.get('updated_at')}
+            by_id[row['id']] = (meta, _normalize(_parse_vector(row['embedding'])))
+        self._store(kind, by_id, has_cursor, skipped, seen)
+        return len(by_id)
+
+    def _store(self, kind, by_id, has_cursor, skipped, seen=()):
+        table, _ = TABLES[kind]
+        items = list(by_id.values())
+        self.rows[kind] = [meta for meta, _ in items]
+        self.matrix[kind] = np.stack([v for _, v in items]).astype(np.float32) if items else np.zeros((0, 0), dtype=np.float32)
+        cursors = [m['updated_at'] for m in self.rows[kind] if m.get('updated_at')] + [c for c in seen if c]
+        previous = set(self.meta['tables'].get(table, {}).get('skipped', []))
+        if skipped - previous:
+            print(f"⚠️ [RAG Mirror] {table}: skipping {len(skipped - previous)} row(s) without an embedding (ids {sorted(skipped - previous)[:5]})")
+        # Rows without an embedding are remembered so they still count toward the remote row count
+        self.meta['tables'][table] = {"cursor": max(cursors) if cursors else None, "has_cursor": has_cursor, "rows": len(items),
+                                      "skipped": sorted(skipped)}
+
+    def sync(self, force=False):
+        """Pulls remote changes (at most every SYNC_INTERVAL unless forced). Returns False if the remote was unreachable."""
+        if not force and time.time() - self.meta.get('synced_at', 0) < SYNC_INTERVAL:
+            return True
+        try:
+            changed = {kind: self._sync_table(kind) for kind in TABLES}
+        except Exception as e:
+            print(f"⚠️ [RAG Mirror] Sync failed, serving local copy: {e}")
+            return False
+        self.meta['synced_at'] = time.time()
+        self._save()
+        if any(changed.values()):
+            print("🪞 [RAG Mirror] Synced: " + ", ".join(f"{k} +{n}" for k, n in changed.items()))
+        return True
+
+    # --- Queries ---
+
+    def __len__(self):
+        return sum(len(rows) for rows in self.rows.values())
+
+    def match(self, embedding, threshold=0.7, limit=3):
+        """Same rows as the match_rag_context RPC: [{kind, name, body, similarity}], patterns first, nearest first."""
+        query = _normalize(np.asarray(embedding, dtype=np.float32))
+        results = []
+        for kind in TABLES:
+            matrix = self.matrix[kind]
+            if len(matrix) == 0 or matrix.shape[1] != len(query):
+                continue
+            scores = matrix @ query
+            top = np.argpartition(-scores, min(limit, len(scores)) - 1)[:limit] if len(scores) > limit else np.arange(len(scores))
+            for i in top[np.argsort(-scores[top], kind='stable')]:
+                if scores[i] > threshold:
+                    row = self.rows[kind][i]
+                    results.append({"kind": kind, "name": row['name'], "body": row['body'], "similarity": float(scores[i])})
+        return results
+
+_MIRROR = None
+
+def get_rag_mirror():
+    """Process-wide mirror, synced at most every SYNC_INTERVAL."""
+    global _MIRROR
+    if _MIRROR is None:
+        _MIRROR = RagMirror()
+    _MIRROR.sync()
+    return _MIRROR
+
+if __name__ == "__main__":
+    # Usage: python regime_zero/engine/rag_mirror.py [--force]
+    parser = argparse.ArgumentParser(description="Sync the local RAG mirror")
+    parser.add_argument("--force", action="store_true", help="Check the remote even if synced recently")
+    args = parser.parse_args()
+
+    mirror = RagMirror()
+    mirror.sync(force=args.force)
+    print(f"✅ Mirror: {len(mirror.rows['pattern'])} patterns, {len(mirror.rows['strategy'])} strategies -> {MIRROR_DIR}")
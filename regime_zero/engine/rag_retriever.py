@@ -14,7 +14,8 @@ SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
 supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 
-from utils.embedding import get_embedding_sync
+from regime_zero.engine.embedding_cache import get_embedding
+from regime_zero.engine.rag_mirror import get_rag_mirror
 
 def retrieve_relevant_context(query_text, limit=3, threshold=0.7):
     """
@@ -22,68 +23,38 @@ def retrieve_relevant_context(query_text, limit=3, threshold=0.7):
     """
     print(f"🔍 [RAG] Retrieving context for: {query_text[:50]}...")
     
-    # 1. Generate Embedding
-    embedding = get_embedding_sync(query_text)
+    # 1. Generate Embedding (cached on disk: reruns of the same date don't hit the network)
+    embedding = get_embedding(query_text)
     if not embedding:
         print("⚠️ Failed to generate embedding for RAG query.")
         return ""
         
     context_parts = []
     
-    # 2. Query Patterns
+    # 2. Query Patterns + Strategies
+    # Served in process from the local mirror when it has data. Otherwise one RPC with the vector as a
+    # bound parameter (see regime_zero/infra/create_rag_match_function.sql)
     try:
-        # Using Supabase pgvector RPC 'match_documents' or similar if defined.
-        # Since we just created tables, we might not have the RPC function 'match_patterns'.
-        # We need to define the RPC function in SQL to do the vector search.
-        # IF we can't define RPC, we can't do vector search easily via client-side unless we fetch all (bad).
+        mirror = get_rag_mirror()
+        if len(mirror):
+            rows = mirror.match(embedding, threshold=threshold, limit=limit)
+        else:
+            response = supabase.rpc("match_rag_context", {
+                "query_embedding": embedding,
+                "match_threshold": threshold,
+                "match_count": limit
+            }).execute()
+            rows = response.data or []
+        print(f"📚 [RAG] {sum(r['kind'] == 'pattern' for r in rows)} pattern(s), {sum(r['kind'] == 'strategy' for r in rows)} strategy(ies)")
         
-        # Let's assume we need to create the RPC function first.
-        # But for now, let's try to use a standard name or check if we can add it.
-        
-        # If we can't run DDL, we can't add RPC.
-        # Let's try to run the search via a raw SQL query using the `run_sql` helper we found!
-        from utils.supabase_client import run_sql
-        
-        # Vector search query
-        # Note: vector syntax '[...]'
-        vector_str = str(embedding)
-        
-        sql_pattern = f"""
-        SELECT name, description, 1 - (embedding <=> '{vector_str}') as similarity
-        FROM rag_patterns
-        WHERE 1 - (embedding <=> '{vector_str}') > {threshold}
-        ORDER BY similarity DESC
-        LIMIT {limit}
-        """
-        
-        patterns = run_sql(sql_pattern)
-        print(f"🐛 [DEBUG] Patterns Result: {patterns}")
-        
-        if patterns and isinstance(patterns, list):
-            for p in patterns:
-                if isinstance(p, dict) and 'name' in p:
-                    context_parts.append(f"Similar Historical Pattern: {p['name']} ({p['description']})")
-                else:
-                    print(f"⚠️ Unexpected pattern format: {p}")
-                
-        # 3. Query Strategies
-        sql_strategy = f"""
-        SELECT name, content, 1 - (embedding <=> '{vector_str}') as similarity
-        FROM rag_strategies
-        WHERE 1 - (embedding <=> '{vector_str}') > {threshold}
-        ORDER BY similarity DESC
-        LIMIT {limit}
-        """
-        
-        strategies = run_sql(sql_strategy)
-        print(f"🐛 [DEBUG] Strategies Result: {strategies}")
-        
-        if strategies and isinstance(strategies, list):
-            for s in strategies:
-                if isinstance(s, dict) and 'name' in s:
-                    context_parts.append(f"Recommended Strategy: {s['name']} - {s['content']}")
-                else:
-                    print(f"⚠️ Unexpected strategy format: {s}")
+        # Rows come back patterns first, each set nearest first
+        for row in rows:
+            if row.get('kind') == 'pattern':
+                context_parts.append(f"Similar Historical Pattern: {row['name']} ({row['body']})")
+            elif row.get('kind') == 'strategy':
+                context_parts.append(f"Recommended Strategy: {row['name']} - {row['body']}")
+            else:
+                print(f"⚠️ Unexpected RAG row format: {row}")
                 
     except Exception as e:
         print(f"⚠️ RAG Retrieval Error: {e}")
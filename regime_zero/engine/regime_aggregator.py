@@ -1,127 +1,303 @@
 import json
 import os
+import heapq
+import hashlib
+import argparse
+import itertools
+import tempfile
+import numpy as np
 import pandas as pd
-from collections import defaultdict
 from regime_zero.engine.config import RegimeConfig
+from regime_zero.engine.columnar_store import load_table, iter_batches, arrow_path_for
+
+MIN_DATE = "2015-01-01"
+MANIFEST_FILE = "master_regime_manifest.json"
+MANIFEST_VERSION = 2
+
+# Stream tags: on the same date, news regimes and price regimes are kept apart
+NEWS_STREAM = 0
+PRICE_STREAM = 1
 
 class RegimeAggregator:
     def __init__(self, config: RegimeConfig):
         self.config = config
         self.price_dir = "regime_zero/data/market_data" # Keep this hardcoded for now or move to config if needed
-        self.price_data = self._load_price_data()
+        self.touched_dates = []
         
-    def _load_price_data(self):
-        """Loads price history for assets."""
-        price_map = {}
-        for asset in self.config.assets:
-            if asset == "NEWS": continue # No price for NEWS
-            
-            # TODO: Make price data path configurable per asset if needed
-            filename = os.path.join(self.price_dir, f"{asset}_price_history.csv")
-            if os.path.exists(filename):
-                df = pd.read_csv(filename)
-                # Create a dict: date -> {Close, Change_Pct}
-                price_map[asset] = df.set_index('Date')[['Close', 'Change_Pct']].to_dict('index')
-        return price_map
-
-    def load_regimes(self):
-        """Loads all regime JSONL files and organizes them by date."""
-        daily_regimes = defaultdict(dict)
+    def _price_file(self, asset):
+        # TODO: Make price data path configurable per asset if needed
+        return os.path.join(self.price_dir, f"{asset}_price_history.csv")
+
+    def _label_price_regimes(self, asset, df):
+        """
+        Column-wise version of the synthetic price regime (labels, narratives, summary fragments).
+        Returns a frame indexed by date instead of a dict per day.
+        """
+        change = df['Change_Pct'].to_numpy(dtype='float64')
+        flat = np.abs(change) < 0.5
+        up = change >= 0.5
         
-        for asset in self.config.assets:
-            filename = os.path.join(self.config.output_dir, f"{asset}_regimes.jsonl")
-            if not os.path.exists(filename):
+        # Simple Logic
+        labels = pd.Series(np.select([flat, up], ["Consolidation", "Bullish Price Action"], default="Bearish Price Action"), index=df.index)
+        pct = pd.Series(np.char.mod('%.2f', change), index=df.index)
+        narrative = np.select(
+            [flat, up],
+            [f"{asset} traded flat (" + pct + "%) with no major news.", f"{asset} rose " + pct + "% on market momentum."],
+            default=f"{asset} fell " + pct + "% on market momentum."
+        )
+        
+        return pd.DataFrame({
+            "close": df['Close'],
+            "change": change,
+            "regime_label": labels.astype('category'),
+            "narrative": narrative,
+            "summary_fragment": f"[{asset}] " + labels + " (Price: " + pct + "%)"
+        }, index=df.index)
+
+    # --- Streaming inputs (each yields (date, tag, asset, payload) in date order) ---
+        
+    def _iter_regimes(self, asset, spill_dir):
+        """Streams one asset's regime JSONL in date order."""
+        filename = os.path.join(self.config.output_dir, f"{asset}_regimes.jsonl")
+        if not os.path.exists(filename):
+            return
+        
+        with open(self._sorted_source(filename, spill_dir), 'r') as f:
+            for line in f:
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                date = data.get('date')
+                if date:
+                    yield date, NEWS_STREAM, asset, data
+
+    def _sorted_source(self, filename, spill_dir):
+        """
+        The merge needs date-sorted inputs. Regimes are appended in run order, so backfills can break that;
+        such a file is sorted into spill_dir for this run. The input itself is never rewritten.
+        """
+        last = ""
+        with open(filename, 'r') as f:
+            for line in f:
+                try:
+                    date = json.loads(line).get('date') or ""
+                except json.JSONDecodeError:
+                    continue
+                if date and date < last:
+                    break
+                last = max(last, date)
+            else:
+                return filename
+        
+        print(f"↕️ {filename} is not date-sorted. Sorting a copy for this run...")
+        with open(filename, 'r') as f:
+            lines = [l for l in f if l.strip()]
+
+        def sort_key(line):
+            try:
+                return json.loads(line).get('date') or ""
+            except json.JSONDecodeError:
+                return ""
+        
+        lines.sort(key=sort_key) # Stable: later lines for the same date still win
+        spill_file = os.path.join(spill_dir, os.path.basename(filename))
+        with open(spill_file, 'w') as f:
+            f.writelines(l if l.endswith("\n") else l + "\n" for l in lines)
+        return spill_file
+
+    def _iter_prices(self, asset):
+        """Streams one asset's price history batch by batch, labeling each batch column-wise."""
+        filename = self._price_file(asset)
+        if not (os.path.exists(filename) or os.path.exists(arrow_path_for(filename))):
+            return
+        
+        if self._prices_sorted(filename):
+            batches = iter_batches(filename, date_columns=("Date",))
+        else:
+            print(f"↕️ {filename} is not date-sorted. Sorting it in memory.")
+            batches = [load_table(filename, date_columns=("Date",)).sort_values('Date', kind='stable')]
+        
+        for batch in batches:
+            batch = batch.dropna(subset=['Date'])
+            if batch.empty:
+                continue
+            batch = batch.set_index(batch['Date'].dt.strftime('%Y-%m-%d'))
+            frame = self._label_price_regimes(asset, batch)
+            
+            columns = zip(frame.index, frame['regime_label'].astype(str).tolist(), frame['narrative'].tolist(),
+                          frame['change'].tolist(), frame['close'].tolist(), frame['summary_fragment'].tolist())
+            for date, label, narrative, change, close, fragment in columns:
+                record = {
+                    "regime_label": label,
+                    "narrative": narrative,
+                    "price_change": change,
+                    "close_price": close,
+                    "date": date,
+                    "asset": asset,
+                    "source": "Market Data"
+                }
+                yield date, PRICE_STREAM, asset, (record, fragment, [close, change])
+
+    def _prices_sorted(self, filename):
+        last = None
+        for batch in iter_batches(filename, date_columns=("Date",)):
+            dates = batch['Date'].dropna()
+            if dates.empty:
                 continue
+            if not dates.is_monotonic_increasing or (last is not None and dates.iloc[0] < last):
+                return False
+            last = dates.iloc[-1]
+        return True
+
+    def _iter_days(self, spill_dir):
+        """k-way merge of every per-asset stream. Yields (date, news_regimes, price_regimes) one day at a time."""
+        streams = []
+        for asset in self.config.assets:
+            streams.append(self._iter_regimes(asset, spill_dir))
+            if asset != "NEWS": # No price for NEWS
+                streams.append(self._iter_prices(asset))
                 
-            with open(filename, 'r') as f:
-                for line in f:
-                    try:
-                        data = json.loads(line)
-                        date = data.get('date')
-                        if date:
-                            daily_regimes[date][asset] = data
-                    except json.JSONDecodeError:
-                        continue
+        # heapq.merge is stable, so for duplicate (date, asset) entries the later line still wins
+        merged = heapq.merge(*streams, key=lambda item: item[0])
+        for date, items in itertools.groupby(merged, key=lambda item: item[0]):
+            news, prices = {}, {}
+            for _, tag, asset, payload in items:
+                if tag == NEWS_STREAM:
+                    news[asset] = payload
+                else:
+                    prices[asset] = payload
+            if date >= MIN_DATE: # Filter for reasonable range (e.g., 2015+)
+                yield date, news, prices
                         
-        return daily_regimes
+    # --- Master records ---
 
-    def create_master_records(self):
-        """Merges daily regimes into a single master record per day (Hybrid: News + Price)."""
+    def create_master_records(self, incremental=False):
+        """
+        Merges daily regimes into a single master record per day (Hybrid: News + Price).
+        Inputs are streamed and merged by date, so memory stays flat as history grows.
+        incremental=True only recomputes dates whose inputs changed since the last run (see manifest).
+        """
         output_file = os.path.join(self.config.output_dir, "master_regime_history.jsonl")
-        daily_regimes = self.load_regimes()
+        manifest_file = os.path.join(self.config.output_dir, MANIFEST_FILE)
         
-        # Get all unique dates from both News and Price
-        all_dates = set(daily_regimes.keys())
-        for asset_prices in self.price_data.values():
-            all_dates.update(asset_prices.keys())
-            
-        sorted_dates = sorted(list(all_dates))
+        manifest = self._load_manifest(manifest_file, output_file) if incremental else None
+        if incremental and not manifest:
+            print("ℹ️ No usable manifest found. Falling back to a full rebuild.")
+        previous = manifest['dates'] if manifest else {}
         
-        # Filter for reasonable range (e.g., 2015+)
-        sorted_dates = [d for d in sorted_dates if d >= "2015-01-01"]
+        mode = "Incremental" if manifest else "Full"
+        print(f"🔗 Aggregating (Hybrid Mode, {mode}, Streaming) for {self.config.domain_name}...")
         
-        print(f"🔗 Aggregating {len(sorted_dates)} days (Hybrid Mode) for {self.config.domain_name}...")
+        # One pass over the inputs: fingerprint each day, copy its stored line if unchanged, else rebuild it
+        # (merge-join with the old file)
+        fingerprints = {}
+        touched = []
+        stored = self._iter_master_lines(output_file) if manifest else iter(())
+        pending = next(stored, None)
+        tmp_file = output_file + ".tmp"
+        os.makedirs(self.config.output_dir, exist_ok=True)
+        with tempfile.TemporaryDirectory(prefix="regime_sort_") as spill_dir, open(tmp_file, 'w') as f:
+            for date, news, prices in self._iter_days(spill_dir):
+                fingerprint = self._fingerprint(news, prices)
+                fingerprints[date] = fingerprint
+                while pending and pending[0] < date:
+                    pending = next(stored, None) # Removed day
+                if previous.get(date) == fingerprint and pending and pending[0] == date:
+                    f.write(pending[1])
+                else:
+                    touched.append(date)
+                    f.write(json.dumps(self._build_master_record(date, news, prices)) + "\n")
+        os.replace(tmp_file, output_file)
+        removed = [d for d in previous if d not in fingerprints]
+            
+        self._save_manifest(manifest_file, output_file, fingerprints, touched)
+        self.touched_dates = touched
         
-        with open(output_file, 'w') as f:
-            for date in sorted_dates:
-                day_data = daily_regimes.get(date, {})
-                hybrid_record = {}
-                
-                for asset in self.config.assets:
-                    if asset in day_data:
-                        # Priority 1: News Regime
-                        hybrid_record[asset] = day_data[asset]
-                    elif asset in self.price_data and date in self.price_data[asset]:
-                        # Priority 2: Price Regime (Fallback)
-                        price_info = self.price_data[asset][date]
-                        hybrid_record[asset] = self._generate_price_regime(asset, price_info, date)
-                    else:
-                        # No Data
-                        hybrid_record[asset] = {"regime_label": "No Signal", "source": "Empty"}
-                        
-                # Create Master Record
-                master_record = {
-                    "date": date,
-                    "regimes": hybrid_record,
-                    "summary_text": self._generate_summary_text(date, hybrid_record)
-                }
-                
-                f.write(json.dumps(master_record) + "\n")
-                
-        print(f"✅ Saved Master Regime History to {output_file}")
+        print(f"✅ Saved Master Regime History to {output_file} ({len(fingerprints)} days, {len(touched)} recomputed, {len(removed)} removed)")
         return output_file
 
-    def _generate_price_regime(self, asset, price_info, date):
-        """Generates a synthetic regime based on price action."""
-        change = price_info.get('Change_Pct', 0)
-        close = price_info.get('Close', 0)
+    def _build_master_record(self, date, news, prices):
+        hybrid_record = {}
+        fragments = {}
         
-        # Simple Logic
-        if abs(change) < 0.5:
-            label = "Consolidation"
-            narrative = f"{asset} traded flat ({change:.2f}%) with no major news."
-        elif change >= 0.5:
-            label = "Bullish Price Action"
-            narrative = f"{asset} rose {change:.2f}% on market momentum."
-        else:
-            label = "Bearish Price Action"
-            narrative = f"{asset} fell {change:.2f}% on market momentum."
-            
+        for asset in self.config.assets:
+            if asset in news:
+                # Priority 1: News Regime
+                hybrid_record[asset] = news[asset]
+            elif asset in prices:
+                # Priority 2: Price Regime (Fallback), labeled column-wise upstream
+                hybrid_record[asset], fragments[asset], _ = prices[asset]
+            else:
+                # No Data
+                hybrid_record[asset] = {"regime_label": "No Signal", "source": "Empty"}
+                
+        # Create Master Record
         return {
-            "regime_label": label,
-            "narrative": narrative,
-            "price_change": change,
-            "close_price": close,
             "date": date,
-            "asset": asset,
-            "source": "Market Data"
+            "regimes": hybrid_record,
+            "summary_text": self._generate_summary_text(date, hybrid_record, fragments)
+        }
+
+    def _fingerprint(self, news, prices):
+        """Hash of every input that feeds a day's master record (regime lines + price rows)."""
+        inputs = {
+            "regimes": news,
+            "prices": {asset: payload[2] for asset, payload in prices.items()}
         }
+        payload = json.dumps(inputs, sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+    def _load_manifest(self, manifest_file, output_file):
+        if not os.path.exists(manifest_file) or not os.path.exists(output_file):
+            return None
+        try:
+            with open(manifest_file, 'r') as f:
+                manifest = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return None
+        # Asset list or format changes invalidate every stored fingerprint
+        if manifest.get('version') != MANIFEST_VERSION or manifest.get('assets') != list(self.config.assets):
+            return None
+        # Master file edited outside the aggregator
+        if manifest.get('master_size') != os.path.getsize(output_file):
+            return None
+        return manifest
+
+    def _save_manifest(self, manifest_file, output_file, fingerprints, touched):
+        tmp_file = manifest_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump({
+                "version": MANIFEST_VERSION,
+                "assets": list(self.config.assets),
+                "master_size": os.path.getsize(output_file),
+                "dates": fingerprints,
+                "touched_dates": touched # Consumed by downstream index updates
+            }, f)
+        os.replace(tmp_file, manifest_file)
 
-    def _generate_summary_text(self, date, day_data):
+    def _iter_master_lines(self, output_file):
+        """Streams (date, raw line) from the current master history."""
+        if not os.path.exists(output_file):
+            return
+        with open(output_file, 'r') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)['date'], line
+                except (json.JSONDecodeError, KeyError):
+                    continue
+
+    def _generate_summary_text(self, date, day_data, fragments=None):
         """Generates a text representation for Vector Embedding."""
         lines = [f"[DATE] {date}"]
+        fragments = fragments or {}
         
         for asset in self.config.assets:
+            if asset in fragments:
+                # Price regimes come with a precomputed line
+                lines.append(fragments[asset])
+                continue
+                
             regime = day_data.get(asset, {})
             label = regime.get('regime_label', 'No Signal')
             source = regime.get('source', 'News')
@@ -144,5 +320,9 @@ class RegimeAggregator:
 
 if __name__ == "__main__":
     from regime_zero.config.economy_config import ECONOMY_CONFIG
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--incremental", action="store_true", help="Recompute only dates whose inputs changed")
+    args = parser.parse_args()
+    
     aggregator = RegimeAggregator(ECONOMY_CONFIG)
-    aggregator.create_master_records()
+    aggregator.create_master_records(incremental=args.incremental)
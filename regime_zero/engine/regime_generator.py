@@ -3,7 +3,11 @@ import json
 import os
 from datetime import datetime, timedelta
 from regime_zero.engine.config import RegimeConfig
-from utils.openrouter_client import ask_llm
+from regime_zero.engine.columnar_store import load_table
+from regime_zero.engine.headline_clusters import compress_headlines, NEWS_CONTEXT_TOKENS
+from regime_zero.engine.llm_gateway import ask_llm
+
+NEWS_CANDIDATES = 60 # Recent headlines clustered into the news context (was a flat top 15)
 
 class RegimeGenerator:
     def __init__(self, config: RegimeConfig):
@@ -11,11 +15,8 @@ class RegimeGenerator:
         self.df = self._load_history()
         
     def _load_history(self):
-        if os.path.exists(self.config.history_file):
-            df = pd.read_csv(self.config.history_file)
-            df['date'] = pd.to_datetime(df['date'], errors='coerce')
-            return df
-        return pd.DataFrame()
+        # Typed dates + categorical asset_class, memory-mapped from the Arrow sidecar when available
+        return load_table(self.config.history_file, date_columns=("date",))
 
     def get_news_context(self, asset, target_date, window_days=None):
         """Retrieves news for the asset around the target date."""
@@ -43,15 +44,16 @@ class RegimeGenerator:
                    (self.df['date'] >= start_dt) & \
                    (self.df['date'] <= target_dt)
                
-        news_df = self.df.loc[mask].sort_values('date', ascending=False).head(15)
+        news_df = self.df.loc[mask].sort_values('date', ascending=False).head(NEWS_CANDIDATES)
         
         if news_df.empty:
             return "No news found."
             
-        context = []
-        for _, row in news_df.iterrows():
-            date_str = row['date'].strftime("%Y-%m-%d")
-            context.append(f"- [{date_str}] {row['title']}")
+        # Same story from several outlets -> one line with a source count, within a token budget
+        headlines = [{"title": row['title'], "date": row['date'].strftime("%Y-%m-%d"),
+                      "source": row['source'] if 'source' in row and pd.notna(row['source']) else None}
+                     for _, row in news_df.iterrows()]
+        context = [f"- [{h['date']}] {h['title']}" for h in compress_headlines(headlines, max_tokens=NEWS_CONTEXT_TOKENS)]
             
         return "\n".join(context)
 
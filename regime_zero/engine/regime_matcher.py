@@ -1,17 +1,44 @@
 import json
 import os
-import pandas as pd
-from datetime import datetime
-from utils.openrouter_client import ask_llm
+from regime_zero.engine.llm_gateway import ask_llm
 from regime_zero.engine.vector_indexer import VectorIndexer
+from regime_zero.engine.forward_returns import ForwardReturnTable, PRICE_SUFFIX
+
+OUTCOME_HORIZONS = (7, 30)
+MAX_LISTED_MEMBERS = 10 # Near-identical days named per candidate in the prompt
 
 class RegimeMatcher:
-    def __init__(self, master_file="regime_zero/data/regimes/master_regime_history.jsonl", price_file="regime_zero/data/market_data/BTC_price_history.csv"):
+    def __init__(self, master_file="regime_zero/data/regimes/master_regime_history.jsonl", price_file="regime_zero/data/market_data/BTC_price_history.csv", indexer=None):
         self.master_file = master_file
         self.price_file = price_file
         self.history = self._load_history()
-        self.price_data = self._load_price_data()
-        self.indexer = VectorIndexer()
+        self.asset = os.path.basename(price_file).replace(PRICE_SUFFIX, "")
+        # Stored table when it is current; computed (and written) here when missing or stale,
+        # otherwise every outcome would silently come back "Data Unavailable"
+        self.forward_returns = ForwardReturnTable(horizons=OUTCOME_HORIZONS, price_dir=os.path.dirname(price_file))
+        if not self.forward_returns.load():
+            print("⚠️ No forward-return table yet. Computing it...")
+            self.refresh_outcomes()
+        elif self.forward_returns.stale:
+            self.refresh_outcomes()
+        # Anything with search_many() works here, e.g. a ShardedIndex for multi-domain histories.
+        # Near-identical template days are collapsed so the LLM doesn't get ten interchangeable candidates.
+        self.indexer = indexer or VectorIndexer(collapse_duplicates=True)
+
+    def refresh_outcomes(self):
+        """Brings the forward-return table in line with the price files (writes it). Returns the refreshed assets."""
+        return self.forward_returns.update()
+
+    def close(self):
+        """Releases the indexer's resources (e.g. a ShardedIndex process pool)."""
+        if hasattr(self.indexer, "close"):
+            self.indexer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
         
     def _load_history(self):
         """Loads master regime history."""
@@ -25,65 +52,79 @@ class RegimeMatcher:
                         continue
         return records
 
-    def _load_price_data(self):
-        """Loads BTC price history for return calculation."""
-        if not os.path.exists(self.price_file):
-            return {}
-        df = pd.read_csv(self.price_file)
-        # Ensure Date is string YYYY-MM-DD
-        df['Date'] = pd.to_datetime(df['Date']).dt.strftime('%Y-%m-%d')
-        return df.set_index('Date')['Close'].to_dict()
-
     def _calculate_returns(self, start_date, days=30):
-        """Calculates future returns from start_date."""
-        if start_date not in self.price_data:
-            return None
-            
-        start_price = self.price_data[start_date]
-        
-        # Find price N days later
-        start_dt = datetime.strptime(start_date, "%Y-%m-%d")
-        target_dt = start_dt + pd.Timedelta(days=days)
-        target_date_str = target_dt.strftime("%Y-%m-%d")
-        
-        # Look for exact date or closest future date
-        future_dates = sorted([d for d in self.price_data.keys() if d >= target_date_str])
-        if not future_dates:
-            return None
-            
-        end_price = self.price_data[future_dates[0]]
-        return ((end_price - start_price) / start_price) * 100
+        """Calculates future returns from start_date (precomputed table lookup)."""
+        return self.forward_returns.get(self.asset, start_date, days)
 
     def find_structural_twins(self, target_date, top_k=3):
         """Finds the most similar historical dates (Structural Twins) using Vector Search."""
-        target_record = next((r for r in self.history if r['date'] == target_date), None)
+        return self.find_structural_twins_many([target_date], top_k=top_k).get(target_date, [])
+
+    def find_structural_twins_many(self, target_dates, top_k=3):
+        """
+        Batch version for backfills: all vector searches run as one search_many call,
+        then each date gets its own LLM verdict. Returns {date: matches}.
+        """
+        by_date = {r['date']: r for r in self.history}
+        targets = []
+        for target_date in target_dates:
+            if target_date not in by_date:
+                print(f"❌ No regime data found for {target_date}")
+                continue
+            targets.append(by_date[target_date])
         
-        if not target_record:
-            print(f"❌ No regime data found for {target_date}")
-            return []
+        if not targets:
+            return {}
             
-        print(f"🔍 Finding twins for {target_date} (Total History: {len(self.history)} days)...")
+        print(f"🔍 Finding twins for {len(targets)} date(s) (Total History: {len(self.history)} days)...")
         
         # 1. Vector Search
         # Search for similar regimes excluding future dates
-        results = self.indexer.search(target_record['summary_text'], top_k=10, filter_date=target_date)
+        all_results = self.indexer.search_many(
+            [r['summary_text'] for r in targets],
+            top_k=10,
+            filter_dates=[r['date'] for r in targets]
+        )
         
+        twins = {}
+        for target_record, results in zip(targets, all_results):
+            twins[target_record['date']] = self._judge_candidates(target_record, results)
+        return twins
+
+    def _class_members(self, cand, filter_date):
+        """Every day a hit stands for: its duplicate class before filter_date (just the hit if the index doesn't collapse)."""
+        if getattr(self.indexer, "collapse_duplicates", False):
+            members = self.indexer.members(cand['date'], filter_date=filter_date)
+            if members:
+                return members
+        return [cand]
+
+    def _class_return(self, members, days):
+        """Mean forward return over the class members that have price data."""
+        returns = [r for r in (self._calculate_returns(m['date'], days) for m in members) if r is not None]
+        return sum(returns) / len(returns) if returns else None
+
+    def _judge_candidates(self, target_record, results):
         if not results:
-            print("⚠️ No historical candidates found.")
+            print(f"⚠️ No historical candidates found for {target_record['date']}.")
             return []
             
         # 2. Prepare Candidate Data with Outcomes
         candidate_data = []
         for score, cand in results:
-            ret_7d = self._calculate_returns(cand['date'], 7)
-            ret_30d = self._calculate_returns(cand['date'], 30)
+            # A collapsed hit represents its whole class: outcomes are averaged over all its days
+            members = self._class_members(cand, target_record['date'])
+            ret_7d = self._class_return(members, 7)
+            ret_30d = self._class_return(members, 30)
             
             outcome_str = "Outcome: Data Unavailable"
             if ret_7d is not None and ret_30d is not None:
-                outcome_str = f"Outcome: +7d: {ret_7d:.1f}%, +30d: {ret_30d:.1f}%"
+                scope = f" (avg of {len(members)} near-identical days)" if len(members) > 1 else ""
+                outcome_str = f"Outcome{scope}: +7d: {ret_7d:.1f}%, +30d: {ret_30d:.1f}%"
                 
             candidate_data.append({
                 "record": cand,
+                "members": [m['date'] for m in members],
                 "outcome": outcome_str,
                 "similarity_score": score
             })
@@ -106,8 +147,13 @@ class RegimeMatcher:
             cand = item['record']
             outcome = item['outcome']
             score = item['similarity_score']
+            others = item.get('members', [])[1:]
+            also = ""
+            if others:
+                more = f" and {len(others) - MAX_LISTED_MEMBERS} more" if len(others) > MAX_LISTED_MEMBERS else ""
+                also = f"\nNear-identical days: {', '.join(others[:MAX_LISTED_MEMBERS])}{more}"
             candidates_str += f"""
-[Candidate {i+1}] Date: {cand['date']} (Vector Similarity: {score:.2f})
+[Candidate {i+1}] Date: {cand['date']} (Vector Similarity: {score:.2f}){also}
 Summary:
 {cand['summary_text']}
 {outcome}
@@ -153,6 +199,12 @@ Output JSON format:
 """
 
 if __name__ == "__main__":
-    matcher = RegimeMatcher()
-    matches = matcher.find_structural_twins("2025-12-03")
+    import sys
+    # Usage: python regime_zero/engine/regime_matcher.py [YYYY-MM-DD ...]
+    dates = sys.argv[1:] or ["2025-12-03"]
+    with RegimeMatcher() as matcher:
+        if len(dates) == 1:
+            matches = matcher.find_structural_twins(dates[0])
+        else:
+            matches = matcher.find_structural_twins_many(dates)
     print(json.dumps(matches, indent=2))
@@ -10,7 +10,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(
 from regime_zero.engine.find_historical_twin import find_twin
 from regime_zero.engine.junior_analysts import run_junior_analysis
 from regime_zero.engine.meta_reviewer import run_meta_review
-from regime_zero.engine.senior_cio import generate_final_reports
+from regime_zero.engine.senior_cio import generate_final_reports, REPORT_FILES
 
 REPORTS_DIR = "regime_zero/reports/consensus"
 CANDIDATES_FILE = "regime_zero/engine/twin_candidates.json"
@@ -91,20 +91,15 @@ def run_pipeline(target_date):
 
     # 4. Senior CIO (Layer 3)
     print("\n[STEP 4] 👔 Senior CIO Writing Final Reports...")
-    final_reports = generate_final_reports(consensus_json, target_date)
+    # Streamed straight into date_dir: partial reports are readable while they are being written
+    final_reports = generate_final_reports(consensus_json, target_date, out_dir=date_dir)
     
     if final_reports:
-        # Save Institutional
-        inst_path = os.path.join(date_dir, "Institutional_Report.md")
-        with open(inst_path, "w") as f:
-            f.write(final_reports['institutional'])
-        print(f"✅ Saved Institutional Report: {inst_path}")
-        
-        # Save Personal
-        pers_path = os.path.join(date_dir, "Personal_Report.md")
-        with open(pers_path, "w") as f:
-            f.write(final_reports['personal'])
-        print(f"✅ Saved Personal Report: {pers_path}")
+        for kind, file_name in REPORT_FILES.items():
+            if final_reports.get(kind):
+                print(f"✅ Saved {kind.capitalize()} Report: {os.path.join(date_dir, file_name)}")
+            else:
+                print(f"❌ {kind.capitalize()} Report failed.")
 
     print("\n🎉 PIPELINE COMPLETE!")
 
@@ -1,16 +1,44 @@
 import sys
 import os
 import json
+import asyncio
 from dotenv import load_dotenv
 
 # Add project root to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from utils.openrouter_client import ask_llm
+from regime_zero.engine.llm_gateway import ask_llm_stream
 
 load_dotenv()
 
-def generate_final_reports(consensus_json, date):
+# User requested GPT-4o or Sonnet. Try OpenRouter.
+REPORT_MODEL = "openai/gpt-4o"
+FIRST_TOKEN_TIMEOUT = 30.0 # Seconds without a first token before switching to the fallback model
+REPORT_FILES = {"institutional": "Institutional_Report.md", "personal": "Personal_Report.md"}
+
+async def _stream_report(kind, system_prompt, user_prompt, out_dir=None):
+    """Streams one report (into out_dir/<report file> as it is written); falls back to MAIN_LLM_MODEL on a slow start."""
+    path = os.path.join(out_dir, REPORT_FILES[kind]) if out_dir else os.devnull
+    # The fallback is served by the main provider (its MAIN_LLM_MODEL id is not an OpenRouter id)
+    attempts = ((REPORT_MODEL, {}), (os.getenv("MAIN_LLM_MODEL"), {"api_key": os.getenv("MAIN_LLM_KEY"), "base_url": os.getenv("MAIN_LLM_URL")}))
+    for model, route in attempts:
+        with open(path, "w") as f:
+            def on_delta(text):
+                f.write(text)
+                f.flush()
+            response = await ask_llm_stream(user_prompt, on_delta, system_prompt=system_prompt, model=model,
+                                            first_token_timeout=FIRST_TOKEN_TIMEOUT, **route)
+        if response:
+            print(f"   ✅ {kind.capitalize()} Report done ({model})")
+            return response
+        print(f"   ⚠️ {kind.capitalize()} Report failed on {model}, falling back...")
+    if out_dir and os.path.exists(path):
+        os.remove(path)
+    return None
+
+
+def generate_final_reports(consensus_json, date, out_dir=None):
+    """Returns {'institutional': text, 'personal': text} (None for a report that failed). With out_dir, the .md files fill in while streaming."""
     print("👔 Senior CIO is writing the final reports...")
     
     # 1. Institutional Report
@@ -56,27 +84,17 @@ Structure:
 4. The Trap (What to watch out for)
 """
 
-    reports = {}
+    # Both reports at once, each streamed to its file
+    async def write_both():
+        print("   Writing Institutional + Personal Reports...")
+        return await asyncio.gather(
+            _stream_report("institutional", inst_system_prompt, inst_user_prompt, out_dir),
+            _stream_report("personal", pers_system_prompt, pers_user_prompt, out_dir)
+        )
     
     try:
-        # User requested GPT-4o or Sonnet. Try OpenRouter.
-        model = "openai/gpt-4o"
-        
-        # Institutional
-        print("   Writing Institutional Report...")
-        inst_resp = ask_llm(inst_user_prompt, system_prompt=inst_system_prompt, model=model)
-        if not inst_resp: # Fallback
-             inst_resp = ask_llm(inst_user_prompt, system_prompt=inst_system_prompt, model=os.getenv("MAIN_LLM_MODEL"))
-        reports['institutional'] = inst_resp
-        
-        # Personal
-        print("   Writing Personal Report...")
-        pers_resp = ask_llm(pers_user_prompt, system_prompt=pers_system_prompt, model=model)
-        if not pers_resp: # Fallback
-             pers_resp = ask_llm(pers_user_prompt, system_prompt=pers_system_prompt, model=os.getenv("MAIN_LLM_MODEL"))
-        reports['personal'] = pers_resp
-        
-        return reports
+        inst_resp, pers_resp = asyncio.run(write_both())
+        return {"institutional": inst_resp, "personal": pers_resp}
 
     except Exception as e:
         print(f"❌ Senior CIO Failed: {e}")
@@ -0,0 +1,244 @@
+import sys
+import os
+import json
+import heapq
+import argparse
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+from regime_zero.engine.vector_indexer import VectorIndexer
+
+SHARD_ROOT = "regime_zero/data/regimes/shards"
+MASTER_NAME = "master_regime_history.jsonl"
+
+# --- Worker side (module level so it can run in a process pool) ---
+
+SHARD_CACHE_SIZE = 64 # Loaded shard indexers kept per process (LRU)
+_SHARD_CACHE = OrderedDict()
+
+def _search_shard(master_file, index_dir, terms_dir, query_texts, top_k, filter_dates):
+    """
+    Runs a batch query against one shard. Indexers are cached per process and reloaded when the
+    shard's source file changes (loading is a cheap mmap).
+    """
+    key = (index_dir, master_file, os.path.getmtime(master_file), os.path.realpath(index_dir))
+    indexer = _SHARD_CACHE.get(key)
+    if indexer is None:
+        indexer = VectorIndexer(master_file=master_file, index_dir=index_dir, terms_dir=terms_dir)
+        indexer.load_index()
+        _SHARD_CACHE[key] = indexer
+        while len(_SHARD_CACHE) > SHARD_CACHE_SIZE:
+            _SHARD_CACHE.popitem(last=False)
+    else:
+        _SHARD_CACHE.move_to_end(key)
+    return indexer.search_many(query_texts, top_k=top_k, filter_dates=filter_dates)
+
+class ShardedIndex:
+    """
+    VectorIndexer split into independent shards (one per domain, optionally one per year within
+    a domain). Each shard has its own source file and index directory, so it is rebuilt on its own
+    when its slice of history changes. Queries fan out to a process pool and the per-shard top-k
+    lists are merged into a global top-k.
+    Same search()/search_many() interface as VectorIndexer, so RegimeMatcher can take it as its indexer.
+    One vocabulary/IDF is fitted over the whole corpus (<root>/terms) and shared by every shard, so
+    shard scores are the scores a single global index would give and the merged ranking is exact.
+    A corpus change that moves the shared IDF therefore rebuilds every shard.
+    Use as a context manager (or call close()) to shut the process pool down.
+    """
+    def __init__(self, sources, root=SHARD_ROOT, by_year=True, workers=None):
+        # sources: {domain name: master history file}
+        self.sources = sources
+        self.root = root
+        self.by_year = by_year
+        self.workers = workers
+        self.shards = {} # name -> {"master_file", "index_dir", "min_date", "max_date"}
+        self.terms_dir = os.path.join(root, "terms")
+        self._stamp = None
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @classmethod
+    def from_configs(cls, configs, **kwargs):
+        """One domain per RegimeConfig, using its aggregated master history."""
+        return cls({c.domain_name: os.path.join(c.output_dir, MASTER_NAME) for c in configs}, **kwargs)
+
+    # --- Shard layout ---
+
+    def _split_by_year(self, domain, master_file):
+        """
+        Splits a master file into per-year source files. A year file is only rewritten when its
+        content changed, so untouched years keep their index as is.
+        """
+        by_year = {}
+        with open(master_file, 'r') as f:
+            for line in f:
+                try:
+                    date = json.loads(line).get('date', '')
+                except json.JSONDecodeError:
+                    continue
+                by_year.setdefault(date[:4], []).append(line if line.endswith("\n") else line + "\n")
+        
+        shards = {}
+        domain_dir = os.path.join(self.root, domain)
+        os.makedirs(domain_dir, exist_ok=True)
+        for year, lines in sorted(by_year.items()):
+            source = os.path.join(domain_dir, f"{year}.jsonl")
+            content = "".join(lines)
+            current = None
+            if os.path.exists(source):
+                with open(source, 'r') as f:
+                    current = f.read()
+            if current != content:
+                with open(source, 'w') as f:
+                    f.write(content)
+            shards[f"{domain}/{year}"] = (source, year + "-01-01", year + "-12-31")
+        
+        # Drop years that disappeared from the master file
+        for name in os.listdir(domain_dir):
+            if name.endswith(".jsonl") and name[:-6] not in by_year:
+                os.remove(os.path.join(domain_dir, name))
+        return shards
+
+    def _fit_terms(self):
+        """Fits the shared vocabulary/IDF over every source file. Files are only rewritten when they change."""
+        corpus = []
+        for master_file in self.sources.values():
+            if not os.path.exists(master_file):
+                continue
+            with open(master_file, 'r') as f:
+                for line in f:
+                    try:
+                        corpus.append(json.loads(line).get('summary_text', ''))
+                    except json.JSONDecodeError:
+                        continue
+        if not corpus:
+            return
+        vectorizer = TfidfVectorizer(stop_words='english', max_features=5000)
+        vectorizer.fit(corpus)
+        vocabulary = [None] * len(vectorizer.vocabulary_)
+        for term, col in vectorizer.vocabulary_.items():
+            vocabulary[col] = term
+        idf = vectorizer.idf_.astype(np.float32)
+        
+        os.makedirs(self.terms_dir, exist_ok=True)
+        vocab_path = os.path.join(self.terms_dir, "vocabulary.json")
+        idf_path = os.path.join(self.terms_dir, "idf.npy")
+        try:
+            with open(vocab_path, 'r') as f:
+                unchanged = json.load(f) == vocabulary and np.array_equal(np.load(idf_path), idf)
+        except (OSError, ValueError):
+            unchanged = False
+        if unchanged:
+            return
+        # Each file swapped in whole (shards only read these while building)
+        np.save(idf_path + ".tmp.npy", idf)
+        os.replace(idf_path + ".tmp.npy", idf_path)
+        with open(vocab_path + ".tmp", 'w') as f:
+            json.dump(vocabulary, f)
+        os.replace(vocab_path + ".tmp", vocab_path)
+        print(f"📖 Shared vocabulary refitted over {len(corpus)} records ({len(vocabulary)} terms).")
+
+    def _source_stamp(self):
+        return {d: os.path.getmtime(p) if os.path.exists(p) else None for d, p in self.sources.items()}
+
+    def sync(self):
+        """Refreshes the shard layout from the source files. Returns the shard names."""
+        self._stamp = self._source_stamp()
+        self._fit_terms()
+        self.shards = {}
+        for domain, master_file in self.sources.items():
+            if not os.path.exists(master_file):
+                print(f"⚠️ [{domain}] Master file not found: {master_file}")
+                continue
+            if self.by_year:
+                layout = self._split_by_year(domain, master_file)
+            else:
+                layout = {domain: (master_file, None, None)}
+            for name, (source, min_date, max_date) in layout.items():
+                self.shards[name] = {
+                    "master_file": source,
+                    "index_dir": os.path.join(self.root, "indexes", name.replace("/", "_")),
+                    "min_date": min_date,
+                    "max_date": max_date
+                }
+        return list(self.shards)
+
+    def rebuild(self, names=None):
+        """Loads (and rebuilds where stale) the given shards, or all of them. Each shard is independent."""
+        if not self.shards:
+            self.sync()
+        for name in names or list(self.shards):
+            shard = self.shards[name]
+            VectorIndexer(master_file=shard['master_file'], index_dir=shard['index_dir'], terms_dir=self.terms_dir).load_index()
+
+    # --- Queries ---
+
+    def _get_pool(self):
+        if self._pool is None and self.workers != 0:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def search(self, query_text, top_k=10, filter_date=None):
+        """Searches every shard for similar regimes."""
+        return self.search_many([query_text], top_k=top_k, filter_dates=[filter_date])[0]
+
+    def search_many(self, query_texts, top_k=10, filter_dates=None):
+        """
+        Batch query: each shard gets the whole batch in one task and returns its own top-k per query.
+        Year shards entirely on or after every filter date are skipped.
+        """
+        if not query_texts:
+            return []
+        if not self.shards or self._stamp != self._source_stamp():
+            # New or changed master history: re-split, then rebuild stale shards up front rather than inside the workers
+            self.sync()
+            self.rebuild()
+        filter_dates = filter_dates or [None] * len(query_texts)
+        
+        latest_cutoff = None if any(d is None for d in filter_dates) else max(filter_dates)
+        targets = [s for s in self.shards.values()
+                   if latest_cutoff is None or s['min_date'] is None or s['min_date'] < latest_cutoff]
+        
+        pool = self._get_pool()
+        if pool is None or len(targets) <= 1:
+            shard_results = [_search_shard(s['master_file'], s['index_dir'], self.terms_dir, query_texts, top_k, filter_dates) for s in targets]
+        else:
+            futures = [pool.submit(_search_shard, s['master_file'], s['index_dir'], self.terms_dir, query_texts, top_k, filter_dates) for s in targets]
+            shard_results = [f.result() for f in futures]
+        
+        # Global top-k merge per query
+        merged = []
+        for q in range(len(query_texts)):
+            candidates = (hit for result in shard_results for hit in result[q])
+            merged.append(heapq.nlargest(top_k, candidates, key=lambda hit: hit[0]))
+        return merged
+
+if __name__ == "__main__":
+    # Usage: python regime_zero/engine/sharded_index.py "query text" [--before YYYY-MM-DD] [--domain name=path ...]
+    parser = argparse.ArgumentParser(description="Sharded multi-process regime search")
+    parser.add_argument("query")
+    parser.add_argument("--before", default=None)
+    parser.add_argument("--domain", action="append", default=[], help="name=path/to/master_regime_history.jsonl")
+    parser.add_argument("--no-years", action="store_true", help="One shard per domain instead of per domain-year")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    sources = dict(d.split("=", 1) for d in args.domain) or {"economy": os.path.join("regime_zero/data/regimes", MASTER_NAME)}
+    with ShardedIndex(sources, by_year=not args.no_years, workers=args.workers) as index:
+        for score, record in index.search(args.query, filter_date=args.before):
+            print(f"{score:.3f}  {record['date']}")
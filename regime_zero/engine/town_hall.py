@@ -6,7 +6,7 @@ from typing import List, Dict
 # Add project root to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from utils.openrouter_client import ask_llm
+from regime_zero.engine.llm_gateway import ask_llm
 
 # Define the "Employees"
 EMPLOYEES = {
@@ -1,6 +1,6 @@
 import os
 from datetime import datetime
-from utils.openrouter_client import ask_llm
+from regime_zero.engine.llm_gateway import ask_llm
 
 class TownHall:
     def __init__(self):
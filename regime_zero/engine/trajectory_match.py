@@ -0,0 +1,184 @@
+import sys
+import os
+import argparse
+import numpy as np
+import pandas as pd
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from regime_zero.engine.forward_returns import PRICE_DIR
+from regime_zero.engine.feature_twins import (FEATURE_ASSETS, LEVEL_ASSETS, MAX_STALE_DAYS, MIN_OVERLAP,
+                                              load_local_prices, load_supabase_prices)
+
+DEFAULT_WINDOW = 20 # Trading days in the query path
+DEFAULT_HORIZON = 20 # Trading days of "what happened next" returned with each analog
+
+# --- Sliding distance (MASS) ---
+
+def _sliding_sums(values, m):
+    """Sum over every length-m window: (n - m + 1,) via one cumulative sum."""
+    cumsum = np.concatenate([[0.0], np.cumsum(values)])
+    return cumsum[m:] - cumsum[:-m]
+
+def sliding_dot(query, series_fft, n, nfft):
+    """Dot product of `query` with every length-m window of a series, from the series' precomputed rfft."""
+    m = len(query)
+    query_fft = np.fft.rfft(query[::-1], nfft)
+    return np.fft.irfft(series_fft * query_fft, nfft)[m - 1:n]
+
+def mass_distance(query, series, znorm=True, series_fft=None, nfft=None):
+    """
+    Squared distance per sample between `query` and every window of `series`, O(n log n) (MASS).
+    znorm=True: z-normalized Euclidean distance (shape only), in [0, 4].
+    znorm=False: mean-centred Euclidean distance (shape and amplitude, not level).
+    """
+    n, m = len(series), len(query)
+    if nfft is None:
+        nfft = 1 << int(np.ceil(np.log2(n + m)))
+    if series_fft is None:
+        series_fft = np.fft.rfft(series, nfft)
+    qt = sliding_dot(query, series_fft, n, nfft)
+
+    mu_t = _sliding_sums(series, m) / m
+    sq_t = _sliding_sums(series * series, m)
+    mu_q = query.mean()
+    cross = qt - m * mu_q * mu_t # sum (Q - mu_q)(T - mu_t)
+    var_t = np.maximum(sq_t - m * mu_t * mu_t, 0) # m * sigma_t^2
+    var_q = max(float(((query - mu_q) ** 2).sum()), 0.0)
+
+    if znorm:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = cross / np.sqrt(var_t * var_q)
+        corr = np.where(var_t > 1e-12, np.clip(corr, -1, 1), 0.0) # Flat windows are uncorrelated with anything
+        return 2 * (1 - corr)
+    return np.maximum(var_q + var_t - 2 * cross, 0) / m
+
+# --- Trajectory matcher ---
+
+class TrajectoryMatcher:
+    """
+    Matches the last N trading days of multi-asset log price paths against every historical
+    window of the same length, per asset with MASS (FFT sliding dot products), then combines the
+    per-asset distances with optional weights. Analogs must be fully in the past, including the
+    `horizon` days that followed them, and don't overlap each other.
+    Each asset's FFT is computed once (per FFT size), so repeated queries only pay for the
+    query transform.
+    """
+    def __init__(self, price_dir=PRICE_DIR, assets=FEATURE_ASSETS, source="local", business_days=True):
+        closes = load_supabase_prices(assets) if source == "supabase" else load_local_prices(price_dir, assets)
+        panel = pd.DataFrame(closes).sort_index()
+        if business_days:
+            panel = panel[panel.index.dayofweek < 5] # Weekends only carry BTC
+        panel = panel.ffill(limit=MAX_STALE_DAYS)
+        self.dates = np.asarray([d.strftime("%Y-%m-%d") for d in panel.index])
+        self.assets = list(panel.columns)
+        # Log prices (levels for rates/VIX, whose "price" is already a level). Non-positive prices
+        # (crude in April 2020) have no log and count as missing.
+        self.paths = {a: (panel[a] if a in LEVEL_ASSETS else np.log(panel[a].where(panel[a] > 0))).to_numpy(dtype=float)
+                      for a in self.assets}
+        self._ffts = {}
+
+    def _fft(self, asset, nfft):
+        key = (asset, nfft)
+        if key not in self._ffts:
+            series = np.nan_to_num(self.paths[asset])
+            self._ffts[key] = np.fft.rfft(series, nfft)
+        return self._ffts[key]
+
+    def distance_profile(self, end, window=DEFAULT_WINDOW, weights=None, znorm=True):
+        """
+        Combined distance of the window ending at row `end` (inclusive) to every window of the
+        history: (n - window + 1,), indexed by window start. Per asset, windows with missing data
+        are skipped and the remaining weights renormalized; inf where less than MIN_OVERLAP of
+        the weight is left.
+        """
+        weights = weights or {}
+        n = len(self.dates)
+        nfft = 1 << int(np.ceil(np.log2(n + window)))
+        total = np.zeros(n - window + 1)
+        weight_sum = np.zeros(n - window + 1)
+        max_weight = 0.0
+        
+        for asset in self.assets:
+            w = float(weights.get(asset, 1.0))
+            series = self.paths[asset]
+            query = series[end - window + 1:end + 1]
+            if w <= 0 or np.isnan(query).any():
+                continue
+            max_weight += w
+            missing = _sliding_sums(np.isnan(series).astype(float), window) > 0
+            dist = mass_distance(query, np.nan_to_num(series), znorm, self._fft(asset, nfft), nfft)
+            valid = ~missing
+            total[valid] += w * dist[valid]
+            weight_sum[valid] += w
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            profile = total / weight_sum
+        profile[(weight_sum == 0) | (weight_sum < MIN_OVERLAP * max_weight)] = np.inf
+        return profile
+
+    def match(self, date=None, window=DEFAULT_WINDOW, horizon=DEFAULT_HORIZON, top_k=5, weights=None, znorm=True, past_only=True):
+        """
+        Ranked analog windows for the `window` trading days ending on `date` (default: latest).
+        past_only: an analog and its next `horizon` days must end before the query window starts.
+        Returns [{"start", "end", "distance", "next_path": {asset: [% return vs analog end, ...]}}].
+        """
+        end = len(self.dates) - 1 if date is None else int(np.searchsorted(self.dates, date, side='right')) - 1
+        if end < window - 1:
+            return []
+        profile = self.distance_profile(end, window, weights, znorm)
+        
+        starts = np.arange(len(profile))
+        allowed = starts + window - 1 + horizon < len(self.dates) # A full next path exists
+        query_start = end - window + 1
+        if past_only:
+            allowed &= starts + window - 1 + horizon < query_start
+        else:
+            allowed &= np.abs(starts - query_start) >= window # No trivial self-match
+        profile = np.where(allowed, profile, np.inf)
+        
+        # Best windows first, with a matrix-profile style exclusion zone so analogs don't overlap
+        analogs = []
+        taken = np.zeros(len(profile), dtype=bool)
+        for start in np.argsort(profile, kind='stable'):
+            if len(analogs) >= top_k or not np.isfinite(profile[start]):
+                break
+            if taken[start]:
+                continue
+            taken[max(0, start - window + 1):start + window] = True
+            analog_end = start + window - 1
+            next_path = {}
+            for asset in self.assets:
+                series = self.paths[asset]
+                future = series[analog_end + 1:analog_end + 1 + horizon] - series[analog_end]
+                if asset not in LEVEL_ASSETS:
+                    future = np.expm1(future) * 100
+                next_path[asset] = [None if np.isnan(v) else round(float(v), 4) for v in future]
+            analogs.append({
+                "start": str(self.dates[start]),
+                "end": str(self.dates[analog_end]),
+                "distance": float(profile[start]),
+                "next_path": next_path
+            })
+        return analogs
+
+if __name__ == "__main__":
+    # Usage: python regime_zero/engine/trajectory_match.py [--date YYYY-MM-DD] [--window 20] [--horizon 20] [--weight VIX=2 ...] [--raw]
+    parser = argparse.ArgumentParser(description="Multi-asset trajectory analogs (MASS / FFT sliding distance)")
+    parser.add_argument("--date", default=None)
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW)
+    parser.add_argument("--horizon", type=int, default=DEFAULT_HORIZON)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--weight", action="append", default=[], help="asset=weight")
+    parser.add_argument("--raw", action="store_true", help="Mean-centred instead of z-normalized distance (amplitude matters)")
+    parser.add_argument("--source", choices=["local", "supabase"], default="local")
+    args = parser.parse_args()
+
+    weights = {k: float(v) for k, v in (w.split("=", 1) for w in args.weight)}
+    matcher = TrajectoryMatcher(source=args.source)
+    analogs = matcher.match(args.date, args.window, args.horizon, args.top_k, weights, znorm=not args.raw)
+    print(f"🧭 Trajectory analogs ({args.window}d window, next {args.horizon}d):")
+    for i, analog in enumerate(analogs):
+        moves = ", ".join(f"{a} {p[-1]:+.1f}" for a, p in analog['next_path'].items() if p and p[-1] is not None)
+        print(f"#{i+1} {analog['start']} -> {analog['end']}  d={analog['distance']:.3f}  next: {moves}")
@@ -0,0 +1,230 @@
+import sys
+import os
+import json
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from regime_zero.engine.twin_index import get_twin_index
+from regime_zero.engine.generations import current, new_generation, publish
+
+GRAPH_DIR = "regime_zero/data/twin_graph"
+DASHBOARD_FILE = "regime_zero/dashboard/public/twin_graph.json"
+
+GRAPH_VERSION = 1
+TOP_K = 10
+BLOCK_SIZE = 256 # Query rows per sparse matrix-matrix product
+PARALLEL_MIN_ROWS = 2000 # Below this, worker start-up costs more than it saves
+EXPORT_K = 3 # Edges per date written for the dashboard
+
+# --- Blocked past-only top-k (module level so worker processes can run it) ---
+
+_WORKER_MATRIX = None
+
+def _init_worker(matrix):
+    global _WORKER_MATRIX
+    _WORKER_MATRIX = matrix
+
+def _top_k_block(start, end, k, matrix=None, limits=None):
+    """
+    Top-k earlier rows for query rows [start, end) of a date-sorted, L2-normalized matrix.
+    limits[i] caps the candidate columns of query row start + i (default start + i: strictly earlier
+    dates). Only columns below the largest limit are multiplied.
+    """
+    matrix = _WORKER_MATRIX if matrix is None else matrix
+    limits = np.arange(start, end) if limits is None else np.asarray(limits)
+    neighbors = np.full((end - start, k), -1, dtype=np.int32)
+    top_scores = np.full((end - start, k), np.nan, dtype=np.float32)
+    width = int(limits.max()) if len(limits) else 0
+    if width == 0:
+        return start, neighbors, top_scores
+
+    scores = (matrix[start:end] @ matrix[:width].T).toarray()
+    for i in range(end - start):
+        n_past = int(limits[i])
+        if n_past <= 0:
+            continue
+        row = scores[i, :n_past]
+        kk = min(k, n_past)
+        best = np.argpartition(-row, kk - 1)[:kk]
+        best = best[np.argsort(-row[best], kind='stable')]
+        neighbors[i, :kk] = best
+        top_scores[i, :kk] = row[best]
+    return start, neighbors, top_scores
+
+class TwinGraph:
+    """
+    Top-k past-only twins for every date of the twin index.
+      neighbors.npy  - (n_dates, k) int32 row numbers into dates.json (-1 = none), best first
+      scores.npy     - (n_dates, k) float32 raw cosine similarity
+      quantiles.npy  - distribution of top-1 scores, used to calibrate a raw score into a percentile
+      dates.json / hashes.json / meta.json (written last)
+    Rows are date-sorted. A row only depends on earlier dates, so new days only add rows.
+    Saved as immutable generations (see generations.py): graph_dir links to the last complete save.
+    """
+    def __init__(self, graph_dir=GRAPH_DIR, k=TOP_K):
+        self.graph_dir = graph_dir
+        self.k = k
+        self.meta = {}
+        self.dates = []
+        self.hashes = []
+        self.row_of = {}
+        self.neighbors = np.zeros((0, k), dtype=np.int32)
+        self.scores = np.zeros((0, k), dtype=np.float32)
+        self.quantiles = np.zeros(0, dtype=np.float32)
+
+    def _path(self, name, root=None):
+        return os.path.join(root or self.graph_dir, name)
+
+    def load(self):
+        root = current(self.graph_dir) # Every file from the same save
+        try:
+            with open(self._path("meta.json", root), 'r') as f:
+                meta = json.load(f)
+            if meta.get('version') != GRAPH_VERSION or meta.get('k') != self.k:
+                return False
+            self.neighbors = np.load(self._path("neighbors.npy", root))
+            self.scores = np.load(self._path("scores.npy", root))
+            self.quantiles = np.load(self._path("quantiles.npy", root))
+            with open(self._path("dates.json", root), 'r') as f:
+                self.dates = json.load(f)
+            with open(self._path("hashes.json", root), 'r') as f:
+                self.hashes = json.load(f)
+        except (OSError, ValueError, KeyError):
+            return False
+        self.meta = meta
+        self.row_of = {d: i for i, d in enumerate(self.dates)}
+        return True
+
+    def save(self):
+        """Writes a complete new generation, then publishes it (a crash mid-save leaves the previous one)."""
+        root = new_generation(self.graph_dir)
+        np.save(self._path("neighbors.npy", root), self.neighbors)
+        np.save(self._path("scores.npy", root), self.scores)
+        np.save(self._path("quantiles.npy", root), self.quantiles)
+        with open(self._path("dates.json", root), 'w') as f:
+            json.dump(self.dates, f)
+        with open(self._path("hashes.json", root), 'w') as f:
+            json.dump(self.hashes, f)
+        with open(self._path("meta.json", root), 'w') as f:
+            json.dump(self.meta, f, indent=2)
+        publish(self.graph_dir, root)
+
+    # --- Build / update ---
+
+    def update(self, workers=None, force=False):
+        """
+        Brings the graph in line with the twin index. If the index only gained later dates under the
+        same IDF, just the new rows are computed; anything else (IDF refresh, edited or back-filled
+        dates) recomputes the whole graph. Returns the number of rows computed.
+        """
+        index = get_twin_index()
+        order = sorted(range(len(index.dates)), key=lambda i: index.dates[i])
+        dates = [index.dates[i] for i in order]
+        hashes = [index.hashes[i] for i in order]
+        if not dates:
+            print("⚠️ Twin index is empty.")
+            return 0
+        
+        start = 0
+        if not force and self.load() and self.meta.get('idf_version') == index.meta['idf_version']:
+            n = len(self.dates)
+            if dates[:n] == self.dates and hashes[:n] == self.hashes:
+                start = n
+        if start == len(dates):
+            return 0 # Up to date
+        
+        matrix = index.matrix[order].tocsr()
+        neighbors, scores = self._compute(matrix, start, workers)
+        
+        if start:
+            self.neighbors = np.vstack([self.neighbors[:start], neighbors])
+            self.scores = np.vstack([self.scores[:start], scores])
+        else:
+            self.neighbors, self.scores = neighbors, scores
+        self.dates, self.hashes = dates, hashes
+        self.row_of = {d: i for i, d in enumerate(self.dates)}
+        
+        # Calibration: where a raw score falls in the distribution of everyone's best twin
+        top1 = self.scores[:, 0]
+        top1 = top1[~np.isnan(top1)]
+        self.quantiles = np.quantile(top1, np.linspace(0, 1, 101)).astype(np.float32) if len(top1) else np.zeros(0, dtype=np.float32)
+        
+        self.meta = {"version": GRAPH_VERSION, "k": self.k, "idf_version": index.meta['idf_version'], "n_rows": len(self.dates)}
+        self.save()
+        print(f"🕸️ Twin graph: {len(dates) - start} rows computed ({len(dates)} dates, k={self.k}).")
+        return len(dates) - start
+
+    def _compute(self, matrix, start, workers):
+        n = matrix.shape[0]
+        blocks = [(s, min(s + BLOCK_SIZE, n)) for s in range(start, n, BLOCK_SIZE)]
+        neighbors = np.full((n - start, self.k), -1, dtype=np.int32)
+        scores = np.full((n - start, self.k), np.nan, dtype=np.float32)
+        
+        if workers == 1 or n - start < PARALLEL_MIN_ROWS:
+            results = (_top_k_block(s, e, self.k, matrix) for s, e in blocks)
+            for s, block_neighbors, block_scores in results:
+                neighbors[s - start:s - start + len(block_neighbors)] = block_neighbors
+                scores[s - start:s - start + len(block_scores)] = block_scores
+            return neighbors, scores
+        
+        # The matrix is shipped to each worker once (initializer), not once per block
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(matrix,)) as pool:
+            futures = [pool.submit(_top_k_block, s, e, self.k) for s, e in blocks]
+            for future in futures:
+                s, block_neighbors, block_scores = future.result()
+                neighbors[s - start:s - start + len(block_neighbors)] = block_neighbors
+                scores[s - start:s - start + len(block_scores)] = block_scores
+        return neighbors, scores
+
+    # --- Queries ---
+
+    def calibrate(self, raw):
+        """Percentile (0-1) of a raw score among all dates' top-1 twin scores."""
+        if len(self.quantiles) == 0:
+            return 0.0
+        return float(np.interp(raw, self.quantiles, np.linspace(0, 1, len(self.quantiles))))
+
+    def twins(self, date, top_k=None):
+        """[(twin_date, raw_score, calibrated_score)] for one date, best first. O(1) in the history size."""
+        row = self.row_of.get(date)
+        if row is None:
+            return []
+        out = []
+        for j, raw in zip(self.neighbors[row][:top_k], self.scores[row][:top_k]):
+            if j < 0:
+                break
+            out.append((self.dates[j], float(raw), self.calibrate(raw)))
+        return out
+
+    def export_dashboard(self, path=DASHBOARD_FILE, k=EXPORT_K):
+        """Writes the top-k edges per date as {links: [...]} for GraphView."""
+        links = []
+        for date in self.dates:
+            for rank, (twin_date, raw, calibrated) in enumerate(self.twins(date, k)):
+                links.append({"source": date, "target": twin_date, "rank": rank + 1,
+                              "similarity": round(raw, 4), "score": round(calibrated, 4)})
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({"links": links}, f)
+        print(f"✨ Twin graph exported for dashboard: {len(links)} edges -> {path}")
+
+if __name__ == "__main__":
+    # Usage: python regime_zero/engine/twin_graph.py [--full] [--workers N] [--export] [--date YYYY-MM-DD]
+    parser = argparse.ArgumentParser(description="Precompute past-only top-k twins for every date")
+    parser.add_argument("--full", action="store_true", help="Recompute every row")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--export", action="store_true", help="Write the dashboard twin_graph.json")
+    parser.add_argument("--date", default=None, help="Print the twins of one date")
+    args = parser.parse_args()
+
+    graph = TwinGraph()
+    graph.update(workers=args.workers, force=args.full)
+    if args.export:
+        graph.export_dashboard()
+    if args.date:
+        for twin_date, raw, calibrated in graph.twins(args.date):
+            print(f"{twin_date}  raw={raw:.3f}  calibrated={calibrated:.1%}")
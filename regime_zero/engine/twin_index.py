@@ -0,0 +1,249 @@
+import sys
+import os
+import json
+import hashlib
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from regime_zero.engine.generations import current, new_generation, publish
+
+OBJECTS_FILE = "regime_zero/data/regime_objects.jsonl"
+INDEX_DIR = "regime_zero/data/twin_index"
+
+INDEX_VERSION = 1
+N_FEATURES = 2 ** 18
+IDF_REFRESH_RATIO = 0.10 # Refresh IDF once the corpus has grown 10% since the last refresh
+TAIL_BYTES = 4096 # Bytes hashed at the end of the indexed region to detect append-only growth
+
+def regime_text(r):
+    """Combine fields for rich semantic matching."""
+    return f"{r['regime_name']} {r['historical_vibe']} {' '.join(r['signature'])} {r.get('structural_reasoning', '')}"
+
+class TwinIndex:
+    """
+    Persistent TF-IDF index over regime_objects.jsonl.
+    Terms are hashed (no vocabulary to refit), so new dates are appended as rows.
+    IDF is frozen between refreshes; each refresh bumps idf_version and renormalizes the matrix.
+    Saved as immutable generations (see generations.py): index_dir links to the last complete save.
+    """
+    def __init__(self, objects_file=OBJECTS_FILE, index_dir=INDEX_DIR):
+        self.objects_file = objects_file
+        self.index_dir = index_dir
+        self.hasher = HashingVectorizer(n_features=N_FEATURES, stop_words='english', alternate_sign=False, norm=None)
+        self._reset()
+
+    def _reset(self):
+        self.meta = {"version": INDEX_VERSION, "n_features": N_FEATURES, "idf_version": 0, "idf_n_docs": 0,
+                     "source_size": 0, "source_mtime": 0, "tail_hash": ""}
+        self.dates = []
+        self.offsets = []
+        self.hashes = []
+        self.row_of = {}
+        self.counts = sp.csr_matrix((0, N_FEATURES), dtype=np.float32)
+        self.doc_freq = np.zeros(N_FEATURES, dtype=np.int32)
+        self.idf = np.ones(N_FEATURES, dtype=np.float32)
+        self.matrix = sp.csr_matrix((0, N_FEATURES), dtype=np.float32)
+
+    def __contains__(self, date):
+        return date in self.row_of
+
+    def __len__(self):
+        return len(self.dates)
+
+    # --- Persistence ---
+
+    def _path(self, name, root=None):
+        return os.path.join(root or self.index_dir, name)
+
+    def load(self):
+        """Loads the persisted index. Returns False if there is none (or it is from another version)."""
+        root = current(self.index_dir) # Every file from the same save
+        try:
+            with open(self._path("meta.json", root), 'r') as f:
+                meta = json.load(f)
+            if meta.get('version') != INDEX_VERSION or meta.get('n_features') != N_FEATURES:
+                return False
+            with open(self._path("rows.json", root), 'r') as f:
+                rows = json.load(f)
+            self.counts = sp.load_npz(self._path("counts.npz", root)).tocsr()
+            self.matrix = sp.load_npz(self._path("matrix.npz", root)).tocsr()
+            self.doc_freq = np.load(self._path("doc_freq.npy", root))
+            self.idf = np.load(self._path("idf.npy", root))
+        except (OSError, ValueError, KeyError):
+            return False
+
+        self.meta = meta
+        self.dates, self.offsets, self.hashes = rows['dates'], rows['offsets'], rows['hashes']
+        self.row_of = {d: i for i, d in enumerate(self.dates)}
+        return True
+
+    def save(self):
+        """Writes a complete new generation, then publishes it (a crash mid-save leaves the previous one)."""
+        root = new_generation(self.index_dir)
+        sp.save_npz(self._path("counts.npz", root), self.counts)
+        sp.save_npz(self._path("matrix.npz", root), self.matrix)
+        np.save(self._path("doc_freq.npy", root), self.doc_freq)
+        np.save(self._path("idf.npy", root), self.idf)
+        with open(self._path("rows.json", root), 'w') as f:
+            json.dump({"dates": self.dates, "offsets": self.offsets, "hashes": self.hashes}, f)
+        with open(self._path("meta.json", root), 'w') as f:
+            json.dump(self.meta, f, indent=2)
+        publish(self.index_dir, root)
+
+    # --- Updates ---
+
+    def _tail_hash(self, size):
+        with open(self.objects_file, 'rb') as f:
+            f.seek(max(0, size - TAIL_BYTES))
+            return hashlib.sha1(f.read(min(size, TAIL_BYTES))).hexdigest()
+
+    def _scan(self, start_offset):
+        """Yields (offset, record, text) from start_offset onwards."""
+        with open(self.objects_file, 'rb') as f:
+            f.seek(start_offset)
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+                try:
+                    r = json.loads(line)
+                    yield offset, r, regime_text(r)
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    continue
+
+    def update(self, force_refresh=False):
+        """
+        Brings the index in line with the objects file.
+        Appended lines are hashed and added as rows (no refit). A rewritten file is rescanned and
+        only new or changed dates are re-hashed. Returns the list of dates added or changed.
+        """
+        if not os.path.exists(self.objects_file):
+            print(f"❌ Objects file not found: {self.objects_file}")
+            return []
+
+        stat = os.stat(self.objects_file)
+        if not force_refresh and stat.st_size == self.meta['source_size'] and stat.st_mtime_ns == self.meta['source_mtime']:
+            return [] # Up to date
+
+        indexed = self.meta['source_size']
+        append_only = 0 < indexed <= stat.st_size and self._tail_hash(indexed) == self.meta['tail_hash']
+        if not append_only and self.dates:
+            print("🔁 Objects file was rewritten. Rescanning for changed dates...")
+
+        new_rows = {} # date -> (offset, text hash, text)
+        seen = set()
+        for offset, r, text in self._scan(indexed if append_only else 0):
+            date = r['date']
+            seen.add(date)
+            text_hash = hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+            row = self.row_of.get(date)
+            if row is not None and self.hashes[row] == text_hash:
+                self.offsets[row] = offset # Same text, possibly moved
+                new_rows.pop(date, None)
+                continue
+            new_rows[date] = (offset, text_hash, text) # Later duplicates win
+
+        if not append_only and self.dates and any(d not in seen for d in self.dates):
+            # Dates were dropped from the file: start from scratch
+            print("🔁 Dates were removed from the objects file. Rebuilding twin index...")
+            self._reset()
+            return self.update(force_refresh=True)
+
+        if new_rows:
+            self._apply_rows(new_rows)
+
+        grown = len(self.dates) >= self.meta['idf_n_docs'] * (1 + IDF_REFRESH_RATIO)
+        if force_refresh or grown or self.meta['idf_version'] == 0:
+            self._refresh_idf()
+        elif new_rows:
+            self._normalize_rows([self.row_of[d] for d in new_rows])
+
+        self.meta['source_size'] = stat.st_size
+        self.meta['source_mtime'] = stat.st_mtime_ns
+        self.meta['tail_hash'] = self._tail_hash(stat.st_size)
+        self.save()
+
+        if new_rows:
+            print(f"🧮 Twin index: {len(new_rows)} dates hashed, {len(self.dates)} total (IDF v{self.meta['idf_version']}).")
+        return list(new_rows)
+
+    def _apply_rows(self, new_rows):
+        dates = list(new_rows)
+        block = self.hasher.transform([new_rows[d][2] for d in dates]).astype(np.float32).tocsr()
+
+        changed = [i for i, d in enumerate(dates) if d in self.row_of]
+        if changed:
+            # Replace rows in place (rare: only when a date's text was regenerated)
+            counts = self.counts.tolil()
+            for i in changed:
+                row = self.row_of[dates[i]]
+                np.add.at(self.doc_freq, self.counts[row].indices, -1)
+                counts[row] = block[i]
+                self.offsets[row], self.hashes[row] = new_rows[dates[i]][:2]
+            self.counts = counts.tocsr()
+            np.add.at(self.doc_freq, block[changed].indices, 1)
+
+        appended = [i for i, d in enumerate(dates) if d not in self.row_of]
+        if appended:
+            self.counts = sp.vstack([self.counts, block[appended]], format='csr')
+            np.add.at(self.doc_freq, block[appended].indices, 1)
+            for i in appended:
+                self.row_of[dates[i]] = len(self.dates)
+                self.dates.append(dates[i])
+                self.offsets.append(new_rows[dates[i]][0])
+                self.hashes.append(new_rows[dates[i]][1])
+            # Keep the normalized matrix aligned; rows are filled in by _normalize_rows / _refresh_idf
+            pad = sp.csr_matrix((len(appended), N_FEATURES), dtype=np.float32)
+            self.matrix = sp.vstack([self.matrix, pad], format='csr')
+
+    def _refresh_idf(self):
+        """Smooth IDF (same formula as TfidfVectorizer) from the current document frequencies."""
+        n_docs = len(self.dates)
+        self.idf = (np.log((1 + n_docs) / (1 + self.doc_freq)) + 1).astype(np.float32)
+        self.matrix = normalize(self.counts.multiply(self.idf).tocsr()).astype(np.float32)
+        self.meta['idf_version'] += 1
+        self.meta['idf_n_docs'] = n_docs
+
+    def _normalize_rows(self, rows):
+        """Weights new rows with the frozen IDF."""
+        weighted = normalize(self.counts[rows].multiply(self.idf).tocsr()).astype(np.float32)
+        matrix = self.matrix.tolil()
+        for i, row in enumerate(rows):
+            matrix[row] = weighted[i]
+        self.matrix = matrix.tocsr()
+
+    # --- Queries ---
+
+    def get_record(self, date):
+        """Reads a single regime object from the source file by its stored byte offset."""
+        with open(self.objects_file, 'rb') as f:
+            f.seek(self.offsets[self.row_of[date]])
+            return json.loads(f.readline())
+
+    def scores(self, date):
+        """Cosine similarity of one date against every indexed date: a single sparse matrix-vector product."""
+        query = self.matrix[self.row_of[date]]
+        return (self.matrix @ query.T).toarray().ravel()
+
+_INDEX = None
+
+def get_twin_index():
+    """Process-wide index, loaded once and refreshed from the objects file on each call (cheap when unchanged)."""
+    global _INDEX
+    if _INDEX is None:
+        _INDEX = TwinIndex()
+        _INDEX.load()
+    _INDEX.update()
+    return _INDEX
+
+if __name__ == "__main__":
+    index = TwinIndex()
+    index.load()
+    index.update(force_refresh="--refresh" in sys.argv)
+    print(f"✅ Twin index ready: {len(index)} dates (IDF v{index.meta['idf_version']})")
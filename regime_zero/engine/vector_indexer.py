@@ -1,100 +1,406 @@
 import json
 import os
+import hashlib
+import shutil
 import numpy as np
-import pickle
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer, CountVectorizer
+from sklearn.preprocessing import normalize
+from regime_zero.engine.near_duplicates import duplicate_classes, normalize_text
+from regime_zero.engine.generations import current, new_generation, publish
+
+INDEX_VERSION = 3 # v2: rows sorted by date; v3: collapsed texts mask only price-template numbers
+MIN_SCORE = 0.1 # Minimum similarity for a search hit
+
+class _SourceChanged(Exception):
+    """A stored byte offset no longer points at the record the index expects (master file rewritten)."""
 
 class VectorIndexer:
-    def __init__(self, master_file="regime_zero/data/regimes/master_regime_history.jsonl", index_file="regime_zero/data/regimes/vector_index.pkl"):
+    """
+    TF-IDF index over the master regime history.
+    Stored as a versioned directory of plain arrays (no pickle):
+      data.npy / indices.npy / indptr.npy  - L2-normalized CSR matrix (float32, memory-mapped on load)
+      idf.npy, vocabulary.json             - enough to rebuild the query transform
+      offsets.npy, dates.json              - byte offset and date of each record in the master file
+      meta.json                            - format version, shape and source fingerprint (written last)
+    index_dir is a symlink to an immutable generation directory (<index_dir>.gen-<ns>). A rebuild (or a
+    metadata refresh) writes a new generation and swaps the link with os.replace, so readers (and their
+    memory maps) only ever see a complete index. Records are read by offset only after checking the
+    master file still matches the index, and each one is checked against its stored date.
+    Rows are ordered by date, so "strictly before filter_date" is a prefix of the matrix.
+    With collapse_duplicates, near-identical days (MinHash/LSH) share one row: the earliest day of the
+    class is indexed and the rest are kept in member_ptr.npy / member_offsets.npy / member_dates.json.
+    Texts (and queries) are then indexed with dates dropped and price-template numbers masked, so every member of a class
+    scores like its representative and expanding a hit loses nothing.
+    With terms_dir (vocabulary.json + idf.npy fitted elsewhere, e.g. over every shard of a ShardedIndex),
+    the index uses those term weights instead of fitting its own, so scores compare across indexes.
+    """
+    def __init__(self, master_file="regime_zero/data/regimes/master_regime_history.jsonl", index_dir=None, collapse_duplicates=False, terms_dir=None):
         self.master_file = master_file
-        self.index_file = index_file
+        self.collapse_duplicates = collapse_duplicates
+        self.terms_dir = terms_dir
+        self.index_dir = index_dir or ("regime_zero/data/regimes/vector_index_collapsed" if collapse_duplicates else "regime_zero/data/regimes/vector_index")
         self.vectorizer = TfidfVectorizer(stop_words='english', max_features=5000)
-        self.records = []
+        self.query_vectorizer = None
+        self.idf = None
         self.vectors = None
-        
+        self.offsets = None
+        self.dates = np.asarray([], dtype=str)
+        self.member_ptr = None
+        self.member_offsets = None
+        self.member_dates = None
+        self.meta = {}
+        self._root = None # Generation directory the loaded arrays come from
+
+    def _path(self, name, root=None):
+        return os.path.join(root or self.index_dir, name)
+
+    def _republish_meta(self):
+        """Publishes self.meta as a new generation sharing the current arrays (hard links), leaving the loaded one untouched."""
+        build_dir = new_generation(self.index_dir)
+        for name in os.listdir(self._root):
+            if name == "meta.json" or name.endswith(".tmp"):
+                continue
+            try:
+                os.link(self._path(name, self._root), self._path(name, build_dir))
+            except OSError:
+                shutil.copy2(self._path(name, self._root), self._path(name, build_dir))
+        with open(self._path("meta.json", build_dir), 'w') as f:
+            json.dump(self.meta, f, indent=2)
+        publish(self.index_dir, build_dir)
+        self._root = build_dir
+
+    def _terms_id(self):
+        """Content hash of the shared vocabulary/IDF (None when the index fits its own)."""
+        if not self.terms_dir:
+            return None
+        sha = hashlib.sha1()
+        for name in ("vocabulary.json", "idf.npy"):
+            with open(os.path.join(self.terms_dir, name), 'rb') as f:
+                sha.update(f.read())
+        return sha.hexdigest()
+
+    def _fingerprint(self, with_hash=True):
+        """Size + mtime of the master file (cheap); sha1 of the content only when asked."""
+        stat = os.stat(self.master_file)
+        fp = {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+        if with_hash:
+            sha = hashlib.sha1()
+            with open(self.master_file, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    sha.update(chunk)
+            fp["sha1"] = sha.hexdigest()
+        return fp
+
     def build_index(self):
         """Builds TF-IDF index from master regime history."""
         print("🏗️ Building Vector Index...")
-        self.records = []
+        offsets = []
+        dates = []
         corpus = []
         
         if not os.path.exists(self.master_file):
             print("❌ Master file not found.")
             return
-            
-        with open(self.master_file, 'r') as f:
-            for line in f:
+        
+        with open(self.master_file, 'rb') as f:
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line:
+                    break
                 try:
                     record = json.loads(line)
-                    self.records.append(record)
                     # Combine all text fields for indexing
                     text = record.get('summary_text', '')
                     corpus.append(text)
+                    offsets.append(offset)
+                    dates.append(record.get('date', ''))
                 except:
                     continue
-                    
+        
         if not corpus:
             print("⚠️ No data to index.")
             return
-            
-        # Fit Vectorizer
-        self.vectors = self.vectorizer.fit_transform(corpus)
-        
-        # Save Index
-        with open(self.index_file, 'wb') as f:
-            pickle.dump({
-                'vectorizer': self.vectorizer,
-                'vectors': self.vectors,
-                'records': self.records
-            }, f)
-            
-        print(f"✅ Index built with {len(self.records)} records. Saved to {self.index_file}")
         
+        # Date order (stable for same-day duplicates)
+        order = sorted(range(len(dates)), key=lambda i: dates[i])
+        corpus = [corpus[i] for i in order]
+        offsets = [offsets[i] for i in order]
+        dates = [dates[i] for i in order]
+        n_source = len(dates)
+        
+        if self.collapse_duplicates:
+            # One row per class of near-identical days; the earliest member represents it
+            classes = duplicate_classes(corpus)
+            members = {}
+            for i, c in enumerate(classes):
+                members.setdefault(int(c), []).append(i)
+            reps = sorted(members)
+            member_rows = [i for c in reps for i in members[c]]
+            member_ptr = np.cumsum([0] + [len(members[c]) for c in reps])
+            member_offsets = [offsets[i] for i in member_rows]
+            member_dates = [dates[i] for i in member_rows]
+            corpus = [normalize_text(corpus[i]) for i in reps]
+            offsets = [offsets[i] for i in reps]
+            dates = [dates[i] for i in reps]
+            print(f"🧬 Collapsed {n_source} days into {len(reps)} classes.")
+        
+        if self.terms_dir:
+            # Shared term weights: counts * idf, L2-normalized (what TfidfVectorizer does with a fixed vocabulary)
+            with open(os.path.join(self.terms_dir, "vocabulary.json"), 'r') as f:
+                vocabulary = json.load(f)
+            idf = np.load(os.path.join(self.terms_dir, "idf.npy")).astype(np.float32)
+            counts = CountVectorizer(stop_words='english', vocabulary={t: i for i, t in enumerate(vocabulary)}).transform(corpus)
+            vectors = normalize(counts.astype(np.float32).multiply(idf).tocsr()).astype(np.float32).tocsr()
+        else:
+            # Fit Vectorizer
+            vectors = self.vectorizer.fit_transform(corpus).astype(np.float32).tocsr()
+            idf = self.vectorizer.idf_.astype(np.float32)
+            vocabulary = [None] * len(self.vectorizer.vocabulary_)
+            for term, col in self.vectorizer.vocabulary_.items():
+                vocabulary[col] = term
+        
+        # Save Index into a new generation (meta.json last: it marks the index as complete), then publish it
+        build_dir = new_generation(self.index_dir)
+        np.save(self._path("data.npy", build_dir), vectors.data)
+        np.save(self._path("indices.npy", build_dir), vectors.indices.astype(np.int32))
+        np.save(self._path("indptr.npy", build_dir), vectors.indptr.astype(np.int64))
+        np.save(self._path("idf.npy", build_dir), idf)
+        np.save(self._path("offsets.npy", build_dir), np.asarray(offsets, dtype=np.int64))
+        with open(self._path("vocabulary.json", build_dir), 'w') as f:
+            json.dump(vocabulary, f)
+        with open(self._path("dates.json", build_dir), 'w') as f:
+            json.dump(dates, f)
+        if self.collapse_duplicates:
+            np.save(self._path("member_ptr.npy", build_dir), member_ptr.astype(np.int64))
+            np.save(self._path("member_offsets.npy", build_dir), np.asarray(member_offsets, dtype=np.int64))
+            with open(self._path("member_dates.json", build_dir), 'w') as f:
+                json.dump(member_dates, f)
+        with open(self._path("meta.json", build_dir), 'w') as f:
+            json.dump({
+                "version": INDEX_VERSION,
+                "shape": list(vectors.shape),
+                "collapse": self.collapse_duplicates,
+                "source_rows": n_source,
+                "source": self._fingerprint(),
+                "terms": self._terms_id()
+            }, f, indent=2)
+        publish(self.index_dir, build_dir)
+        
+        print(f"✅ Index built with {len(offsets)} records. Saved to {self.index_dir}")
+        self._load_arrays()
+
+    def _load_arrays(self):
+        """Maps the stored arrays. Returns False if the index is missing, incomplete or from another version."""
+        # Resolve the link once: every file comes from the same generation even if a rebuild swaps it meanwhile
+        root = current(self.index_dir)
+        try:
+            with open(self._path("meta.json", root), 'r') as f:
+                meta = json.load(f)
+            if meta.get('version') != INDEX_VERSION or meta.get('collapse', False) != self.collapse_duplicates:
+                return False
+            data = np.load(self._path("data.npy", root), mmap_mode='r')
+            indices = np.load(self._path("indices.npy", root), mmap_mode='r')
+            indptr = np.load(self._path("indptr.npy", root), mmap_mode='r')
+            self.idf = np.load(self._path("idf.npy", root))
+            self.offsets = np.load(self._path("offsets.npy", root), mmap_mode='r')
+            with open(self._path("vocabulary.json", root), 'r') as f:
+                vocabulary = json.load(f)
+            with open(self._path("dates.json", root), 'r') as f:
+                self.dates = np.asarray(json.load(f), dtype=str)
+            if self.collapse_duplicates:
+                self.member_ptr = np.load(self._path("member_ptr.npy", root))
+                self.member_offsets = np.load(self._path("member_offsets.npy", root), mmap_mode='r')
+                with open(self._path("member_dates.json", root), 'r') as f:
+                    self.member_dates = np.asarray(json.load(f), dtype=str)
+        except (OSError, ValueError, KeyError):
+            return False
+        
+        self.meta = meta
+        self._root = root
+        self.vectors = sp.csr_matrix((data, indices, indptr), shape=tuple(meta['shape']), copy=False)
+        # Raw term counts; IDF weighting and normalization are applied in _transform (same as TfidfVectorizer)
+        self.query_vectorizer = CountVectorizer(stop_words='english', vocabulary={t: i for i, t in enumerate(vocabulary)})
+        return True
+
+    def _is_stale(self):
+        """Compares the master file with the fingerprint the index was built from."""
+        if not os.path.exists(self.master_file):
+            return False # Nothing to rebuild from; serve what we have
+        if self.terms_dir and self._terms_id() != self.meta.get('terms'):
+            return True # Shared term weights changed: scores must be recomputed
+        source = self.meta.get('source', {})
+        current = self._fingerprint(with_hash=False)
+        if current['size'] == source.get('size') and current['mtime'] == source.get('mtime'):
+            return False
+        if current['size'] != source.get('size'):
+            return True
+        # Touched but possibly unchanged (e.g. a full aggregator rewrite): compare content
+        current = self._fingerprint()
+        if current['sha1'] != source.get('sha1'):
+            return True
+        # Same content: record the new mtime (in a new generation) so the next load takes the cheap path again
+        self.meta['source'] = current
+        self._republish_meta()
+        return False
+
+    def _check_source(self):
+        """Before reading records by offset: rebuilds if the master file no longer matches the loaded index."""
+        if self.vectors is None or not os.path.exists(self.master_file):
+            return
+        source = self.meta.get('source', {})
+        current = self._fingerprint(with_hash=False)
+        if current['size'] == source.get('size') and current['mtime'] == source.get('mtime'):
+            return
+        if self._is_stale():
+            print("🔁 Master history changed since the index was loaded. Rebuilding...")
+            self.build_index()
+
+    def _retry_on_change(self, read):
+        """Runs read(); if the master file changed underneath it, rebuilds once and runs it again."""
+        self._check_source()
+        try:
+            return read()
+        except _SourceChanged:
+            print("🔁 Master history changed while reading. Rebuilding...")
+            self.build_index()
+            return read()
+
     def load_index(self):
-        """Loads the index from disk."""
-        if not os.path.exists(self.index_file):
+        """Loads the index from disk, rebuilding it if it is missing or the master file has changed."""
+        if not self._load_arrays():
             self.build_index()
             return
-            
-        with open(self.index_file, 'rb') as f:
-            data = pickle.load(f)
-            self.vectorizer = data['vectorizer']
-            self.vectors = data['vectors']
-            self.records = data['records']
-            
-    def search(self, query_text, top_k=10, filter_date=None):
+        
+        if self._is_stale():
+            print("🔁 Master history changed since the index was built. Rebuilding...")
+            self.build_index()
+
+    def _transform(self, texts):
+        if self.collapse_duplicates:
+            texts = [normalize_text(t) for t in texts]
+        counts = self.query_vectorizer.transform(texts).astype(np.float32)
+        return normalize(counts.multiply(self.idf).tocsr())
+
+    def get_record(self, idx):
+        """Reads a single record from the master file by its stored byte offset."""
+        return self.get_records([idx])[idx]
+
+    def get_records(self, idxs):
+        """Reads several records in one pass over the master file (in offset order). Returns {idx: record}."""
+        def read():
+            records = self._read_at({int(self.offsets[idx]): self.dates[idx] for idx in idxs})
+            return {idx: records[int(self.offsets[idx])] for idx in idxs}
+        return self._retry_on_change(read)
+
+    def _read_at(self, expected):
+        """{offset: date} -> {offset: record}. Raises _SourceChanged if a record isn't the one the index stored there."""
+        records = {}
+        with open(self.master_file, 'rb') as f:
+            for offset in sorted(expected):
+                f.seek(offset)
+                try:
+                    record = json.loads(f.readline())
+                except ValueError:
+                    raise _SourceChanged(offset)
+                if not isinstance(record, dict) or record.get('date', '') != expected[offset]:
+                    raise _SourceChanged(offset)
+                records[offset] = record
+        return records
+
+    def _member_offsets(self, idx, filter_date=None):
+        """(byte offset, date) of the days collapsed into row idx (date order, representative first)."""
+        start, end = self.member_ptr[idx], self.member_ptr[idx + 1]
+        if filter_date:
+            end = start + int(np.searchsorted(self.member_dates[start:end], filter_date, side='left'))
+        return [(int(o), d) for o, d in zip(self.member_offsets[start:end], self.member_dates[start:end])]
+
+    def members(self, date, filter_date=None):
+        """All days in the duplicate class represented by `date` (just that day when not collapsing)."""
+        if self.vectors is None:
+            self.load_index()
+        
+        def read():
+            row = int(np.searchsorted(self.dates, date, side='left'))
+            if row >= len(self.dates) or self.dates[row] != date:
+                return []
+            if not self.collapse_duplicates:
+                return [self._read_at({int(self.offsets[row]): self.dates[row]})[int(self.offsets[row])]]
+            members = self._member_offsets(row, filter_date)
+            records = self._read_at(dict(members))
+            return [records[o] for o, _ in members]
+        return self._retry_on_change(read)
+
+    def _head(self, limit):
+        """First `limit` rows as a zero-copy CSR view (rows are date-sorted, so this is "before a date")."""
+        indptr = self.vectors.indptr[:limit + 1]
+        end = indptr[-1]
+        return sp.csr_matrix((self.vectors.data[:end], self.vectors.indices[:end], indptr),
+                             shape=(limit, self.vectors.shape[1]), copy=False)
+
+    def _limit(self, filter_date):
+        """Number of rows dated strictly before filter_date."""
+        if not filter_date:
+            return self.vectors.shape[0]
+        return int(np.searchsorted(self.dates, filter_date, side='left'))
+
+    @staticmethod
+    def _top_k(scores, top_k):
+        """Indices of the best top_k scores above MIN_SCORE, best first (argpartition, no full sort)."""
+        if len(scores) > top_k:
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            candidates = np.arange(len(scores))
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return candidates[scores[candidates] >= MIN_SCORE]
+
+    def search(self, query_text, top_k=10, filter_date=None, expand=False):
         """Searches the index for similar regimes."""
+        return self.search_many([query_text], top_k=top_k, filter_dates=[filter_date], expand=expand)[0]
+
+    def search_many(self, query_texts, top_k=10, filter_dates=None, expand=False):
+        """
+        Searches several queries at once: one sparse matrix-matrix product for the whole batch.
+        filter_dates (optional, one per query) keeps only records dated strictly before it.
+        With collapsed duplicates, each hit is a class representative; expand=True replaces it with
+        the class members (same score, still before filter_date), truncated to top_k.
+        Returns a list of [(score, record), ...] per query.
+        """
         if self.vectors is None:
             self.load_index()
-            
-        # Transform query
-        query_vec = self.vectorizer.transform([query_text])
-        
-        # Calculate Cosine Similarity
-        # (1, N) dot (N, M).T -> (1, M)
-        scores = cosine_similarity(query_vec, self.vectors).flatten()
-        
-        # Sort indices
-        top_indices = scores.argsort()[::-1]
-        
-        results = []
-        for idx in top_indices:
-            record = self.records[idx]
-            score = scores[idx]
-            
-            # Filter Logic
-            if filter_date and record['date'] >= filter_date:
-                continue
-                
-            if score < 0.1: # Minimum threshold
-                break
-                
-            results.append((score, record))
-            if len(results) >= top_k:
-                break
-                
-        return results
+        if self.vectors is None or not query_texts:
+            return [[] for _ in query_texts]
+        return self._retry_on_change(lambda: self._search_many(query_texts, top_k, filter_dates, expand))
+        
+    def _search_many(self, query_texts, top_k, filter_dates, expand):
+        filter_dates = filter_dates or [None] * len(query_texts)
+        limits = [self._limit(d) for d in filter_dates]
+        
+        # Cosine Similarity: both sides are L2-normalized, so a dot product suffices
+        # Only rows that some query may return are scored: (max_limit, M) dot (B, M).T -> (max_limit, B)
+        head = max(limits)
+        if head == 0:
+            return [[] for _ in query_texts]
+        query_vecs = self._transform(query_texts)
+        scores = (self._head(head) @ query_vecs.T).toarray()
+        
+        hits = []
+        for col, limit in enumerate(limits):
+            column = scores[:limit, col]
+            top = self._top_k(column, top_k) if limit else []
+            hits.append([(float(column[idx]), idx) for idx in top])
+        
+        if expand and self.collapse_duplicates:
+            hits = [[(score, member) for score, idx in query_hits for member in self._member_offsets(idx, d)][:top_k]
+                    for query_hits, d in zip(hits, filter_dates)]
+        else:
+            hits = [[(score, (int(self.offsets[idx]), self.dates[idx])) for score, idx in query_hits] for query_hits in hits]
+        
+        # Read every returned record in a single pass
+        records = self._read_at(dict(member for query_hits in hits for _, member in query_hits))
+        hits = [[(score, offset) for score, (offset, _) in query_hits] for query_hits in hits]
+        return [[(score, records[offset]) for score, offset in query_hits] for query_hits in hits]
 
 if __name__ == "__main__":
     indexer = VectorIndexer()
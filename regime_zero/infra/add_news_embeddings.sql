@@ -0,0 +1,23 @@
+-- Embeddings for refined news (filled by regime_zero/engine/embed_news.py --to-db)
+ALTER TABLE ingest_news
+ADD COLUMN IF NOT EXISTS embedding vector(1536);
+
+-- ANN index for cosine distance
+CREATE INDEX IF NOT EXISTS idx_ingest_news_embedding ON ingest_news USING hnsw (embedding vector_cosine_ops);
+
+-- Bulk write: one round trip per batch instead of one UPDATE per article
+CREATE OR REPLACE FUNCTION set_news_embeddings(ids BIGINT[], embeddings TEXT[])
+RETURNS INT
+LANGUAGE sql
+AS $$
+    WITH updated AS (
+        UPDATE ingest_news n
+        SET embedding = v.embedding::vector
+        FROM unnest(ids, embeddings) AS v(id, embedding)
+        WHERE n.id = v.id
+        RETURNING 1
+    )
+    SELECT count(*)::INT FROM updated;
+$$;
+
+COMMENT ON COLUMN ingest_news.embedding IS 'Embedding of title + summary (same model as the RAG tables)';
@@ -0,0 +1,37 @@
+-- RAG retrieval in one round trip: patterns and strategies for a single bound query vector.
+-- Called from regime_zero/engine/rag_retriever.py via supabase.rpc('match_rag_context', ...)
+
+-- 1. ANN indexes for cosine distance (<=>)
+CREATE INDEX IF NOT EXISTS idx_rag_patterns_embedding ON rag_patterns USING hnsw (embedding vector_cosine_ops);
+CREATE INDEX IF NOT EXISTS idx_rag_strategies_embedding ON rag_strategies USING hnsw (embedding vector_cosine_ops);
+
+-- 2. Both result sets, nearest first.
+-- Each branch is a plain ORDER BY distance LIMIT n (what the HNSW index serves); the threshold is
+-- applied to those n rows afterwards instead of in a WHERE clause, so the distance is computed once per row.
+CREATE OR REPLACE FUNCTION match_rag_context(
+    query_embedding vector(1536),
+    match_threshold FLOAT DEFAULT 0.7,
+    match_count INT DEFAULT 3
+)
+RETURNS TABLE (kind TEXT, name TEXT, body TEXT, similarity FLOAT)
+LANGUAGE sql STABLE
+AS $$
+    SELECT 'pattern', p.name, p.description, 1 - p.distance
+    FROM (
+        SELECT rag_patterns.name, rag_patterns.description, rag_patterns.embedding <=> query_embedding AS distance
+        FROM rag_patterns
+        ORDER BY distance
+        LIMIT match_count
+    ) p
+    WHERE p.distance < 1 - match_threshold
+    UNION ALL
+    SELECT 'strategy', s.name, s.content, 1 - s.distance
+    FROM (
+        SELECT rag_strategies.name, rag_strategies.content, rag_strategies.embedding <=> query_embedding AS distance
+        FROM rag_strategies
+        ORDER BY distance
+        LIMIT match_count
+    ) s
+    WHERE s.distance < 1 - match_threshold
+    ORDER BY 1, 4 DESC;
+$$;